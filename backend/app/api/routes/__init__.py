@@ -1,4 +1,4 @@
 """Route modules for the FastAPI application."""
 
 # Re-export for convenient import in app.main
-from . import health, llm, materials, test, qa  # noqa: F401
+from . import batch, health, llm, materials, metrics, test, qa  # noqa: F401
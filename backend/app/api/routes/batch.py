@@ -0,0 +1,135 @@
+"""Batch prompt execution endpoints.
+
+``POST /qa/batch`` runs up to ``BATCH_MAX_ITEMS`` prompts with bounded
+parallelism and streams each result as it completes (NDJSON by default, SSE
+when the client accepts ``text/event-stream``). With ``"mode": "job"`` the
+batch runs in the background and results are polled via its job ID.
+"""
+
+from __future__ import annotations
+
+import json
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.config import settings
+from app.core.streaming import EventStreamResponse
+from app.services.batch import BatchItem, get_batch_job_store, run_batch
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.rate_limit import charge_requests
+
+router = APIRouter(prefix="/qa/batch", tags=["qa"])
+
+
+class BatchPrompt(BaseModel):
+    id: str | None = None
+    prompt: str | None = None
+    context: str | None = None
+    messages: list[dict[str, Any]] | None = None
+
+    @model_validator(mode="after")
+    def _one_input(self) -> "BatchPrompt":
+        if bool(self.prompt) == bool(self.messages):
+            msg = "each item needs exactly one of 'prompt' or 'messages'"
+            raise ValueError(msg)
+        return self
+
+
+class BatchRequest(BaseModel):
+    items: list[BatchPrompt] = Field(min_length=1)
+    model: str | None = None
+    temperature: float | None = None
+    concurrency: int | None = Field(default=None, ge=1)
+    mode: Literal["stream", "job"] = "stream"
+
+
+def _to_items(payload: BatchRequest) -> list[BatchItem]:
+    items: list[BatchItem] = []
+    for index, entry in enumerate(payload.items):
+        if entry.messages:
+            messages = entry.messages
+        else:
+            messages = [{"role": "system", "content": entry.context}] if entry.context else []
+            messages.append({"role": "user", "content": entry.prompt})
+        items.append(BatchItem(index=index, id=entry.id or str(index), messages=messages))
+    return items
+
+
+@router.post("")
+async def run_batch_prompts(
+    payload: BatchRequest,
+    request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+) -> Any:
+    """Execute many prompts; results arrive in completion order."""
+    if len(payload.items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch accepts at most {settings.batch_max_items} items",
+        )
+    items = _to_items(payload)
+    # the rate limiter admitted one request; every further item costs one more
+    await charge_requests(request.scope, len(items) - 1)
+    concurrency = min(payload.concurrency or settings.batch_concurrency, settings.batch_concurrency)
+
+    if payload.mode == "job":
+        job = get_batch_job_store().submit(
+            llm_service, items, concurrency=concurrency, model=payload.model, temperature=payload.temperature
+        )
+        return {"data": job.summary(), "error": None}
+
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def frame(event: dict[str, Any]) -> str:
+        body = json.dumps(event, ensure_ascii=False)
+        return f"data: {body}\n\n" if sse else body + "\n"
+
+    async def publish() -> AsyncIterator[str]:
+        failed = 0
+        results = run_batch(
+            llm_service, items, concurrency=concurrency, model=payload.model, temperature=payload.temperature
+        )
+        async with aclosing(results):
+            async for result in results:
+                failed += bool(result.error)
+                yield frame({"type": "result", **result.to_dict()})
+        yield frame({"type": "end", "total": len(items), "failed": failed})
+
+    return EventStreamResponse(
+        publish(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}")
+async def get_batch_job(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+) -> dict[str, Any]:
+    """Poll a background batch; ``results`` are in completion order."""
+    job = get_batch_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    page = job.results[offset : offset + limit]
+    return {
+        "data": {
+            **job.summary(),
+            "results": [r.to_dict() for r in page],
+            "pagination": {"offset": offset, "limit": limit, "total": len(job.results)},
+        },
+        "error": None,
+    }
+
+
+@router.delete("/{job_id}")
+async def cancel_batch_job(job_id: str) -> dict[str, Any]:
+    """Cancel a running background batch; finished results are kept."""
+    store = get_batch_job_store()
+    if store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return {"data": {"cancelled": store.cancel(job_id)}, "error": None}
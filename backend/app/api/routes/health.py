@@ -1,6 +1,9 @@
 """Liveness and readiness probes."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import get_warmup
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -9,3 +12,11 @@ router = APIRouter(prefix="/health", tags=["health"])
 async def health() -> dict[str, str]:
     """Return a basic health payload for monitoring."""
     return {"status": "ok"}
+
+
+@router.get("/ready", summary="Readiness check")
+async def ready() -> JSONResponse:
+    """200 once the startup warm-up finished, 503 while the worker is still warming up."""
+    warmup = get_warmup()
+    code = status.HTTP_200_OK if warmup.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(warmup.snapshot(), status_code=code)
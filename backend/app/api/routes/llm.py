@@ -3,14 +3,17 @@
 from __future__ import annotations
 
 import json
+from contextlib import aclosing
 from typing import Any, AsyncIterator, Literal
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 
 from app.core.config import settings
+from app.core.metrics import StreamMeter
+from app.core.streaming import EventStreamResponse
+from app.core.tracing import current_trace_id
 from ...services.llm_service import LLMService, get_llm_service
 
 
@@ -96,6 +99,7 @@ async def generate_message(
             messages=messages,
             model=options.model,
             temperature=options.temperature,
+            endpoint="llm_messages",
         )
     except ValueError as exc:
         raise HTTPException(
@@ -115,6 +119,8 @@ async def generate_message(
         "provider": llm_service.provider,
         "model": result.model or (payload.options.model if payload.options else None) or settings.text_model,
     }
+    if result.route:
+        metadata["routing"] = result.route
 
     return LLMMessageResponse(
         session_id=session_id,
@@ -132,40 +138,51 @@ async def generate_message(
 async def stream_message(
     payload: LLMMessageRequest,
     llm_service: LLMService = Depends(get_llm_service),
-) -> StreamingResponse:
+) -> EventStreamResponse:
     session_id = payload.session_id or str(uuid4())
     message_id = str(uuid4())
     options = payload.options or GenerationOptions()
 
+    trace_id = current_trace_id()
+    meter = StreamMeter("llm_messages_stream")
+
     async def event_publisher() -> AsyncIterator[str]:
-        yield _format_sse({"type": "start", "sessionId": session_id, "messageId": message_id})
+        yield _format_sse({"type": "start", "sessionId": session_id, "messageId": message_id, "traceId": trace_id})
         try:
             messages = _build_messages(payload)
-            async for chunk in llm_service.stream_completion(
+            chunks = llm_service.stream_completion(
                 messages=messages,
                 model=options.model,
                 temperature=options.temperature,
-            ):
-                if chunk.type == "content" and chunk.content:
-                    # 去掉首个 token 的前导空白，以避免前端出现空白行
-                    yield _format_sse({"type": "token", "content": chunk.content})
-                elif chunk.type == "end":
-                    total_tokens = chunk.usage.get("total_tokens") if chunk.usage else None
-                    event_payload = {
-                        "type": "end",
-                        "messageId": message_id,
-                        "totalTokens": total_tokens,
-                    }
-                    if chunk.model:
-                        event_payload["model"] = chunk.model
-                    yield _format_sse(event_payload)
-                    break
+                endpoint="llm_messages_stream",
+            )
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if chunk.type == "content" and chunk.content:
+                        # 去掉首个 token 的前导空白，以避免前端出现空白行
+                        meter.token()
+                        yield _format_sse({"type": "token", "content": chunk.content})
+                    elif chunk.type == "end":
+                        meter.finish(chunk.usage)
+                        total_tokens = chunk.usage.get("total_tokens") if chunk.usage else None
+                        event_payload = {
+                            "type": "end",
+                            "messageId": message_id,
+                            "totalTokens": total_tokens,
+                            "traceId": trace_id,
+                        }
+                        if chunk.model:
+                            event_payload["model"] = chunk.model
+                        if chunk.route:
+                            event_payload["routing"] = chunk.route
+                        yield _format_sse(event_payload)
+                        break
         except ValueError as exc:
             yield _format_sse({"type": "error", "message": str(exc)})
 
-    return StreamingResponse(
+    return EventStreamResponse(
         event_publisher(),
-        media_type="text/event-stream",
+        meter=meter,
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -1,22 +1,44 @@
 """Endpoints for multimodal materials ingestion and retrieval.
 
 This first iteration stores uploads in a local temporary directory and returns
-basic metadata. S3 persistence is not implemented yet; requesting original file
-URL will return 501 Not Implemented as per product decision.
+basic metadata. S3 persistence is not implemented yet; ``original-url`` hands
+out signed, expiring local URLs (S3 presign style) that serve the upload with
+HTTP Range support, so PDFs and videos can be previewed and seeked. Quotas,
+expiry, cold-tier compression and deletes are handled by the storage lifecycle
+manager (``app.services.storage_lifecycle``); whole course ZIPs are ingested
+by ``app.services.archive_ingest``.
 """
 
 from __future__ import annotations
 
+import asyncio
+import json
+import mimetypes
 import os
 import shutil
+import time
 import uuid
+from contextlib import aclosing
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, AsyncIterator, Literal
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile, status
 from pydantic import BaseModel, Field
 
-from app.core.config import settings
+from app.core.files import LocalFileResponse
+from app.core.streaming import EventStreamResponse
+from app.core.tracing import span
+from app.services import signed_urls
+from app.services.archive_ingest import get_archive_ingestion
+from app.services.jobs import get_job_registry
+from app.services.material_store import ALLOWED_SUFFIXES, get_material_store
+from app.services.indexing import get_material_indexer
+from app.services.parsing import SUPPORTED_MODES, resolve_mode, run_artifacts, run_index, run_parse
+from app.services.semantic_cache import get_semantic_cache
+from app.services.storage_lifecycle import QuotaExceeded, get_storage_lifecycle
+from app.services.study_artifacts import get_study_artifact_service
 
 
 router = APIRouter(prefix="/materials", tags=["materials"])
@@ -43,9 +65,7 @@ class MaterialMeta(BaseModel):
 
 
 def _ensure_tmp_dir() -> Path:
-    tmp = Path(settings.storage_tmp_dir)
-    tmp.mkdir(parents=True, exist_ok=True)
-    return tmp
+    return get_material_store().root
 
 
 def _validate_size(file: UploadFile) -> None:
@@ -62,23 +82,8 @@ async def upload_material(
     title: str | None = Form(default=None),
     tags: str | None = Form(default=None),
 ) -> dict[str, Any]:
-    allowed = {
-        "txt",
-        "pdf",
-        "ppt",
-        "pptx",
-        "doc",
-        "docx",
-        "jpg",
-        "jpeg",
-        "png",
-        "mp3",
-        "m4a",
-        "wav",
-        "mp4",
-    }
     suffix = (file.filename or "").split(".")[-1].lower()
-    if suffix not in allowed:
+    if suffix not in ALLOWED_SUFFIXES:
         raise HTTPException(status_code=400, detail=f"Unsupported file type: .{suffix}")
 
     _validate_size(file)
@@ -89,8 +94,27 @@ async def upload_material(
     dest = tmp_dir / (file.filename or "upload.bin")
 
     # Persist to local tmp
-    with dest.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
+    with span("materials.persist", **{"material.id": mat_id, "material.suffix": suffix}) as persist_span:
+        with dest.open("wb") as f:
+            shutil.copyfileobj(file.file, f)
+        persist_span.set(**{"material.size_bytes": dest.stat().st_size})
+
+    lifecycle = get_storage_lifecycle()
+    try:
+        await lifecycle.admit_upload(courseId, dest.stat().st_size)
+    except QuotaExceeded as exc:
+        lifecycle.delete(mat_id, "rejected")
+        raise HTTPException(status_code=status.HTTP_507_INSUFFICIENT_STORAGE, detail=str(exc)) from exc
+    get_material_store().write_meta(
+        mat_id,
+        courseId=courseId,
+        title=title,
+        tags=tags,
+        mime=file.content_type or "application/octet-stream",
+        originalName=file.filename or "unknown",
+        createdAt=datetime.now(timezone.utc).isoformat(),
+        tier="hot",
+    )
 
     payload = MaterialStatus(
         materialId=mat_id,
@@ -102,6 +126,35 @@ async def upload_material(
     return {"data": payload.model_dump(by_alias=True), "error": None}
 
 
+@router.post("/archive")
+async def upload_archive(
+    file: UploadFile = File(...),
+    courseId: str | None = Form(default=None),
+    tags: str | None = Form(default=None),
+    parse: bool = Form(default=True),
+    mode: Literal["auto", "vision", "asr", "text"] = Form(default="auto"),
+) -> EventStreamResponse:
+    """Create one material per file of a course ZIP and stream per-file progress (SSE).
+
+    Entries follow the single-upload rules (allowed types, size limits); the
+    batch is published at once and parse jobs are queued for every material.
+    Disconnecting stops extraction but not parse jobs that were already queued.
+    """
+    ingestion = get_archive_ingestion()
+    try:
+        archive, entries = await asyncio.to_thread(ingestion.open, file.file)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    events = ingestion.ingest(archive, entries, course_id=courseId, tags=tags, parse=parse, mode=mode)
+
+    async def publish() -> AsyncIterator[str]:
+        async with aclosing(events):
+            async for event in events:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return EventStreamResponse(publish(), headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.get("/{material_id}")
 async def get_material(material_id: str) -> dict[str, Any]:
     # Minimal stub: read from tmp folder if exists
@@ -109,30 +162,78 @@ async def get_material(material_id: str) -> dict[str, Any]:
     if not tmp_dir.exists():
         raise HTTPException(status_code=404, detail="Material not found")
 
-    # Placeholder metadata
+    # upload metadata plus the parse status from the background job record
+    store = get_material_store()
+    store.touch(material_id)
+    upload = store.read_meta(material_id)
+    parse_status = store.read_status(material_id) or {}
+    indexer = get_material_indexer()
+    manifest = indexer.manifest(material_id) if indexer is not None else None
     meta = MaterialMeta(
         materialId=material_id,
-        courseId=None,
-        title=None,
-        mime="application/octet-stream",
-        status="uploaded",
-        createdAt=None,
-        updatedAt=None,
+        courseId=upload.get("courseId"),
+        title=upload.get("title"),
+        mime=upload.get("mime", "application/octet-stream"),
+        status=parse_status.get("status", "uploaded"),
+        createdAt=upload.get("createdAt"),
+        updatedAt=parse_status.get("updatedAt"),
         originalUrl=None,
-        meta={},
+        meta={
+            **{k: v for k, v in parse_status.items() if k not in {"status", "updatedAt"}},
+            "tier": upload.get("tier", "hot"),
+            "indexVersion": manifest["version"] if manifest else None,
+        },
     )
     return {"data": meta.model_dump(by_alias=True), "error": None}
 
 
+def _check_original(material_id: str) -> None:
+    # IDs are single path segments; refuse "." / ".." so URLs cannot escape the store
+    store = get_material_store()
+    if material_id in {".", ".."} or (
+        store.original_file(material_id) is None and store.cold_file(material_id) is None
+    ):
+        raise HTTPException(status_code=404, detail="Material not found")
+
+
 @router.get("/{material_id}/original-url")
-async def get_original_presigned_url(material_id: str) -> dict[str, Any]:
-    # S3 not implemented: return 501
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail=(
-            "S3 not configured: set S3_ENDPOINT/S3_BUCKET/S3_ACCESS_KEY/"
-            "S3_SECRET_KEY to enable presigned URLs"
-        ),
+async def get_original_presigned_url(material_id: str, request: Request) -> dict[str, Any]:
+    """Issue a signed, expiring URL for the uploaded file (local serving)."""
+    _check_original(material_id)
+    expires, signature = signed_urls.issue(material_id)
+    url = str(request.url_for("get_original_file", material_id=material_id))
+    return {
+        "data": {
+            "url": f"{url}?{urlencode({'expires': expires, 'signature': signature})}",
+            "expiresAt": datetime.fromtimestamp(expires, timezone.utc).isoformat(),
+            "mode": "local",
+        },
+        "error": None,
+    }
+
+
+@router.api_route("/{material_id}/original", methods=["GET", "HEAD"])
+async def get_original_file(
+    material_id: str,
+    expires: int = Query(...),
+    signature: str = Query(...),
+) -> LocalFileResponse:
+    """Serve the upload behind a signed URL; supports Range and conditional requests."""
+    if not signed_urls.verify(material_id, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired signature")
+    _check_original(material_id)
+    original = await get_storage_lifecycle().restore(material_id)
+    if original is None:
+        raise HTTPException(status_code=404, detail="Material not found")
+    stat_result = original.stat()
+    return LocalFileResponse(
+        original,
+        stat_result=stat_result,
+        media_type=mimetypes.guess_type(original.name)[0] or "application/octet-stream",
+        filename=original.name,
+        content_disposition_type="inline",
+        # the URL itself expires; caches must not outlive it
+        headers={"Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}"},
     )
 
 
@@ -142,27 +243,63 @@ async def list_chunks(
     offset: int = 0,
     limit: int = 100,
     type: Literal["text", "caption"] | None = None,
+    includeDuplicates: bool = True,
 ) -> dict[str, Any]:
-    # Placeholder: return empty list, wired for future parser output
-    items: list[dict[str, Any]] = []
-    return {"data": {"items": items, "pagination": {"offset": offset, "limit": limit, "total": 0}}, "error": None}
+    store = get_material_store()
+    if not store.exists(material_id):
+        raise HTTPException(status_code=404, detail="Material not found")
+    store.touch(material_id)
+    chunks = store.list_chunks(material_id, type=type)
+    if not includeDuplicates:
+        chunks = [chunk for chunk in chunks if "duplicateOf" not in chunk]
+    items = chunks[offset : offset + limit]
+    return {
+        "data": {"items": items, "pagination": {"offset": offset, "limit": limit, "total": len(chunks)}},
+        "error": None,
+    }
 
 
 @router.post("/{material_id}/parse")
 async def reparse(material_id: str, mode: Literal["auto", "vision", "asr", "text"] = "auto") -> dict[str, Any]:
-    # Placeholder: accept and return current status
-    tmp_dir = _ensure_tmp_dir() / material_id
-    if not tmp_dir.exists():
+    """Start (or resume) parsing in the background.
+
+    Vision parsing captions rendered pages; pages captioned by an earlier,
+    cancelled or failed run are kept, so calling this again resumes the job.
+    """
+    store = get_material_store()
+    if not store.exists(material_id):
         raise HTTPException(status_code=404, detail="Material not found")
-    return {"data": {"materialId": material_id, "accepted": True, "mode": mode}, "error": None}
+
+    # cold originals are decompressed before the job reads them
+    resolved = resolve_mode(await get_storage_lifecycle().restore(material_id), mode)
+    if resolved not in SUPPORTED_MODES:
+        return {"data": {"materialId": material_id, "accepted": True, "mode": resolved}, "error": None}
+
+    jobs = get_job_registry()
+    if not jobs.is_running(material_id):
+        # cached answers may quote the old content
+        get_semantic_cache().invalidate_material(material_id)
+        store.clear_cancelled(material_id)
+        store.write_status(material_id, "queued", mode=resolved)
+        jobs.start(material_id, run_parse(material_id, resolved))
+    status_record = store.read_status(material_id) or {}
+    return {
+        "data": {
+            "materialId": material_id,
+            "accepted": True,
+            "mode": resolved,
+            "status": status_record.get("status", "queued"),
+        },
+        "error": None,
+    }
 
 
 @router.post("/{material_id}/cancel")
 async def cancel_parse(material_id: str) -> dict[str, Any]:
-    """Cancel parsing task for a material (placeholder).
+    """Cancel the parsing task for a material.
 
-    Since parsing queue isn't wired yet, we simply create a cancellation flag
-    under the material tmp directory so future workers can short‑circuit.
+    A cancellation flag is written under the material tmp directory so workers
+    short‑circuit, and the in-process job (if any) is cancelled.
     """
     tmp_dir = _ensure_tmp_dir() / material_id
     if not tmp_dir.exists():
@@ -174,26 +311,124 @@ async def cancel_parse(material_id: str) -> dict[str, Any]:
     except OSError:
         # best-effort; still report accepted
         pass
+    # the flag stops jobs between batches; cancelling the task aborts in-flight requests
+    get_job_registry().cancel(material_id)
     return {"data": {"cancelled": True}, "error": None}
 
 
 @router.post("/{material_id}/index", status_code=status.HTTP_202_ACCEPTED)
 async def trigger_index(material_id: str) -> dict[str, Any]:
-    """Trigger background parsing/indexing for a material (placeholder).
+    """Incrementally re-index the material's current chunks in the background.
 
-    This validates that the material exists in tmp storage and immediately
-    returns 202 Accepted. Background job wiring will be added later.
+    Only new or changed chunks are embedded; the previous index version keeps
+    serving ``/search`` until the new one is swapped in. A running parse job
+    re-indexes when it finishes, so no extra job is started then.
     """
     tmp_dir = _ensure_tmp_dir() / material_id
     if not tmp_dir.exists():
         raise HTTPException(status_code=404, detail="Material not found")
-    return {"data": {"accepted": True}, "error": None}
+    indexer = get_material_indexer()
+    if indexer is None:
+        return {"data": {"accepted": False, "reason": "embedding_not_configured"}, "error": None}
+    get_semantic_cache().invalidate_material(material_id)
+    jobs = get_job_registry()
+    if not jobs.is_running(material_id):
+        jobs.start(f"index:{material_id}", run_index(material_id))
+    manifest = indexer.manifest(material_id)
+    return {"data": {"accepted": True, "version": manifest["version"] if manifest else None}, "error": None}
+
+
+@router.get("/{material_id}/search")
+async def search_material(
+    material_id: str,
+    q: str = Query(..., min_length=1),
+    topK: int = Query(default=5, ge=1, le=50),
+) -> dict[str, Any]:
+    """Semantic search over the material's live index version."""
+    store = get_material_store()
+    if not store.exists(material_id):
+        raise HTTPException(status_code=404, detail="Material not found")
+    indexer = get_material_indexer()
+    if indexer is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Embedding model not configured: set EMB_BASEURL/EMB_MODEL to enable search",
+        )
+    store.touch(material_id)
+    try:
+        items = await indexer.search(material_id, q, topK)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    manifest = indexer.manifest(material_id)
+    return {
+        "data": {"items": items, "version": manifest["version"] if manifest else None},
+        "error": None,
+    }
+
+
+@router.get("/{material_id}/artifacts")
+async def get_artifacts(
+    material_id: str,
+    kind: Literal["summary", "outline", "questions"] | None = None,
+) -> dict[str, Any]:
+    """Precomputed study artifacts, served only while they match the material's content.
+
+    ``status`` is ``ready``, ``stale`` (built from older content), ``running``
+    or ``missing``; items are returned only when ``ready``.
+    """
+    store = get_material_store()
+    if not store.exists(material_id):
+        raise HTTPException(status_code=404, detail="Material not found")
+    store.touch(material_id)
+    service = get_study_artifact_service()
+    record = service.read(material_id) or {}
+    items = record.get("items") or {}
+    if get_job_registry().is_running(f"artifacts:{material_id}"):
+        state = "running"
+    elif not items:
+        state = "missing"
+    elif record.get("contentHash") != service.current_hash(material_id):
+        state = "stale"
+    else:
+        state = "ready"
+    if state != "ready":
+        items = {}
+    elif kind is not None:
+        items = {kind: items[kind]} if kind in items else {}
+    return {
+        "data": {
+            "materialId": material_id,
+            "status": state,
+            "generatedAt": record.get("generatedAt"),
+            "items": items,
+            "lastRun": record.get("lastRun"),
+        },
+        "error": None,
+    }
+
+
+@router.post("/{material_id}/artifacts", status_code=status.HTTP_202_ACCEPTED)
+async def trigger_artifacts(material_id: str, force: bool = False) -> dict[str, Any]:
+    """Generate study artifacts in the background.
+
+    Artifacts that still match the content are kept unless ``force`` is set.
+    A running parse job generates them itself when ``ARTIFACTS_ENABLED``.
+    """
+    store = get_material_store()
+    if not store.exists(material_id):
+        raise HTTPException(status_code=404, detail="Material not found")
+    jobs = get_job_registry()
+    started = False
+    if not jobs.is_running(material_id):
+        started = jobs.start(f"artifacts:{material_id}", run_artifacts(material_id, force=force))
+    return {"data": {"accepted": True, "started": started}, "error": None}
 
 
 @router.get("")
 async def list_materials(limit: int = 50, offset: int = 0) -> dict[str, Any]:
     base = _ensure_tmp_dir()
-    ids = [p.name for p in base.iterdir() if p.is_dir()]
+    # dot-directories (.trash) belong to the lifecycle manager
+    ids = [p.name for p in base.iterdir() if p.is_dir() and not p.name.startswith(".")]
     total = len(ids)
     page = ids[offset : offset + limit]
     items = [
@@ -208,10 +443,9 @@ async def list_materials(limit: int = 50, offset: int = 0) -> dict[str, Any]:
 
 @router.delete("/{material_id}")
 async def delete_material(material_id: str) -> dict[str, Any]:
-    tmp_dir = _ensure_tmp_dir() / material_id
-    if not tmp_dir.exists():
+    # renamed away now, removed in the background (also drops cached answers)
+    if material_id in {".", ".."} or not get_storage_lifecycle().delete(material_id):
         raise HTTPException(status_code=404, detail="Material not found")
-    shutil.rmtree(tmp_dir, ignore_errors=True)
     return {"data": {"deleted": True}, "error": None}
 
 
@@ -0,0 +1,37 @@
+"""Prometheus scrape endpoint, rate limit consumption and storage usage."""
+
+from typing import Any, Literal
+
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
+from app.services.rate_limit import get_rate_limiter
+from app.services.storage_lifecycle import get_storage_lifecycle
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Expose counters and histograms in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/rate-limits", summary="Per-key rate limit consumption")
+async def rate_limit_stats(
+    scope: Literal["user", "session", "course"] | None = None,
+    top: int = Query(default=50, ge=1, le=1000),
+) -> dict[str, Any]:
+    """Requests, rejections and charged tokens per key, as seen by this worker."""
+    limiter = get_rate_limiter()
+    return {
+        "data": {"enabled": limiter is not None, "items": limiter.stats(scope, top) if limiter else []},
+        "error": None,
+    }
+
+
+@router.get("/metrics/storage", summary="Storage usage by course and type")
+async def storage_usage() -> dict[str, Any]:
+    """Scan STORAGE_TMP_DIR and report usage by course, type and tier plus the last sweep."""
+    return {"data": await get_storage_lifecycle().usage(), "error": None}
@@ -13,13 +13,19 @@ frontend integration can proceed while the VLM client is wired later.
 from __future__ import annotations
 
 import json
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncIterator
+from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from app.core.metrics import StreamMeter
+from app.core.streaming import EventStreamResponse
+from app.core.tracing import current_trace_id, span, start_span
 from app.services.llm_service import LLMService, get_llm_service
+from app.services.semantic_cache import SemanticCache, get_semantic_cache
+from app.services.stream_buffer import get_stream_registry, new_stream_id, parse_event_id
 
 
 router = APIRouter(prefix="/qa", tags=["qa"])
@@ -28,88 +34,126 @@ router = APIRouter(prefix="/qa", tags=["qa"])
 class InstantJson(BaseModel):
     message: str
     material_ids: list[str] | None = Field(default=None, alias="materialIds")
+    course_id: str | None = Field(default=None, alias="courseId")
     session_id: str | None = Field(default=None, alias="sessionId")
     hints: dict[str, Any] | None = None
 
 
-def _format_sse(payload: dict[str, Any]) -> str:
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+# 明确 SSE 推荐响应头
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # 兼容某些代理禁用缓冲
+}
 
 
 @router.post("/instant")
-async def qa_instant(request: Request, llm_service: LLMService = Depends(get_llm_service)) -> StreamingResponse:
+async def qa_instant(
+    request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache),
+) -> EventStreamResponse:
     """Multimodal instant Q&A (placeholder streaming).
 
     Accepts either multipart/form-data or application/json:
       - multipart: fields: message (str), file (0..n), hints (json string)
       - json: { message, materialIds?, hints? }
+
+    Stand-alone questions (no history, no uploaded files) are answered from
+    the semantic cache when a similar question was asked in the same
+    course/material scope; the ``end`` event then carries ``cache``.
+
+    A reconnect carrying ``Last-Event-ID`` resumes the buffered stream of that
+    message (attaching to the generation if it is still running). Event IDs
+    are per-stream resume tokens, not the ``messageId``, so only the client
+    that received the stream can resume it.
     """
+    registry = get_stream_registry()
+    resume = parse_event_id(request.headers.get("last-event-id"))
+    if resume is not None:
+        buffer = registry.get(resume[0])
+        if buffer is not None:
+            return EventStreamResponse(registry.subscribe(buffer, after=resume[1]), headers=_SSE_HEADERS)
+        if await registry.has_remote(resume[0]):
+            # generated by another worker: follow it through shared state
+            return EventStreamResponse(registry.follow_remote(resume[0], after=resume[1]), headers=_SSE_HEADERS)
+        # buffer expired: fall through and answer the (re-sent) question again
 
     ctype = request.headers.get("content-type", "").lower()
     message: str
     file_count = 0
     material_ids: list[str] | None = None
+    course_id: str | None = None
     session_id: str | None = None
     history: list[dict[str, str]] = []
 
-    if ctype.startswith("multipart/"):
-        form = await request.form()
-        message = str(form.get("message") or "")
-        files = form.getlist("file") if hasattr(form, "getlist") else []
-        file_count = len(files)
-        # optional: hints JSON (may contain previousMessages / sessionId)
-        hints_raw = form.get("hints")
-        if hints_raw:
+    with span("qa.parse_body", **{"http.content_type": ctype.split(";")[0]}):
+        if ctype.startswith("multipart/"):
+            form = await request.form()
+            message = str(form.get("message") or "")
+            files = form.getlist("file") if hasattr(form, "getlist") else []
+            file_count = len(files)
+            # optional: hints JSON (may contain previousMessages / sessionId)
+            hints_raw = form.get("hints")
+            if hints_raw:
+                try:
+                    hints_obj = json.loads(str(hints_raw))
+                    if isinstance(hints_obj, dict):
+                        pm = hints_obj.get("previousMessages")
+                        if isinstance(pm, list):
+                            history = [
+                                {"role": str(i.get("role")), "content": str(i.get("content", ""))}
+                                for i in pm
+                                if isinstance(i, dict) and i.get("role") and i.get("content")
+                            ]
+                        sid = hints_obj.get("sessionId")
+                        if isinstance(sid, str) and sid:
+                            session_id = sid
+                        cid = hints_obj.get("courseId")
+                        if isinstance(cid, str) and cid:
+                            course_id = cid
+                except Exception:  # noqa: BLE001
+                    pass
+        else:
             try:
-                hints_obj = json.loads(str(hints_raw))
-                if isinstance(hints_obj, dict):
-                    pm = hints_obj.get("previousMessages")
-                    if isinstance(pm, list):
-                        history = [
-                            {"role": str(i.get("role")), "content": str(i.get("content", ""))}
-                            for i in pm
-                            if isinstance(i, dict) and i.get("role") and i.get("content")
-                        ]
-                    sid = hints_obj.get("sessionId")
-                    if isinstance(sid, str) and sid:
-                        session_id = sid
-            except Exception:  # noqa: BLE001
-                pass
-    else:
-        try:
-            data = await request.json()
-        except Exception as exc:  # noqa: BLE001
-            # 如果前端错误地以 JSON 头发送了空体,返回更友好的信息
-            raise HTTPException(status_code=400, detail="Invalid JSON body: empty or malformed") from exc
-        payload = InstantJson.model_validate(data)
-        message = payload.message
-        material_ids = payload.material_ids
-        session_id = payload.session_id
-        if payload.hints and isinstance(payload.hints, dict):
-            pm = payload.hints.get("previousMessages")
-            if isinstance(pm, list):
-                history = [
-                    {"role": str(i.get("role")), "content": str(i.get("content", ""))}
-                    for i in pm
-                    if isinstance(i, dict) and i.get("role") and i.get("content")
-                ]
-
-    async def stream() -> Any:
+                data = await request.json()
+            except Exception as exc:  # noqa: BLE001
+                # 如果前端错误地以 JSON 头发送了空体,返回更友好的信息
+                raise HTTPException(status_code=400, detail="Invalid JSON body: empty or malformed") from exc
+            payload = InstantJson.model_validate(data)
+            message = payload.message
+            material_ids = payload.material_ids
+            course_id = payload.course_id
+            session_id = payload.session_id
+            if payload.hints and isinstance(payload.hints, dict):
+                pm = payload.hints.get("previousMessages")
+                if isinstance(pm, list):
+                    history = [
+                        {"role": str(i.get("role")), "content": str(i.get("content", ""))}
+                        for i in pm
+                        if isinstance(i, dict) and i.get("role") and i.get("content")
+                    ]
+
+    trace_id = current_trace_id()
+    meter = StreamMeter("qa_instant")
+    message_id = f"msg_{uuid4().hex[:12]}"
+
+    async def stream() -> AsyncIterator[dict[str, Any]]:
         # 将旧版 /llm/messages/stream 的核心逻辑迁移到此：
         # 1) 发送 start
         # 2) 逐个 token 下发
         # 3) 结束事件 end
-        message_id = "msg_stub"
-        start_payload = {"type": "start", "messageId": message_id}
+        start_payload = {"type": "start", "messageId": message_id, "traceId": trace_id}
         if session_id:
             start_payload["sessionId"] = session_id
-        yield _format_sse(start_payload)
+        yield start_payload
 
         if not message:
-            yield _format_sse({"type": "error", "message": "message 不能为空"})
+            yield {"type": "error", "message": "message 不能为空"}
             return
 
         # 目前忽略上传的文件/材料 ID；先基于历史上下文 + 本轮问题进行文本回答，后续接入 VLM。
+        history_span = start_span("qa.build_history", **{"qa.history": len(history)})
         messages = []
         if history:
             # 截断最后 10 条以控制长度
@@ -120,41 +164,76 @@ async def qa_instant(request: Request, llm_service: LLMService = Depends(get_llm
                 if role in {"system", "user", "assistant"} and isinstance(content, str):
                     messages.append({"role": role, "content": content})
         messages.append({"role": "user", "content": message})
+        history_span.end()
+
+        # 语义缓存：仅用于无上下文、无上传文件的独立问题
+        lookup = None
+        if semantic_cache.enabled and not history and not file_count:
+            with span("qa.semantic_cache") as cache_span:
+                lookup = await semantic_cache.lookup(message, course_id=course_id, material_ids=material_ids or ())
+                cache_span.set(**{"cache.hit": lookup.hit, "cache.similarity": round(lookup.similarity, 4)})
+            if lookup.entry is not None:
+                meter.token()
+                meter.finish(None)
+                yield {"type": "token", "content": lookup.entry.answer}
+                cached_end: dict[str, Any] = {"type": "end", "messageId": message_id, "traceId": trace_id}
+                if lookup.entry.model:
+                    cached_end["model"] = lookup.entry.model
+                cached_end["cache"] = lookup.to_dict()
+                yield cached_end
+
+                async def regenerate() -> str:
+                    result = await llm_service.generate_completion(messages=messages, endpoint="qa_instant")
+                    return result.content
+
+                semantic_cache.maybe_audit(lookup, regenerate)
+                return
 
         try:
             got_any_token = False
-            async for chunk in llm_service.stream_completion(messages=messages):
-                if chunk.type == "content" and chunk.content:
-                    got_any_token = True
-                    yield _format_sse({"type": "token", "content": chunk.content})
-                elif chunk.type == "end":
-                    # 若未收到任何 token，降级为非流式补发一次完整回答
-                    if not got_any_token:
-                        try:
-                            result = await llm_service.generate_completion(messages=messages)
-                            if result.content:
-                                yield _format_sse({"type": "token", "content": result.content})
-                        except ValueError as exc:
-                            yield _format_sse({"type": "error", "message": str(exc)})
-                            break
-                    event_payload: dict[str, Any] = {"type": "end", "messageId": message_id}
-                    if chunk.model:
-                        event_payload["model"] = chunk.model
-                    yield _format_sse(event_payload)
-                    break
+            answer_parts: list[str] = []
+            attachments = bool(file_count or material_ids)
+            chunks = llm_service.stream_completion(messages=messages, endpoint="qa_instant", attachments=attachments)
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if chunk.type == "content" and chunk.content:
+                        got_any_token = True
+                        meter.token()
+                        answer_parts.append(chunk.content)
+                        yield {"type": "token", "content": chunk.content}
+                    elif chunk.type == "end":
+                        usage = chunk.usage
+                        # 若未收到任何 token，降级为非流式补发一次完整回答
+                        if not got_any_token:
+                            try:
+                                result = await llm_service.generate_completion(
+                                    messages=messages, endpoint="qa_instant", attachments=attachments
+                                )
+                                if result.content:
+                                    meter.token()
+                                    usage = result.usage
+                                    answer_parts.append(result.content)
+                                    yield {"type": "token", "content": result.content}
+                            except ValueError as exc:
+                                yield {"type": "error", "message": str(exc)}
+                                break
+                        meter.finish(usage)
+                        event_payload: dict[str, Any] = {"type": "end", "messageId": message_id, "traceId": trace_id}
+                        if chunk.model:
+                            event_payload["model"] = chunk.model
+                        if chunk.route:
+                            event_payload["routing"] = chunk.route
+                        if lookup is not None:
+                            semantic_cache.store(lookup, "".join(answer_parts), model=chunk.model)
+                            event_payload["cache"] = lookup.to_dict()
+                        yield event_payload
+                        break
         except ValueError as exc:
-            yield _format_sse({"type": "error", "message": str(exc)})
-
-    # 明确 SSE 推荐响应头
-    return StreamingResponse(
-        stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache, no-transform",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # 兼容某些代理禁用缓冲
-        },
-    )
+            yield {"type": "error", "message": str(exc)}
+
+    # 生成在后台运行并写入缓冲区；断线重连（Last-Event-ID）可从缓冲区续传
+    buffer = registry.start(new_stream_id(), stream(), meter=meter)
+    return EventStreamResponse(registry.subscribe(buffer), headers=_SSE_HEADERS)
 
 
 @router.post("/knowledge")
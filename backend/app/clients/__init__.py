@@ -1,6 +1,15 @@
 """Client abstractions for external providers such as OpenAI."""
 
+from .asr_client import ASRClient, OpenAIASRClient
 from .base import LLMClient
+from .embedding_client import EmbeddingClient, OpenAIEmbeddingClient
 from .openai_client import OpenAIClient
 
-__all__ = ["LLMClient", "OpenAIClient"]
+__all__ = [
+    "ASRClient",
+    "EmbeddingClient",
+    "LLMClient",
+    "OpenAIASRClient",
+    "OpenAIClient",
+    "OpenAIEmbeddingClient",
+]
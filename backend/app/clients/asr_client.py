@@ -0,0 +1,109 @@
+"""Async client for OpenAI-compatible speech-to-text (``/audio/transcriptions``)."""
+
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+import httpx
+
+from .openai_client import DEFAULT_OPENAI_BASE_URL, _extract_error_detail
+
+
+@dataclass(slots=True)
+class ASRSegment:
+    """Timed piece of a transcript; times are seconds relative to the audio sent."""
+
+    start: float
+    end: float
+    text: str
+
+
+@dataclass(slots=True)
+class ASRResult:
+    """Transcript of one audio payload."""
+
+    text: str
+    segments: list[ASRSegment] = field(default_factory=list)
+    language: str | None = None
+
+
+class ASRClient(ABC):
+    """Abstract base class for speech recognition providers."""
+
+    @abstractmethod
+    async def transcribe(
+        self,
+        audio: bytes,
+        *,
+        filename: str = "audio.wav",
+        language: str | None = None,
+    ) -> ASRResult:
+        """Transcribe ``audio`` and return text with segment timestamps."""
+
+
+class OpenAIASRClient(ASRClient):
+    """Minimal OpenAI-compatible transcription client (Whisper style API)."""
+
+    def __init__(self, api_key: str | None, model: str, base_url: str = DEFAULT_OPENAI_BASE_URL, timeout: int = 60) -> None:
+        self._api_key = api_key
+        self._model = model
+        self._base_url = base_url
+        self._timeout = timeout
+
+    async def transcribe(
+        self,
+        audio: bytes,
+        *,
+        filename: str = "audio.wav",
+        language: str | None = None,
+    ) -> ASRResult:
+        if not self._api_key:
+            msg = "ASR API key must be provided (ASR_APIKEY)."
+            raise ValueError(msg)
+
+        data = {"model": self._model, "response_format": "verbose_json"}
+        if language and language != "auto":
+            data["language"] = language
+
+        async with httpx.AsyncClient(timeout=self._timeout) as client:
+            response = await client.post(
+                self._transcriptions_url,
+                headers={"Authorization": f"Bearer {self._api_key}"},
+                data=data,
+                files={"file": (filename, audio, "audio/wav")},
+            )
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            detail = _extract_error_detail(exc.response)
+            msg = f"ASR request failed: {detail}"
+            raise ValueError(msg) from exc
+
+        try:
+            payload = response.json()
+        except json.JSONDecodeError as exc:
+            msg = "ASR provider returned a non-JSON response. Please verify ASR_BASEURL/ASR_MODEL."
+            raise ValueError(msg) from exc
+
+        segments = [
+            ASRSegment(
+                start=float(item.get("start") or 0.0),
+                end=float(item.get("end") or 0.0),
+                text=str(item.get("text") or "").strip(),
+            )
+            for item in payload.get("segments") or []
+            if isinstance(item, dict)
+        ]
+        return ASRResult(
+            text=str(payload.get("text") or "").strip(),
+            segments=segments,
+            language=payload.get("language"),
+        )
+
+    @property
+    def _transcriptions_url(self) -> str:
+        base = self._base_url.rstrip("/")
+        return f"{base}/audio/transcriptions"
@@ -11,7 +11,7 @@ class LLMClient(ABC):
     @abstractmethod
     async def generate(
         self,
-        messages: Sequence[dict[str, str]],
+        messages: Sequence[dict[str, Any]],
         *,
         options: "LLMGenerationOptions | None" = None,
     ) -> "LLMGenerationResult":
@@ -20,12 +20,18 @@ class LLMClient(ABC):
     @abstractmethod
     async def stream(
         self,
-        messages: Sequence[dict[str, str]],
+        messages: Sequence[dict[str, Any]],
         *,
         options: "LLMGenerationOptions | None" = None,
     ) -> AsyncIterator["LLMStreamChunk"]:
         """Execute a streaming request yielding incremental content."""
 
+    async def aclose(self) -> None:
+        """Release pooled resources; no-op for clients without any."""
+
+    async def warm(self, connections: int = 1) -> None:
+        """Open pooled connections before traffic arrives; no-op for clients without a pool."""
+
 
 @dataclass(slots=True)
 class LLMGenerationOptions:
@@ -43,6 +49,8 @@ class LLMGenerationResult:
     model: str | None = None
     usage: dict[str, Any] | None = None
     raw: dict[str, Any] | None = None
+    # routing decision attached by LLMService (see app.services.routing)
+    route: dict[str, Any] | None = None
 
 
 @dataclass(slots=True)
@@ -53,3 +61,4 @@ class LLMStreamChunk:
     content: str | None = None
     usage: dict[str, Any] | None = None
     model: str | None = None
+    route: dict[str, Any] | None = None
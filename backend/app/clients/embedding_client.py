@@ -0,0 +1,123 @@
+"""Async client for OpenAI-compatible text embeddings (``/embeddings``)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+import httpx
+
+from app.core.metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY
+
+from .openai_client import DEFAULT_OPENAI_BASE_URL, _error_kind, _extract_error_detail
+
+
+class EmbeddingClient(ABC):
+    """Abstract base class for embedding providers."""
+
+    @abstractmethod
+    async def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        """Return one vector per input text, in input order."""
+
+    async def aclose(self) -> None:
+        """Release pooled connections; clients without a pool need nothing."""
+
+    async def warm(self, connections: int = 1) -> None:
+        """Open pooled connections before traffic arrives; clients without a pool need nothing."""
+
+
+class OpenAIEmbeddingClient(EmbeddingClient):
+    """Minimal OpenAI-compatible embeddings client (EMB_* settings)."""
+
+    def __init__(
+        self,
+        api_key: str | None,
+        model: str,
+        base_url: str = DEFAULT_OPENAI_BASE_URL,
+        timeout: int = 30,
+        provider: str = "openai",
+        batch_size: int = 64,
+        dimensions: int | None = None,
+    ) -> None:
+        self._api_key = api_key
+        self._model = model
+        self._base_url = base_url
+        self._timeout = timeout
+        self._provider = provider
+        self._batch_size = max(1, batch_size)
+        self._dimensions = dimensions
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._http: httpx.AsyncClient | None = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # embeddings sit on the request path: keep connections warm per event loop
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self._timeout)
+            self._loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def warm(self, connections: int = 1) -> None:
+        """Leave ``connections`` keep-alive connections in the pool (any HTTP answer will do)."""
+        client = self._client()
+        url = f"{self._base_url.rstrip('/')}/models"
+        headers = {"Authorization": f"Bearer {self._api_key}"}
+        await asyncio.gather(*(client.get(url, headers=headers) for _ in range(max(1, connections))))
+
+    async def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        if not self._api_key:
+            msg = "Embedding API key must be provided (EMB_APIKEY)."
+            raise ValueError(msg)
+
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), self._batch_size):
+            vectors.extend(await self._embed_batch(list(texts[start : start + self._batch_size])))
+        return vectors
+
+    async def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        payload: dict[str, object] = {"model": self._model, "input": batch}
+        if self._dimensions:
+            payload["dimensions"] = self._dimensions
+        started = time.perf_counter()
+        try:
+            response = await self._client().post(
+                self._embeddings_url,
+                headers={"Authorization": f"Bearer {self._api_key}"},
+                json=payload,
+            )
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as exc:
+                detail = _extract_error_detail(exc.response)
+                msg = f"Embedding request failed: {detail}"
+                raise ValueError(msg) from exc
+            try:
+                data = response.json()["data"]
+            except (json.JSONDecodeError, KeyError, TypeError) as exc:
+                msg = "Embedding provider returned an unexpected response. Please verify EMB_BASEURL/EMB_MODEL."
+                raise ValueError(msg) from exc
+        except Exception as exc:
+            UPSTREAM_ERRORS.inc(self._provider, self._model, "embed", _error_kind(exc))
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, self._provider, self._model, "embed")
+
+        # providers may return items out of order; ``index`` is authoritative
+        ordered = sorted(data, key=lambda item: item.get("index", 0))
+        if len(ordered) != len(batch):
+            msg = f"Embedding provider returned {len(ordered)} vectors for {len(batch)} inputs."
+            raise ValueError(msg)
+        return [list(item["embedding"]) for item in ordered]
+
+    @property
+    def _embeddings_url(self) -> str:
+        base = self._base_url.rstrip("/")
+        return f"{base}/embeddings"
@@ -6,11 +6,17 @@ compatible providers when a custom base URL is provided (e.g. self-hosted gatewa
 
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import AsyncIterator, Final, Sequence
+import time
+from contextlib import aclosing, nullcontext
+from typing import Any, AsyncIterator, Final, Sequence
 
 import httpx
 
+from app.core.metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY, record_usage
+from app.core.tracing import Span, span, start_span
+
 from .base import LLMClient, LLMGenerationOptions, LLMGenerationResult, LLMStreamChunk
 
 DEFAULT_OPENAI_BASE_URL: Final[str] = "https://api.openai.com/v1"
@@ -19,15 +25,61 @@ DEFAULT_OPENAI_BASE_URL: Final[str] = "https://api.openai.com/v1"
 class OpenAIClient(LLMClient):
     """Minimal async OpenAI-compatible client for server-side prompt execution."""
 
-    def __init__(self, api_key: str | None, model: str, base_url: str = DEFAULT_OPENAI_BASE_URL, timeout: int = 60) -> None:
+    def __init__(
+        self,
+        api_key: str | None,
+        model: str,
+        base_url: str = DEFAULT_OPENAI_BASE_URL,
+        timeout: int = 60,
+        provider: str = "openai",
+        max_connections: int = 100,
+        max_concurrency: int = 0,
+    ) -> None:
         self._api_key = api_key
         self._model = model
         self._base_url = base_url
         self._timeout = timeout
+        self._provider = provider
+        self._max_connections = max_connections
+        self._max_concurrency = max_concurrency
+        # pooled per event loop: connections and semaphores cannot cross loops
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._http: httpx.AsyncClient | None = None
+        self._limiter: asyncio.Semaphore | None = None
+
+    def _pool(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore | None]:
+        """Return the shared HTTP client and concurrency limiter for the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop or self._http.is_closed:
+            limits = httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+            )
+            self._http = httpx.AsyncClient(timeout=self._timeout, limits=limits)
+            self._limiter = asyncio.Semaphore(self._max_concurrency) if self._max_concurrency > 0 else None
+            self._loop = loop
+        return self._http, self._limiter
+
+    async def aclose(self) -> None:
+        """Close pooled connections (application shutdown)."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def warm(self, connections: int = 1) -> None:
+        """Open ``connections`` keep-alive connections (TCP + TLS) ahead of the first request.
+
+        Any HTTP answer, even 401/404 from ``/models``, leaves the connection in
+        the pool; transport errors propagate to the caller.
+        """
+        http, _ = self._pool()
+        url = f"{self._base_url.rstrip('/')}/models"
+        count = max(1, min(connections, self._max_connections))
+        await asyncio.gather(*(http.get(url, headers=self._build_headers()) for _ in range(count)))
 
     async def generate(
         self,
-        messages: Sequence[dict[str, str]],
+        messages: Sequence[dict[str, Any]],
         *,
         options: LLMGenerationOptions | None = None,
     ) -> LLMGenerationResult:
@@ -37,8 +89,22 @@ class OpenAIClient(LLMClient):
             raise ValueError(msg)
 
         payload = self._build_payload(messages=messages, options=options)
-
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        model = str(payload["model"])
+        started = time.perf_counter()
+        try:
+            with span("upstream.generate", **{"llm.provider": self._provider, "llm.model": model}):
+                result = await self._generate(payload)
+        except Exception as exc:
+            UPSTREAM_ERRORS.inc(self._provider, model, "generate", _error_kind(exc))
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, self._provider, model, "generate")
+        record_usage(self._provider, model, result.usage)
+        return result
+
+    async def _generate(self, payload: dict[str, object]) -> LLMGenerationResult:
+        client, limiter = self._pool()
+        async with limiter or nullcontext():
             response = await client.post(
                 self._completions_url,
                 headers=self._build_headers(),
@@ -76,7 +142,7 @@ class OpenAIClient(LLMClient):
 
     async def stream(
         self,
-        messages: Sequence[dict[str, str]],
+        messages: Sequence[dict[str, Any]],
         *,
         options: LLMGenerationOptions | None = None,
     ) -> AsyncIterator[LLMStreamChunk]:
@@ -85,16 +151,36 @@ class OpenAIClient(LLMClient):
             msg = "LLM API key must be provided (VLM_APIKEY)."
             raise ValueError(msg)
 
-        payload = self._build_payload(messages=messages, options=options)
-        payload["stream"] = True
-
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        payload = self._build_stream_payload(messages=messages, options=options)
+        model = str(payload["model"])
+        started = time.perf_counter()
+        phases = _StreamPhases(**{"llm.provider": self._provider, "llm.model": model})
+        try:
+            async with aclosing(self._stream_chunks(payload, phases)) as chunks:
+                async for chunk in chunks:
+                    if chunk.type == "end":
+                        record_usage(self._provider, model, chunk.usage)
+                    yield chunk
+        except Exception as exc:
+            UPSTREAM_ERRORS.inc(self._provider, model, "stream", _error_kind(exc))
+            phases.fail(exc)
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, self._provider, model, "stream")
+            phases.close()
+
+    async def _stream_chunks(self, payload: dict[str, object], phases: "_StreamPhases") -> AsyncIterator[LLMStreamChunk]:
+        # Closing this generator early (client disconnect) exits both contexts,
+        # which drops the upstream connection and frees the limiter slot at once.
+        client, limiter = self._pool()
+        async with limiter or nullcontext():
             async with client.stream(
                 "POST",
                 self._completions_url,
                 headers=self._build_headers(),
                 json=payload,
             ) as response:
+                phases.connected(response.status_code)
                 try:
                     response.raise_for_status()
                 except httpx.HTTPStatusError as exc:
@@ -111,6 +197,7 @@ class OpenAIClient(LLMClient):
                 last_model: str | None = None
 
                 async for line in response.aiter_lines():
+                    phases.received()
                     if not line:
                         continue
 
@@ -139,12 +226,8 @@ class OpenAIClient(LLMClient):
                         if content_piece:
                             yield LLMStreamChunk(type="content", content=content_piece, model=last_model)
 
-                        # 某些实现不会返回 usage，而是只给 finish_reason
-                        finish = choice0.get("finish_reason")
-                        if finish in {"stop", "length", "content_filter"}:
-                            end_emitted = True
-                            yield LLMStreamChunk(type="end", model=last_model)
-                            break
+                        # finish_reason 之后还会有一帧 usage（include_usage）或直接 [DONE]，
+                        # 不在这里结束，否则会丢失 token 用量；不返回 usage 的实现在循环结束后补发 end
 
                     usage = chunk.get("usage")
                     if usage:
@@ -158,7 +241,7 @@ class OpenAIClient(LLMClient):
     def _build_payload(
         self,
         *,
-        messages: Sequence[dict[str, str]],
+        messages: Sequence[dict[str, Any]],
         options: LLMGenerationOptions | None,
     ) -> dict[str, object]:
         model = options.model if options and options.model else self._model
@@ -169,6 +252,18 @@ class OpenAIClient(LLMClient):
             "temperature": temperature,
         }
 
+    def _build_stream_payload(
+        self,
+        *,
+        messages: Sequence[dict[str, Any]],
+        options: LLMGenerationOptions | None,
+    ) -> dict[str, object]:
+        payload = self._build_payload(messages=messages, options=options)
+        payload["stream"] = True
+        # ask for a final usage frame so streamed calls are metered like the others
+        payload["stream_options"] = {"include_usage": True}
+        return payload
+
     def _build_headers(self) -> dict[str, str]:
         return {
             "Authorization": f"Bearer {self._api_key}",
@@ -181,6 +276,48 @@ class OpenAIClient(LLMClient):
         return f"{base}/chat/completions"
 
 
+class _StreamPhases:
+    """Trace spans for the connect / first-byte / streaming phases of one call."""
+
+    def __init__(self, **attributes: object) -> None:
+        self._attributes = attributes
+        self._active: Span = start_span("upstream.connect", **attributes)
+        self._phase = "connect"
+
+    def connected(self, status_code: int) -> None:
+        self._active.set(**{"http.status_code": status_code})
+        self._next("upstream.first_byte", "first_byte")
+
+    def received(self) -> None:
+        if self._phase == "first_byte":
+            self._next("upstream.stream", "stream")
+
+    def fail(self, exc: BaseException) -> None:
+        self._active.fail(exc)
+
+    def close(self) -> None:
+        self._active.end()
+
+    def _next(self, name: str, phase: str) -> None:
+        self._active.end()
+        self._active = start_span(name, **self._attributes)
+        self._phase = phase
+
+
+def _error_kind(exc: BaseException) -> str:
+    """Classify a failed upstream call for the error counter."""
+    cause = exc.__cause__ if isinstance(exc, ValueError) and exc.__cause__ else exc
+    if isinstance(cause, httpx.HTTPStatusError):
+        return f"http_{cause.response.status_code}"
+    if isinstance(cause, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(cause, httpx.TransportError):
+        return "transport"
+    if isinstance(exc, ValueError):
+        return "invalid_response"
+    return type(exc).__name__
+
+
 def _extract_error_detail(response: httpx.Response) -> str:
     try:
         payload = response.json()
@@ -1,6 +1,7 @@
 """Application configuration loaded from environment variables."""
 
 from functools import lru_cache
+from typing import Any
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -24,6 +25,59 @@ class Settings(BaseSettings):
     vlm_model: str | None = Field(default=None, alias="VLM_MODEL")
     vlm_api_key: str | None = Field(default=None, alias="VLM_APIKEY")
     request_timeout_seconds: int = Field(default=60, alias="REQUEST_TIMEOUT_SECONDS")
+    # Pooled upstream connections and concurrent LLM calls (0 = unlimited)
+    llm_max_connections: int = Field(default=100, alias="LLM_MAX_CONNECTIONS")
+    llm_max_concurrency: int = Field(default=0, alias="LLM_MAX_CONCURRENCY")
+    # Startup warm-up before /api/health/ready reports ready: deferred imports,
+    # pre-opened connections to VLM_BASEURL/EMB_BASEURL, memory-mapped indexes of the
+    # most recently used materials; after the timeout the pod turns ready regardless
+    warmup_enabled: bool = Field(default=True, alias="WARMUP_ENABLED")
+    warmup_timeout_seconds: float = Field(default=30.0, alias="WARMUP_TIMEOUT_SECONDS")
+    warmup_connections: int = Field(default=4, alias="WARMUP_CONNECTIONS")
+    warmup_indexes: int = Field(default=32, alias="WARMUP_INDEXES")
+    # Resumable SSE: events kept per message, retention after completion, and how
+    # long a generation keeps running with no client attached
+    sse_buffer_max_events: int = Field(default=2048, alias="SSE_BUFFER_MAX_EVENTS")
+    sse_buffer_ttl_seconds: float = Field(default=120.0, alias="SSE_BUFFER_TTL_SECONDS")
+    sse_resume_grace_seconds: float = Field(default=15.0, alias="SSE_RESUME_GRACE_SECONDS")
+    # Model routing: JSON list of routes, e.g.
+    # [{"name": "fast", "model": "gpt-4o-mini", "cost": 1, "maxPromptChars": 800, "ttftTargetMs": 1500},
+    #  {"name": "heavy", "model": "gpt-4o", "cost": 6}]
+    # Optional per route: baseUrl, apiKey, provider, maxHistory, vision, endpoints.
+    llm_routes: list[dict[str, Any]] = Field(default_factory=list, alias="LLM_ROUTES")
+    # Cache of identical /qa/batch completions (0 entries disables caching;
+    # concurrent duplicates are still coalesced); other endpoints never use it
+    llm_cache_size: int = Field(default=1024, alias="LLM_CACHE_SIZE")
+    llm_cache_ttl_seconds: float = Field(default=600.0, alias="LLM_CACHE_TTL_SECONDS")
+    # Batch prompt execution (/qa/batch)
+    batch_max_items: int = Field(default=500, alias="BATCH_MAX_ITEMS")
+    batch_concurrency: int = Field(default=8, alias="BATCH_CONCURRENCY")
+    batch_job_ttl_seconds: float = Field(default=3600.0, alias="BATCH_JOB_TTL_SECONDS")
+    # State shared by all workers on this host: memory (per process) | sqlite (WAL file
+    # at SHARED_STATE_PATH, default next to STORAGE_TMP_DIR)
+    shared_state_backend: str = Field(default="memory", alias="SHARED_STATE_BACKEND")
+    shared_state_path: str | None = Field(default=None, alias="SHARED_STATE_PATH")
+    # Rate limits for POST /api/llm/* and /api/qa/*: requests and provider tokens per
+    # minute per client IP (always) and per user (X-User-Id), session (X-Session-Id)
+    # and course (X-Course-Id) when sent; 0 disables a bucket. Buckets hold
+    # BURST_SECONDS worth of rate. A classroom behind one NAT shares its IP buckets.
+    rate_limit_enabled: bool = Field(default=False, alias="RATE_LIMIT_ENABLED")
+    rate_limit_ip_rpm: float = Field(default=300, alias="RATE_LIMIT_IP_RPM")
+    rate_limit_ip_tpm: float = Field(default=500_000, alias="RATE_LIMIT_IP_TPM")
+    rate_limit_user_rpm: float = Field(default=60, alias="RATE_LIMIT_USER_RPM")
+    rate_limit_user_tpm: float = Field(default=100_000, alias="RATE_LIMIT_USER_TPM")
+    rate_limit_session_rpm: float = Field(default=0, alias="RATE_LIMIT_SESSION_RPM")
+    rate_limit_session_tpm: float = Field(default=0, alias="RATE_LIMIT_SESSION_TPM")
+    rate_limit_course_rpm: float = Field(default=0, alias="RATE_LIMIT_COURSE_RPM")
+    rate_limit_course_tpm: float = Field(default=0, alias="RATE_LIMIT_COURSE_TPM")
+    rate_limit_burst_seconds: float = Field(default=10, alias="RATE_LIMIT_BURST_SECONDS")
+    rate_limit_max_keys: int = Field(default=100_000, alias="RATE_LIMIT_MAX_KEYS")
+
+    # Tracing: exporter is none | file | otlp; sampling is decided per trace
+    trace_exporter: str = Field(default="none", alias="TRACE_EXPORTER")
+    trace_sample_rate: float = Field(default=1.0, alias="TRACE_SAMPLE_RATE")
+    trace_file: str = Field(default="/tmp/aiedu_traces.jsonl", alias="TRACE_FILE")
+    trace_otlp_endpoint: str | None = Field(default=None, alias="TRACE_OTLP_ENDPOINT")
 
     # ---- Derived accessors (VLM_* primary) ----
     @property
@@ -48,19 +102,81 @@ class Settings(BaseSettings):
     upload_max_mb: int = Field(default=200, alias="UPLOAD_MAX_MB")
     video_max_mb: int = Field(default=500, alias="VIDEO_MAX_MB")
     audio_max_minutes: int = Field(default=120, alias="AUDIO_MAX_MINUTES")
+    # ZIP ingestion (POST /materials/archive): files per archive and parse jobs
+    # running at once across all archive uploads
+    archive_max_entries: int = Field(default=500, alias="ARCHIVE_MAX_ENTRIES")
+    archive_parse_concurrency: int = Field(default=4, alias="ARCHIVE_PARSE_CONCURRENCY")
+    # Lifecycle of STORAGE_TMP_DIR (0 disables each rule): quotas evict least recently
+    # used materials, idle materials expire (opt-in: it deletes parsed materials),
+    # abandoned uploads are removed, cold originals are gzipped in place
+    storage_quota_mb: int = Field(default=0, alias="STORAGE_QUOTA_MB")
+    storage_course_quota_mb: int = Field(default=0, alias="STORAGE_COURSE_QUOTA_MB")
+    storage_ttl_days: float = Field(default=0, alias="STORAGE_TTL_DAYS")
+    storage_abandoned_hours: float = Field(default=24, alias="STORAGE_ABANDONED_HOURS")
+    storage_cold_days: float = Field(default=7, alias="STORAGE_COLD_DAYS")
+    storage_sweep_interval_seconds: float = Field(default=600, alias="STORAGE_SWEEP_INTERVAL_SECONDS")
+    storage_delete_batch: int = Field(default=64, alias="STORAGE_DELETE_BATCH")
+    # Near-duplicate chunk marking after parsing (MinHash over character shingles,
+    # LSH per course); chunks at or above the estimated Jaccard threshold are marked
+    dedup_enabled: bool = Field(default=True, alias="DEDUP_ENABLED")
+    dedup_threshold: float = Field(default=0.8, alias="DEDUP_THRESHOLD")
+    dedup_num_perm: int = Field(default=128, alias="DEDUP_NUM_PERM")
+    dedup_shingle_size: int = Field(default=5, alias="DEDUP_SHINGLE_SIZE")
+    # Study artifacts (summary, outline, questions) precomputed after indexing with
+    # map-reduce LLM calls; off by default since every new material costs calls
+    artifacts_enabled: bool = Field(default=False, alias="ARTIFACTS_ENABLED")
+    artifacts_concurrency: int = Field(default=4, alias="ARTIFACTS_CONCURRENCY")
+    artifacts_map_chars: int = Field(default=6000, alias="ARTIFACTS_MAP_CHARS")
+    artifacts_questions: int = Field(default=10, alias="ARTIFACTS_QUESTIONS")
+    # Signed local URLs for originals (used until S3 presigning exists); without a
+    # secret a random key is kept under STORAGE_TMP_DIR
+    local_url_secret: str | None = Field(default=None, alias="LOCAL_URL_SECRET")
+    local_url_expires: int = Field(default=3600, alias="LOCAL_URL_EXPIRES")
 
     # Vision model for PDF/PPT/Image parsing (optional; if distinct from VLM)
     vqa_provider: str | None = Field(default=None, alias="VQA_PROVIDER")
     vqa_base_url: str | None = Field(default=None, alias="VQA_BASEURL")
     vqa_model: str | None = Field(default=None, alias="VQA_MODEL")
     vqa_api_key: str | None = Field(default=None, alias="VQA_APIKEY")
+    # Pages packed into a single captioning request (1 = one image per request)
+    vqa_pages_per_request: int = Field(default=4, alias="VQA_PAGES_PER_REQUEST")
+    vqa_concurrency: int = Field(default=4, alias="VQA_CONCURRENCY")
+    # Pages whose extracted text already has this many characters are not captioned
+    vqa_min_text_chars: int = Field(default=200, alias="VQA_MIN_TEXT_CHARS")
 
-    # ASR model for audio/video transcription (placeholder configuration)
+    @property
+    def vision_base_url(self) -> str:
+        return self.vqa_base_url or self.text_base_url
+
+    @property
+    def vision_model(self) -> str:
+        return self.vqa_model or self.text_model
+
+    @property
+    def vision_api_key(self) -> str | None:
+        return self.vqa_api_key or self.text_api_key
+
+    # ASR model for audio/video transcription
     asr_provider: str | None = Field(default=None, alias="ASR_PROVIDER")
     asr_base_url: str | None = Field(default=None, alias="ASR_BASEURL")
     asr_model: str | None = Field(default=None, alias="ASR_MODEL")
     asr_api_key: str | None = Field(default=None, alias="ASR_APIKEY")
     asr_language: str | None = Field(default="auto", alias="ASR_LANGUAGE")
+    # Target length of silence-aligned segments sent per ASR request
+    asr_segment_seconds: int = Field(default=60, alias="ASR_SEGMENT_SECONDS")
+    asr_concurrency: int = Field(default=4, alias="ASR_CONCURRENCY")
+
+    @property
+    def speech_base_url(self) -> str:
+        return self.asr_base_url or self.text_base_url
+
+    @property
+    def speech_model(self) -> str:
+        return self.asr_model or "whisper-1"
+
+    @property
+    def speech_api_key(self) -> str | None:
+        return self.asr_api_key or self.text_api_key
 
     # Embeddings (vector) model configuration - placeholder for retrieval
     emb_provider: str | None = Field(default=None, alias="EMB_PROVIDER")
@@ -71,6 +187,16 @@ class Settings(BaseSettings):
     emb_pooling: str | None = Field(default=None, alias="EMB_POOLING")
     emb_batch: int | None = Field(default=64, alias="EMB_BATCH")
 
+    # Semantic answer cache for Q&A (needs EMB_BASEURL/EMB_MODEL; size 0 disables).
+    # Questions of the same course/material set whose embeddings reach the
+    # threshold (cosine) share an answer; a sample of hits is re-answered to
+    # count false hits (audit threshold: cosine between cached and fresh answer).
+    semantic_cache_size: int = Field(default=2048, alias="SEMANTIC_CACHE_SIZE")
+    semantic_cache_ttl_seconds: int = Field(default=3600, alias="SEMANTIC_CACHE_TTL_SECONDS")
+    semantic_cache_threshold: float = Field(default=0.92, alias="SEMANTIC_CACHE_THRESHOLD")
+    semantic_cache_audit_rate: float = Field(default=0.02, alias="SEMANTIC_CACHE_AUDIT_RATE")
+    semantic_cache_audit_threshold: float = Field(default=0.85, alias="SEMANTIC_CACHE_AUDIT_THRESHOLD")
+
 
 @lru_cache
 def get_settings() -> Settings:
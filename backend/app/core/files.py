@@ -0,0 +1,113 @@
+"""File responses for serving stored originals (PDFs, lecture videos).
+
+``LocalFileResponse`` extends Starlette's ``FileResponse`` (which already
+handles single/multi ``Range`` requests, ``If-Range`` and the ``pathsend``
+extension) with:
+
+ - ``304 Not Modified`` for ``If-None-Match`` / ``If-Modified-Since``
+ - the ASGI ``http.response.zerocopysend`` extension for full bodies and
+   single ranges, so servers that offer it ``sendfile()`` the bytes without
+   copying them through Python; servers without it (uvicorn) fall back to
+   Starlette's chunked reads, with larger chunks to cut thread hand-offs
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from email.utils import parsedate_to_datetime
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+_SINGLE_RANGE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+# headers a 304 must repeat (RFC 9110 §15.4.5)
+_NOT_MODIFIED_HEADERS = ("etag", "last-modified", "cache-control", "expires", "vary", "content-location")
+
+
+class LocalFileResponse(FileResponse):
+    """``FileResponse`` with conditional requests and zero-copy sends."""
+
+    chunk_size = 512 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            self.stat_result = os.stat(self.path)
+            self.set_stat_headers(self.stat_result)
+        request_headers = Headers(scope=scope)
+
+        if self._not_modified(request_headers):
+            headers = [(k, v) for k, v in self.raw_headers if k.decode("latin-1") in _NOT_MODIFIED_HEADERS]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if (
+            scope["type"] == "http"
+            and scope["method"].upper() == "GET"
+            and self.status_code == 200
+            and "http.response.zerocopysend" in scope.get("extensions", {})
+        ):
+            span = self._zero_copy_span(request_headers, self.stat_result.st_size)
+            if span is not None:
+                await self._send_zero_copy(send, *span)
+                return
+        await super().__call__(scope, receive, send)
+
+    def _not_modified(self, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # weak comparison (RFC 9110 §13.1.2)
+            etag = self.headers["etag"].removeprefix("W/")
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(self.stat_result.st_mtime) <= since.timestamp()
+
+    def _zero_copy_span(self, request_headers: Headers, size: int) -> tuple[int, int, bool] | None:
+        """``(offset, count, partial)`` to send, or ``None`` to let Starlette handle it."""
+        http_range = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        stale = if_range is not None and if_range not in (self.headers["etag"], self.headers["last-modified"])
+        if http_range is None or stale:
+            return 0, size, False
+        match = _SINGLE_RANGE.match(http_range)
+        if match is None:
+            return None  # multi-range or malformed: Starlette answers 206 multipart / 400
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        elif last:
+            start, end = max(size - int(last), 0), size
+        else:
+            return None
+        if not 0 <= start < end:
+            return None  # 416 from Starlette
+        return start, end - start, True
+
+    async def _send_zero_copy(self, send: Send, offset: int, count: int, partial: bool) -> None:
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers["content-length"] = str(count)
+        if partial:
+            headers["content-range"] = f"bytes {offset}-{offset + count - 1}/{self.stat_result.st_size}"
+        await send({"type": "http.response.start", "status": 206 if partial else 200, "headers": headers.raw})
+        with open(self.path, "rb") as file:
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": offset,
+                    "count": count,
+                    "more_body": False,
+                }
+            )
+        if self.background is not None:
+            await self.background()
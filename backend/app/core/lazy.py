@@ -0,0 +1,45 @@
+"""Deferred imports for heavy optional stacks.
+
+NumPy (and whatever the parse pipeline pulls in) is only needed once a
+material is parsed, indexed or searched, yet importing it at module level puts
+it on the startup path of every worker. ``lazy_import`` returns the module
+object right away and executes it on first attribute access; the startup
+warm-up (``app.services.warmup``) then imports the registered modules in a
+worker thread before the readiness probe flips, so no request pays for them.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+# modules handed out lazily, imported for real by ``import_deferred``
+DEFERRED: list[str] = []
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return ``name`` as a module that is executed on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    if name not in DEFERRED:
+        DEFERRED.append(name)
+    return module
+
+
+def import_deferred() -> list[str]:
+    """Execute every lazily imported module now (blocking); returns their names."""
+    names = list(DEFERRED)
+    for name in names:
+        # touching an attribute runs the deferred module body
+        getattr(importlib.import_module(name), "__name__")
+    return names
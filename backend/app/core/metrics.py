@@ -0,0 +1,317 @@
+"""Low-overhead Prometheus-style metrics.
+
+Counters and histograms are plain dicts keyed by label tuples; histograms use
+fixed, pre-computed bucket bounds so an observation is one ``bisect`` plus two
+increments. Updates happen on the event loop thread without locks, which keeps
+the cost low enough to leave instrumentation on in production.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Sequence
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+STATE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99)
+RATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0, 320.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter partitioned by label values."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histogram with fixed buckets; per-series state is ``[*bucket_counts, sum]``."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            # one slot per bucket, one for +Inf, one for the running sum
+            series = self._series.setdefault(label_values, [0.0] * (len(self.buckets) + 2))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = (*self.buckets, math.inf)
+        for labels, series in list(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {_format_value(cumulative)}"
+            label_str = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_str} {_format_value(series[-1])}"
+            yield f"{self.name}_count{label_str} {_format_value(cumulative)}"
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "aiedu_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "aiedu_http_request_duration_seconds",
+    "Time from request start until the response body is complete.",
+    ("method", "route"),
+)
+STREAM_TTFT = REGISTRY.histogram(
+    "aiedu_stream_ttft_seconds", "Time to first token for SSE endpoints.", ("endpoint",), TTFT_BUCKETS
+)
+STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "aiedu_stream_tokens_per_second",
+    "Completion tokens per second after the first token.",
+    ("endpoint",),
+    RATE_BUCKETS,
+)
+STREAM_ABANDONED = REGISTRY.counter(
+    "aiedu_stream_abandoned_total", "SSE streams cancelled because the client disconnected.", ("endpoint",)
+)
+STREAM_ABANDONED_TOKENS = REGISTRY.counter(
+    "aiedu_stream_abandoned_tokens_total",
+    "Completion tokens already generated for streams the client abandoned.",
+    ("endpoint",),
+)
+LLM_CACHE_REQUESTS = REGISTRY.counter(
+    "aiedu_llm_cache_requests_total",
+    "Non-streaming completions by cache outcome (hit, coalesced, miss).",
+    ("result",),
+)
+LLM_ROUTE_DECISIONS = REGISTRY.counter(
+    "aiedu_llm_route_decisions_total",
+    "Routing outcomes per model route (selected, error, ttft_timeout).",
+    ("route", "outcome"),
+)
+SEMANTIC_CACHE_REQUESTS = REGISTRY.counter(
+    "aiedu_semantic_cache_requests_total",
+    "Semantic answer cache lookups by result (hit, miss, error).",
+    ("result",),
+)
+SEMANTIC_CACHE_SIMILARITY = REGISTRY.histogram(
+    "aiedu_semantic_cache_similarity",
+    "Best cosine similarity found per embedded lookup.",
+    (),
+    SIMILARITY_BUCKETS,
+)
+SEMANTIC_CACHE_AUDITS = REGISTRY.counter(
+    "aiedu_semantic_cache_audits_total",
+    "Sampled semantic hits re-answered in the background (confirmed, false_hit, error).",
+    ("outcome",),
+)
+SHARED_STATE_LATENCY = REGISTRY.histogram(
+    "aiedu_shared_state_op_duration_seconds",
+    "Latency of shared-state operations per backend and operation.",
+    ("backend", "op"),
+    STATE_BUCKETS,
+)
+RATE_LIMIT_DECISIONS = REGISTRY.counter(
+    "aiedu_rate_limit_decisions_total",
+    "Rate limiter decisions per key scope (allowed, rejected_requests, rejected_tokens).",
+    ("scope", "outcome"),
+)
+RATE_LIMIT_TOKENS = REGISTRY.counter(
+    "aiedu_rate_limit_tokens_total", "Provider-reported tokens charged to rate limit buckets.", ("scope",)
+)
+STORAGE_EVICTIONS = REGISTRY.counter(
+    "aiedu_storage_evictions_total",
+    "Materials removed from STORAGE_TMP_DIR (deleted, abandoned, ttl, course_quota, quota).",
+    ("reason",),
+)
+STORAGE_BYTES_FREED = REGISTRY.counter(
+    "aiedu_storage_freed_bytes_total", "Bytes freed by lifecycle evictions.", ("reason",)
+)
+STORAGE_COMPRESSED_BYTES = REGISTRY.counter(
+    "aiedu_storage_compressed_saved_bytes_total", "Bytes saved by compressing cold originals."
+)
+DEDUP_CHUNKS = REGISTRY.counter(
+    "aiedu_dedup_chunks_total", "Parsed chunks checked for near-duplicates (unique, duplicate).", ("result",)
+)
+ARCHIVE_ENTRIES = REGISTRY.counter(
+    "aiedu_archive_entries_total",
+    "ZIP entries seen by archive ingestion (stored, unsupported_type, too_large, encrypted, corrupt).",
+    ("outcome",),
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "aiedu_upstream_request_duration_seconds",
+    "Latency of upstream model calls.",
+    ("provider", "model", "operation"),
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "aiedu_upstream_errors_total", "Failed upstream model calls.", ("provider", "model", "operation", "kind")
+)
+TOKENS_USED = REGISTRY.counter(
+    "aiedu_llm_tokens_total", "Token usage reported by providers.", ("provider", "model", "kind")
+)
+
+
+# per-request consumer of provider usage (the rate limiter's token buckets);
+# background tasks started by the request inherit it
+usage_listener: ContextVar[Callable[[dict[str, Any]], None] | None] = ContextVar("usage_listener", default=None)
+
+
+def record_usage(provider: str, model: str, usage: dict[str, Any] | None) -> None:
+    """Add provider-reported ``usage`` to the token totals."""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind)
+        if isinstance(value, (int, float)) and value:
+            TOKENS_USED.inc(provider, model, kind.removesuffix("_tokens"), amount=value)
+    listener = usage_listener.get()
+    if listener is not None:
+        listener(usage)
+
+
+class StreamMeter:
+    """Measures TTFT and token throughput of one SSE response."""
+
+    __slots__ = ("endpoint", "started", "first_token_at", "tokens", "finished")
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.first_token_at: float | None = None
+        self.tokens = 0
+        self.finished = False
+
+    def token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            STREAM_TTFT.observe(self.first_token_at - self.started, self.endpoint)
+        self.tokens += 1
+
+    def finish(self, usage: dict[str, Any] | None = None) -> None:
+        """Record throughput; prefers provider ``completion_tokens`` over chunk counts."""
+        self.finished = True
+        if self.first_token_at is None:
+            return
+        completion = (usage or {}).get("completion_tokens") or self.tokens
+        elapsed = time.perf_counter() - self.first_token_at
+        if elapsed > 0:
+            STREAM_TOKENS_PER_SECOND.observe(completion / elapsed, self.endpoint)
+
+    def abandon(self) -> None:
+        """Count a stream whose client went away before the end event."""
+        STREAM_ABANDONED.inc(self.endpoint)
+        if self.tokens:
+            STREAM_ABANDONED_TOKENS.inc(self.endpoint, amount=self.tokens)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count and latency per route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # use the template (/materials/{material_id}) to keep cardinality bounded
+            route_label = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            HTTP_REQUESTS.inc(method, route_label, str(status_code))
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, route_label)
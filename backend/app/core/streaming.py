@@ -0,0 +1,52 @@
+"""SSE responses that stop upstream work as soon as the client goes away."""
+
+from __future__ import annotations
+
+from contextlib import aclosing
+from typing import AsyncIterator, Mapping
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.metrics import StreamMeter
+
+
+class EventStreamResponse(StreamingResponse):
+    """``text/event-stream`` response that closes its generator on disconnect.
+
+    Starlette stops sending when the client disconnects, but the event generator
+    is only finalised once it is garbage collected; until then it can keep an
+    upstream completion (and its pool and limiter slots) alive. This response
+    closes the generator right away, which unwinds ``aclosing`` blocks down to
+    the provider's HTTP stream, and records the stream as abandoned on ``meter``.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(
+        self,
+        content: AsyncIterator[str],
+        *,
+        meter: StreamMeter | None = None,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+    ) -> None:
+        self._meter = meter
+        self._completed = False
+        # media_type: NDJSON streams reuse the same disconnect handling
+        super().__init__(self._track(content), headers=headers, media_type=media_type)
+
+    async def _track(self, events: AsyncIterator[str]) -> AsyncIterator[str]:
+        async with aclosing(events):
+            async for event in events:
+                yield event
+        self._completed = True
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if not self._completed:
+                await self.body_iterator.aclose()
+                if self._meter is not None and not self._meter.finished:
+                    self._meter.abandon()
@@ -0,0 +1,361 @@
+"""Lightweight request tracing with pluggable span exporters.
+
+Spans carry W3C-compatible trace/span IDs and are parented through a context
+variable. Use ``span()`` around awaited work in regular coroutines. Async
+generators should call ``start_span()``/``Span.end()`` instead: a generator
+shares its consumer's context, so setting the current span across ``yield``
+would leak it to the caller.
+
+Sampling is decided once per trace (``TRACE_SAMPLE_RATE``); unsampled spans
+still get IDs, so a trace ID can always be returned to clients, but they are
+never exported. Exporters: JSON lines file, OTLP/HTTP (JSON encoding, any
+compatible collector) or in-memory for tests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar["Span | None"] = ContextVar("aiedu_current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+@dataclass(slots=True)
+class Span:
+    """A timed operation within a trace."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    tracer: "Tracer | None" = None
+    # first span of the trace in this process (its parent, if any, is remote)
+    local_root: bool = False
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error.type"] = type(exc).__name__
+        self.attributes["error.message"] = str(exc)[:300]
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled and self.tracer is not None:
+            self.tracer.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter(ABC):
+    """Receives finished, sampled spans in batches."""
+
+    @abstractmethod
+    def export(self, spans: list[Span]) -> None:
+        """Hand a batch of finished spans to the backend."""
+
+
+class FileSpanExporter(SpanExporter):
+    """Append spans as JSON lines to a local file.
+
+    ``export`` runs on the event loop, so it only queues the encoded lines; a
+    single writer thread appends everything queued so far in one write, which
+    keeps batches in order.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        self._queued: list[str] = []
+        self._draining = False
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="span-writer")
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in spans)
+        with self._lock:
+            self._queued.append(lines)
+            if self._draining:
+                return
+            self._draining = True
+        self._writer.submit(self._drain)
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Block until everything exported so far is on disk (tests, shutdown)."""
+        self._writer.submit(lambda: None).result(timeout)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queued:
+                    self._draining = False
+                    return
+                lines, self._queued = "".join(self._queued), []
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with self._path.open("a", encoding="utf-8") as fh:
+                    fh.write(lines)
+            except OSError:
+                logger.warning("Failed to write %d spans to %s", lines.count("\n"), self._path)
+
+
+class OTLPHttpExporter(SpanExporter):
+    """Post spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0) -> None:
+        self._url = endpoint.rstrip("/") + "/v1/traces"
+        self._service_name = service_name
+        self._timeout = timeout
+        self._pending: set[asyncio.Task[None]] = set()
+
+    def export(self, spans: list[Span]) -> None:
+        body = self.encode(spans)
+        try:
+            task = asyncio.get_running_loop().create_task(self._post(body))
+        except RuntimeError:
+            return  # no loop (e.g. at shutdown): drop the batch
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _post(self, body: dict[str, Any]) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=self._timeout) as client:
+                await client.post(self._url, json=body)
+        except httpx.HTTPError:
+            logger.warning("Failed to export spans to %s", self._url)
+
+    def encode(self, spans: list[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attr("service.name", self._service_name)]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "aiedu"},
+                            "spans": [
+                                {
+                                    "traceId": s.trace_id,
+                                    "spanId": s.span_id,
+                                    "parentSpanId": s.parent_id or "",
+                                    "name": s.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(s.start_ns),
+                                    "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                                    "attributes": [_otlp_attr(k, v) for k, v in s.attributes.items()],
+                                    "status": {"code": 2 if s.status == "error" else 1},
+                                }
+                                for s in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+def _otlp_attr(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps spans in a list; used by tests and local debugging."""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+
+class Tracer:
+    """Creates spans, applies sampling and batches finished spans for export."""
+
+    def __init__(self, exporter: SpanExporter | None, sample_rate: float = 1.0, batch_size: int = 64) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._batch_size = batch_size
+        self._buffer: list[Span] = []
+
+    def start_span(self, name: str, parent: Span | None = None, **attributes: Any) -> Span:
+        """Create a span under ``parent`` (default: the current span) without activating it."""
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            sampled = self.exporter is not None and random.random() < self.sample_rate
+            return Span(
+                name, _new_id(128), _new_id(64), None, sampled, attributes=attributes, tracer=self, local_root=True
+            )
+        return Span(
+            name, parent.trace_id, _new_id(64), parent.span_id, parent.sampled, attributes=attributes, tracer=self
+        )
+
+    def continue_trace(self, name: str, traceparent: str | None, **attributes: Any) -> Span:
+        """Start a root span, joining the caller's trace when a valid ``traceparent`` is given."""
+        parts = (traceparent or "").split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            sampled = self.exporter is not None and parts[3] == "01"
+            return Span(
+                name, parts[1], _new_id(64), parts[2], sampled, attributes=attributes, tracer=self, local_root=True
+            )
+        return self.start_span(name, parent=None, **attributes)
+
+    def export(self, span: Span) -> None:
+        self._buffer.append(span)
+        # flush whole requests at once: the root span ends last
+        if span.local_root or len(self._buffer) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer or self.exporter is None:
+            return
+        batch, self._buffer = self._buffer, []
+        self.exporter.export(batch)
+
+
+def _build_exporter() -> SpanExporter | None:
+    kind = (settings.trace_exporter or "none").lower()
+    if kind == "file":
+        return FileSpanExporter(settings.trace_file)
+    if kind == "otlp" and settings.trace_otlp_endpoint:
+        return OTLPHttpExporter(settings.trace_otlp_endpoint, service_name=settings.app_name)
+    return None
+
+
+@lru_cache
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from TRACE_* settings."""
+    return Tracer(_build_exporter(), sample_rate=settings.trace_sample_rate)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def current_trace_id() -> str | None:
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+def start_span(name: str, parent: Span | None = None, **attributes: Any) -> Span:
+    """Module-level shortcut for ``get_tracer().start_span``."""
+    return get_tracer().start_span(name, parent=parent, **attributes)
+
+
+@contextmanager
+def span(name: str, *, new_trace: bool = False, **attributes: Any) -> Iterator[Span]:
+    """Run the block inside a child span of the current one.
+
+    ``new_trace`` starts a separate trace (for background jobs outliving the
+    request); the originating trace ID is kept as the ``link.traceId`` attribute.
+    """
+    tracer = get_tracer()
+    if new_trace:
+        origin = _current_span.get()
+        if origin is not None:
+            attributes["link.traceId"] = origin.trace_id
+        active = tracer.continue_trace(name, None, **attributes)
+    else:
+        active = tracer.start_span(name, **attributes)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as exc:
+        active.fail(exc)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # closed from another context (e.g. generator finalised by GC)
+            pass
+        active.end()
+
+
+class TracingMiddleware:
+    """Opens a root span per HTTP request and returns its ID as ``X-Trace-Id``."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        root = get_tracer().continue_trace(
+            f"{scope.get('method', 'GET')} {scope.get('path', '')}",
+            traceparent,
+            **{"http.method": scope.get("method", "GET"), "http.target": scope.get("path", "")},
+        )
+        token = _current_span.set(root)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status_code": message["status"]})
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", root.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            root.fail(exc)
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.name = f"{scope.get('method', 'GET')} {route.path}"
+            _current_span.reset(token)
+            root.end()
@@ -1,9 +1,37 @@
 """ASGI entrypoint for the FastAPI application."""
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 
-from app.api.routes import health, llm, test, materials, qa
+from app.api.routes import batch, health, llm, test, materials, metrics, qa
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.core.tracing import TracingMiddleware
+from app.services.indexing import get_material_indexer
+from app.services.llm_service import get_llm_service
+from app.services.rate_limit import RateLimitMiddleware
+from app.services.semantic_cache import get_semantic_cache
+from app.services.shared_state import get_shared_state
+from app.services.storage_lifecycle import get_storage_lifecycle
+from app.services.warmup import get_warmup
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    get_storage_lifecycle().start()
+    # /api/health/ready turns 200 once this finishes
+    get_warmup().start()
+    yield
+    await get_warmup().aclose()
+    await get_storage_lifecycle().aclose()
+    # release pooled upstream connections on shutdown
+    await get_llm_service().aclose()
+    await get_semantic_cache().aclose()
+    if (indexer := get_material_indexer()) is not None:
+        await indexer.aclose()
+    await get_shared_state().aclose()
 
 
 def create_app() -> FastAPI:
@@ -11,13 +39,21 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.app_name,
         debug=settings.debug,
+        lifespan=lifespan,
     )
+    # innermost: rejected requests still show up in metrics and traces
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    # added last so it wraps everything: handlers always run inside the root span
+    app.add_middleware(TracingMiddleware)
 
     app.include_router(health.router, prefix="/api")
+    app.include_router(metrics.router, prefix="/api")
     app.include_router(llm.router, prefix="/api")
     app.include_router(test.router, prefix="/api")
     app.include_router(materials.router, prefix="/api")
     app.include_router(qa.router, prefix="/api")
+    app.include_router(batch.router, prefix="/api")
     return app
 
 
@@ -0,0 +1,316 @@
+"""Bulk ingestion of course archives (``POST /materials/archive``).
+
+Instructors onboard a course with one ZIP instead of dozens of uploads. The
+archive is read through its central directory from the spooled upload and
+each entry is decompressed in chunks straight to disk, so neither the archive
+nor any member is held in memory. Per entry the ``POST /materials`` rules
+apply: the allowed extensions and ``UPLOAD_MAX_MB``/``VIDEO_MAX_MB``, checked
+against the declared size and again while decompressing (zip bombs lie).
+
+The declared sizes of the accepted entries are checked against the course
+quota before anything is written. Entries are then extracted into a hidden
+staging directory (``.ingest_<id>``); the course quota is admitted once for
+the whole batch with the real sizes, then every material's
+metadata is written and the directories are published together
+(``MaterialStore.commit_staged``). A rejected, failed or abandoned batch
+leaves no materials behind.
+
+Parse jobs (which also dedup and index) are then queued for every material
+at once; at most ``ARCHIVE_PARSE_CONCURRENCY`` run at a time across batches.
+Progress is yielded as events, one per state change of each file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import mimetypes
+import shutil
+import uuid
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+from typing import IO, Any, AsyncIterator
+
+from app.core.config import settings
+from app.core.metrics import ARCHIVE_ENTRIES
+from app.core.tracing import span
+from app.services.jobs import JobRegistry, get_job_registry
+from app.services.material_store import (
+    ALLOWED_SUFFIXES,
+    STAGING_PREFIX,
+    MaterialStore,
+    get_material_store,
+    upload_limit_bytes,
+)
+from app.services.parsing import SUPPORTED_MODES, resolve_mode, run_parse
+from app.services.storage_lifecycle import QuotaExceeded, StorageLifecycle, get_storage_lifecycle
+
+_CHUNK = 1024 * 1024
+_UTF8_FLAG = 0x800
+_ENCRYPTED_FLAG = 0x1
+_TERMINAL = {"ready", "failed", "cancelled"}
+
+
+class EntryTooLarge(Exception):
+    """A member decompressed past its size limit."""
+
+
+@dataclass(slots=True)
+class ArchiveEntry:
+    index: int
+    info: zipfile.ZipInfo
+    path: str
+    name: str
+    suffix: str
+    status: str = "pending"  # skipped | extracted | uploaded | queued | ready | failed | cancelled
+    reason: str | None = None
+    material_id: str | None = None
+    size_bytes: int = 0
+
+    def event(self) -> dict[str, Any]:
+        return {
+            "type": "file",
+            "index": self.index,
+            "path": self.path,
+            "name": self.name,
+            "status": self.status,
+            "reason": self.reason,
+            "materialId": self.material_id,
+            "sizeBytes": self.size_bytes,
+        }
+
+
+def entry_path(info: zipfile.ZipInfo) -> str:
+    """Member path, re-decoding legacy (non-UTF-8) names as GBK like Windows zip tools write them."""
+    name = info.filename
+    if not info.flag_bits & _UTF8_FLAG:
+        try:
+            name = name.encode("cp437").decode("gbk")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return name.replace("\\", "/")
+
+
+def plan_entries(archive: zipfile.ZipFile, max_entries: int) -> list[ArchiveEntry]:
+    """Files of the archive with the upload rules applied; folders and OS litter are dropped."""
+    entries: list[ArchiveEntry] = []
+    for info in archive.infolist():
+        path = entry_path(info)
+        name = PurePosixPath(path).name
+        if info.is_dir() or not name or name.startswith(".") or path.startswith("__MACOSX/"):
+            continue
+        suffix = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        entry = ArchiveEntry(index=len(entries), info=info, path=path, name=name, suffix=suffix)
+        entry.size_bytes = info.file_size
+        if suffix not in ALLOWED_SUFFIXES:
+            entry.status, entry.reason = "skipped", "unsupported_type"
+        elif info.flag_bits & _ENCRYPTED_FLAG:
+            entry.status, entry.reason = "skipped", "encrypted"
+        elif info.file_size > upload_limit_bytes(suffix):
+            entry.status, entry.reason = "skipped", "too_large"
+        entries.append(entry)
+    if len(entries) > max_entries:
+        raise ValueError(f"Archive has {len(entries)} files; at most {max_entries} are accepted")
+    return entries
+
+
+def _extract(archive: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path, limit: int) -> int:
+    """Decompress one member to ``dest`` in chunks (blocking); returns the bytes written."""
+    written = 0
+    with archive.open(info) as src, dest.open("wb") as out:
+        while chunk := src.read(_CHUNK):
+            written += len(chunk)
+            if written > limit:
+                raise EntryTooLarge
+            out.write(chunk)
+    return written
+
+
+class ArchiveIngestion:
+    """Stages, publishes and queues the files of course archives; see the module docstring."""
+
+    def __init__(
+        self,
+        store: MaterialStore,
+        lifecycle: StorageLifecycle,
+        jobs: JobRegistry,
+        *,
+        max_entries: int = 500,
+        parse_concurrency: int = 4,
+    ) -> None:
+        self.store = store
+        self.lifecycle = lifecycle
+        self.jobs = jobs
+        self.max_entries = max_entries
+        self._limiter = asyncio.Semaphore(max(1, parse_concurrency))
+
+    def open(self, fileobj: IO[bytes]) -> tuple[zipfile.ZipFile, list[ArchiveEntry]]:
+        """Read the central directory (blocking); ``ValueError`` for anything but a usable ZIP."""
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as exc:
+            raise ValueError("Not a ZIP archive") from exc
+        try:
+            return archive, plan_entries(archive, self.max_entries)
+        except ValueError:
+            archive.close()
+            raise
+
+    async def ingest(
+        self,
+        archive: zipfile.ZipFile,
+        entries: list[ArchiveEntry],
+        *,
+        course_id: str | None,
+        tags: str | None = None,
+        parse: bool = True,
+        mode: str = "auto",
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield progress events while the archive is ingested."""
+        batch_id = f"arc_{uuid.uuid4().hex[:12]}"
+        staging = self.store.root / f"{STAGING_PREFIX}{batch_id}"
+        committed = False
+        with span("materials.archive", **{"archive.id": batch_id, "archive.entries": len(entries)}) as archive_span:
+            try:
+                accepted = [entry for entry in entries if entry.status == "pending"]
+                yield {"type": "archive", "archiveId": batch_id, "entries": len(entries), "accepted": len(accepted)}
+                for entry in entries:
+                    if entry.status == "skipped":
+                        ARCHIVE_ENTRIES.inc(entry.reason)
+                        yield entry.event()
+
+                try:
+                    # declared sizes first: an over-quota batch is not extracted at all
+                    await self.lifecycle.check_upload(course_id, sum(entry.info.file_size for entry in accepted))
+                except QuotaExceeded as exc:
+                    yield {"type": "error", "error": str(exc)}
+                    return
+                staging.mkdir()
+                for entry in accepted:
+                    yield await self._stage(archive, entry, staging)
+                stored = [entry for entry in accepted if entry.status == "extracted"]
+
+                admitted = sum(entry.size_bytes for entry in stored)
+                try:
+                    # again with the extracted sizes, which a crafted archive can understate
+                    await self.lifecycle.admit_upload(course_id, admitted)
+                except QuotaExceeded as exc:
+                    yield {"type": "error", "error": str(exc)}
+                    return
+                now = datetime.now(timezone.utc).isoformat()
+                records = {
+                    entry.material_id: {
+                        "courseId": course_id,
+                        "title": PurePosixPath(entry.name).stem,
+                        "tags": tags,
+                        "mime": _mime(entry.name),
+                        "originalName": entry.name,
+                        "createdAt": now,
+                        "tier": "hot",
+                        "archive": {"id": batch_id, "path": entry.path},
+                    }
+                    for entry in stored
+                }
+                try:
+                    await asyncio.to_thread(self.store.commit_staged, staging, records)
+                except BaseException:
+                    # commit_staged rolled the batch back; so does the quota
+                    self.lifecycle.release_upload(course_id, admitted)
+                    raise
+                committed = True
+                yield {"type": "committed", "archiveId": batch_id, "materialIds": list(records)}
+
+                pending = self._queue(stored, mode) if parse else {}
+                for entry in stored:
+                    if entry.status == "extracted":
+                        entry.status = "uploaded"
+                    yield entry.event()
+                async for event in self._follow(pending):
+                    yield event
+
+                counts: dict[str, int] = {}
+                for entry in entries:
+                    counts[entry.status] = counts.get(entry.status, 0) + 1
+                archive_span.set(**{"archive.materials": len(stored)})
+                yield {"type": "done", "archiveId": batch_id, "materials": len(stored), "statuses": counts}
+            finally:
+                archive.close()
+                if not committed:
+                    self.lifecycle.discard(staging)
+
+    async def _stage(self, archive: zipfile.ZipFile, entry: ArchiveEntry, staging: Path) -> dict[str, Any]:
+        material_id = f"mat_{uuid.uuid4().hex[:12]}"
+        target = staging / material_id
+        target.mkdir()
+        try:
+            entry.size_bytes = await asyncio.to_thread(
+                _extract, archive, entry.info, target / entry.name, upload_limit_bytes(entry.suffix)
+            )
+        except EntryTooLarge:
+            entry.status, entry.reason = "skipped", "too_large"
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, EOFError, NotImplementedError):
+            # CRC mismatch, truncated member or unsupported compression
+            entry.status, entry.reason = "skipped", "corrupt"
+        else:
+            entry.status, entry.material_id = "extracted", material_id
+            ARCHIVE_ENTRIES.inc("stored")
+            return entry.event()
+        ARCHIVE_ENTRIES.inc(entry.reason)
+        await asyncio.to_thread(shutil.rmtree, target, True)
+        return entry.event()
+
+    def _queue(self, stored: list[ArchiveEntry], mode: str) -> dict[str, ArchiveEntry]:
+        """Start a parse job per material at once; the limiter decides when each runs."""
+        pending: dict[str, ArchiveEntry] = {}
+        for entry in stored:
+            material_id = entry.material_id
+            assert material_id is not None
+            resolved = resolve_mode(self.store.original_file(material_id), mode)
+            if resolved not in SUPPORTED_MODES:
+                continue  # no parser for this type yet, same as POST /parse
+            self.store.write_status(material_id, "queued", mode=resolved)
+            if self.jobs.start(material_id, self._bounded(material_id, resolved)):
+                entry.status = "queued"
+                pending[material_id] = entry
+        return pending
+
+    async def _bounded(self, material_id: str, mode: str) -> None:
+        started = False
+        try:
+            async with self._limiter:
+                started = True
+                await run_parse(material_id, mode)
+        finally:
+            # cancelled (or deleted) while still waiting for a slot
+            if not started and self.store.exists(material_id):
+                self.store.write_status(material_id, "cancelled", mode=mode)
+
+    async def _follow(self, pending: dict[str, ArchiveEntry]) -> AsyncIterator[dict[str, Any]]:
+        """Report parse jobs as they finish; leaving early does not cancel them."""
+        tasks = {task: material_id for material_id in pending if (task := self.jobs.get(material_id)) is not None}
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                entry = pending[tasks.pop(task)]
+                record = self.store.read_status(entry.material_id or "") or {}
+                entry.status = record.get("status") if record.get("status") in _TERMINAL else "cancelled"
+                entry.reason = record.get("error")
+                yield entry.event()
+
+
+def _mime(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+@lru_cache
+def get_archive_ingestion() -> ArchiveIngestion:
+    """Shared ingestion service; the parse limiter spans all archive uploads."""
+    return ArchiveIngestion(
+        get_material_store(),
+        get_storage_lifecycle(),
+        get_job_registry(),
+        max_entries=settings.archive_max_entries,
+        parse_concurrency=settings.archive_parse_concurrency,
+    )
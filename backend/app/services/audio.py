@@ -0,0 +1,229 @@
+"""Audio decoding and silence-aligned segmentation for transcription.
+
+Decoders produce mono 16-bit PCM blocks incrementally so segmentation (and the
+ASR requests behind it) can start long before a two-hour recording is fully
+decoded. ``FfmpegDecoder`` handles every supported upload type; ``WavDecoder``
+needs nothing beyond the standard library and serves as the stand-in for tests
+and for hosts without ffmpeg.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import shutil
+import wave
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncGenerator
+
+from app.core.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+AUDIO_SUFFIXES = {"mp3", "m4a", "wav", "mp4"}
+
+
+@dataclass(slots=True)
+class PcmStream:
+    """Decoded audio: sample rate plus an async generator of int16 mono blocks."""
+
+    sample_rate: int
+    blocks: AsyncGenerator[np.ndarray, None]
+
+
+@dataclass(slots=True)
+class AudioSegment:
+    """A contiguous slice of audio cut at (or near) a silence."""
+
+    index: int
+    start_sample: int
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def start_seconds(self) -> float:
+        return self.start_sample / self.sample_rate
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def to_wav(self) -> bytes:
+        """Encode the segment as a standalone WAV file."""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.sample_rate)
+            out.writeframes(self.samples.astype("<i2").tobytes())
+        return buffer.getvalue()
+
+
+class AudioDecoder(ABC):
+    """Turns an uploaded audio/video file into a PCM stream."""
+
+    @abstractmethod
+    async def open(self, path: Path) -> PcmStream:
+        """Start decoding ``path``."""
+
+
+class FfmpegDecoder(AudioDecoder):
+    """Decode any container ffmpeg understands to 16 kHz mono PCM."""
+
+    def __init__(self, binary: str = "ffmpeg", sample_rate: int = 16000, block_seconds: float = 5.0) -> None:
+        self._binary = binary
+        self._sample_rate = sample_rate
+        self._block_bytes = int(sample_rate * block_seconds) * 2
+
+    async def open(self, path: Path) -> PcmStream:
+        proc = await asyncio.create_subprocess_exec(
+            self._binary,
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-i",
+            str(path),
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(self._sample_rate),
+            "-f",
+            "s16le",
+            "-",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        return PcmStream(sample_rate=self._sample_rate, blocks=self._read(proc))
+
+    async def _read(self, proc: asyncio.subprocess.Process) -> AsyncGenerator[np.ndarray, None]:
+        assert proc.stdout is not None
+        finished = False
+        try:
+            while True:
+                data = await proc.stdout.readexactly(self._block_bytes)
+                yield np.frombuffer(data, dtype="<i2")
+        except asyncio.IncompleteReadError as exc:
+            finished = True
+            tail = exc.partial[: len(exc.partial) // 2 * 2]
+            if tail:
+                yield np.frombuffer(tail, dtype="<i2")
+        finally:
+            # consumer stopped early (cancel / duration cap): don't keep decoding
+            if not finished and proc.returncode is None:
+                proc.kill()
+            _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            msg = f"ffmpeg failed to decode audio: {stderr.decode(errors='ignore').strip()[:200]}"
+            raise ValueError(msg)
+
+
+class WavDecoder(AudioDecoder):
+    """Pure standard-library decoder for 16-bit PCM WAV files."""
+
+    def __init__(self, block_seconds: float = 5.0) -> None:
+        self._block_seconds = block_seconds
+
+    async def open(self, path: Path) -> PcmStream:
+        reader = wave.open(str(path), "rb")
+        if reader.getsampwidth() != 2:
+            reader.close()
+            msg = "Only 16-bit PCM WAV files can be decoded without ffmpeg."
+            raise ValueError(msg)
+        return PcmStream(sample_rate=reader.getframerate(), blocks=self._read(reader))
+
+    async def _read(self, reader: wave.Wave_read) -> AsyncGenerator[np.ndarray, None]:
+        channels = reader.getnchannels()
+        frames = max(1, int(reader.getframerate() * self._block_seconds))
+        try:
+            while True:
+                data = await asyncio.to_thread(reader.readframes, frames)
+                if not data:
+                    break
+                block = np.frombuffer(data, dtype="<i2")
+                if channels > 1:
+                    block = block.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                yield block
+        finally:
+            reader.close()
+
+
+def default_decoder(path: Path) -> AudioDecoder:
+    """Pick ffmpeg when available, otherwise fall back to the WAV decoder."""
+    binary = shutil.which("ffmpeg")
+    if binary:
+        return FfmpegDecoder(binary=binary)
+    if path.suffix.lower() == ".wav":
+        return WavDecoder()
+    msg = f"ffmpeg is required to decode {path.suffix} files."
+    raise ValueError(msg)
+
+
+class SilenceSegmenter:
+    """Cut a PCM stream into segments whose boundaries fall on quiet frames.
+
+    Once ``max_seconds`` of audio is buffered, the cut point is the frame
+    closest to ``target_seconds`` whose level is below ``silence_db``; if the
+    window has no silence, the quietest frame is used instead.
+    """
+
+    def __init__(
+        self,
+        *,
+        target_seconds: float = 60.0,
+        min_seconds: float | None = None,
+        max_seconds: float | None = None,
+        frame_ms: int = 30,
+        silence_db: float = -40.0,
+    ) -> None:
+        self._target = target_seconds
+        self._min = min_seconds if min_seconds is not None else target_seconds * 0.5
+        self._max = max_seconds if max_seconds is not None else target_seconds * 1.5
+        self._frame_ms = frame_ms
+        self._silence_db = silence_db
+
+    async def segments(self, stream: PcmStream) -> AsyncGenerator[AudioSegment, None]:
+        rate = stream.sample_rate
+        max_samples = int(self._max * rate)
+        pending: list[np.ndarray] = []
+        buffered = 0
+        offset = 0
+        index = 0
+
+        async for block in stream.blocks:
+            pending.append(block)
+            buffered += len(block)
+            while buffered >= max_samples:
+                buffer = np.concatenate(pending)
+                cut = self._find_cut(buffer, rate)
+                yield AudioSegment(index=index, start_sample=offset, samples=buffer[:cut], sample_rate=rate)
+                index += 1
+                offset += cut
+                pending = [buffer[cut:]]
+                buffered = len(buffer) - cut
+
+        if buffered:
+            buffer = np.concatenate(pending)
+            yield AudioSegment(index=index, start_sample=offset, samples=buffer, sample_rate=rate)
+
+    def _find_cut(self, buffer: np.ndarray, rate: int) -> int:
+        frame = max(1, rate * self._frame_ms // 1000)
+        lo = int(self._min * rate) // frame
+        hi = min(len(buffer), int(self._max * rate)) // frame
+        if hi <= lo:
+            return min(len(buffer), int(self._max * rate))
+
+        frames = buffer[lo * frame : hi * frame].astype(np.float32).reshape(-1, frame)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        level_db = 20.0 * np.log10(rms / 32768.0 + 1e-9)
+
+        candidates = np.flatnonzero(level_db < self._silence_db)
+        if candidates.size:
+            target = int(self._target * rate) // frame - lo
+            best = int(candidates[np.argmin(np.abs(candidates - target))])
+        else:
+            best = int(np.argmin(level_db))
+        # cut in the middle of the chosen frame
+        return (lo + best) * frame + frame // 2
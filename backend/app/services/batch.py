@@ -0,0 +1,185 @@
+"""Bulk prompt execution with bounded parallelism.
+
+Items run through ``LLMService.complete`` under a per-batch limiter and are
+reported as they finish (completion order, not input order). Duplicate
+prompts inside a batch are computed once thanks to the service's cache and
+in-flight coalescing. Large batches can run as background jobs whose results
+are polled by job ID.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Sequence
+
+from app.core.config import settings
+from app.core.tracing import start_span
+from app.services.jobs import get_job_registry
+from app.services.llm_service import LLMService
+
+
+@dataclass(slots=True)
+class BatchItem:
+    """One prompt of a batch, already converted to chat messages."""
+
+    index: int
+    id: str
+    messages: list[dict[str, Any]]
+
+
+@dataclass(slots=True)
+class BatchResult:
+    index: int
+    id: str
+    content: str | None = None
+    model: str | None = None
+    usage: dict[str, Any] | None = None
+    cached: bool = False
+    error: str | None = None
+    route: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "id": self.id,
+            "content": self.content,
+            "model": self.model,
+            "usage": self.usage,
+            "cached": self.cached,
+            "error": self.error,
+            "route": self.route,
+        }
+
+
+async def run_batch(
+    llm_service: LLMService,
+    items: Sequence[BatchItem],
+    *,
+    concurrency: int,
+    model: str | None = None,
+    temperature: float | None = None,
+) -> AsyncIterator[BatchResult]:
+    """Yield one ``BatchResult`` per item as soon as it completes.
+
+    Closing the iterator early cancels everything still queued or running.
+    """
+    limiter = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(item: BatchItem) -> BatchResult:
+        async with limiter:
+            try:
+                result, source = await llm_service.complete(
+                    item.messages, model=model, temperature=temperature, endpoint="batch", cache=True
+                )
+            except Exception as exc:  # noqa: BLE001 - reported per item, the batch goes on
+                return BatchResult(item.index, item.id, error=str(exc) or type(exc).__name__)
+        return BatchResult(
+            item.index,
+            item.id,
+            content=result.content,
+            model=result.model,
+            usage=result.usage,
+            cached=source != "miss",
+            route=result.route["route"] if result.route else None,
+        )
+
+    # generator: span is not made current, see app.core.tracing
+    batch_span = start_span("batch.run", **{"batch.items": len(items), "batch.concurrency": concurrency})
+    tasks = [asyncio.create_task(run_one(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        batch_span.end()
+
+
+@dataclass(slots=True)
+class BatchJob:
+    """State of a batch running in the background."""
+
+    job_id: str
+    total: int
+    status: str = "running"
+    results: list[BatchResult] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if r.error)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "jobId": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.results),
+            "failed": self.failed,
+        }
+
+
+class BatchJobStore:
+    """In-memory batch jobs, kept ``BATCH_JOB_TTL_SECONDS`` after they finish."""
+
+    def __init__(self, ttl_seconds: float = 3600.0) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._jobs: dict[str, BatchJob] = {}
+
+    def submit(
+        self,
+        llm_service: LLMService,
+        items: Sequence[BatchItem],
+        *,
+        concurrency: int,
+        model: str | None = None,
+        temperature: float | None = None,
+    ) -> BatchJob:
+        self._evict()
+        job = BatchJob(job_id=f"batch_{uuid.uuid4().hex[:12]}", total=len(items))
+        self._jobs[job.job_id] = job
+
+        async def execute() -> None:
+            results = run_batch(llm_service, items, concurrency=concurrency, model=model, temperature=temperature)
+            try:
+                async with aclosing(results):
+                    async for result in results:
+                        job.results.append(result)
+                job.status = "completed"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            finally:
+                job.finished_at = time.time()
+
+        get_job_registry().start(self._job_key(job.job_id), execute())
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        return get_job_registry().cancel(self._job_key(job_id))
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"batch:{job_id}"
+
+    def _evict(self) -> None:
+        deadline = time.time() - self.ttl_seconds
+        expired = [k for k, job in self._jobs.items() if job.finished_at is not None and job.finished_at < deadline]
+        for key in expired:
+            del self._jobs[key]
+
+
+@lru_cache
+def get_batch_job_store() -> BatchJobStore:
+    """Shared job store configured from BATCH_* settings."""
+    return BatchJobStore(ttl_seconds=settings.batch_job_ttl_seconds)
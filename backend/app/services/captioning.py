@@ -0,0 +1,269 @@
+"""Vision captioning of rendered material pages (``reparse(mode="vision")``).
+
+Pages whose text layer is long enough are stored as ``text`` chunks without a
+VQA request. The rest are packed several per request, requests run concurrently
+under a shared limiter and every finished batch is appended to the chunk store
+right away. The chunk store therefore doubles as the checkpoint: a cancelled or failed
+job that is started again only captions the pages that are still missing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Sequence
+
+from app.clients.base import LLMClient, LLMGenerationOptions
+from app.clients.openai_client import OpenAIClient
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.material_store import PAGES_DIR, MaterialStore, get_material_store
+
+IMAGE_SUFFIXES = {"jpg", "jpeg", "png"}
+_IMAGE_MIME = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png"}
+_PAGE_RE = re.compile(r"page-(\d+)\.(png|jpe?g)$", re.IGNORECASE)
+
+CAPTION_PROMPT = (
+    "你是课程资料解析助手。用户会按顺序给出若干页课件/教材的图片，"
+    "请为每一页写一段详尽的中文描述，覆盖标题、要点、公式、图表含义与其中的文字。"
+    '只返回 JSON：{"captions": [{"page": 页码, "caption": "描述"}]}，不要输出其他内容。'
+)
+
+
+@dataclass(slots=True)
+class PageImage:
+    """A rendered page with the text already extracted from it (if any)."""
+
+    page: int
+    image_path: Path
+    text: str = ""
+
+
+@dataclass(slots=True)
+class CaptionReport:
+    """Summary of a captioning run."""
+
+    total_pages: int = 0
+    skipped_text: int = 0
+    already_done: int = 0
+    captioned: int = 0
+    requests: int = 0
+    failed_pages: list[int] = field(default_factory=list)
+
+
+def collect_pages(material_dir: Path, original: Path | None) -> list[PageImage]:
+    """Return the material's pages, rendering PDFs on first use.
+
+    Images are a single page. Other documents rely on ``pages/page-NNNN.png``
+    produced by the renderer; PDFs are rendered here when PyMuPDF is installed.
+    """
+    if original is not None and original.suffix.lower().lstrip(".") in IMAGE_SUFFIXES:
+        return [PageImage(page=1, image_path=original)]
+
+    pages_dir = material_dir / PAGES_DIR
+    if not pages_dir.is_dir() and original is not None and original.suffix.lower() == ".pdf":
+        render_pdf_pages(original, pages_dir)
+    if not pages_dir.is_dir():
+        msg = "No rendered pages found for this material; vision parsing needs page images."
+        raise ValueError(msg)
+
+    pages: list[PageImage] = []
+    for item in sorted(pages_dir.iterdir()):
+        match = _PAGE_RE.match(item.name)
+        if not match:
+            continue
+        text_path = item.with_suffix(".txt")
+        text = text_path.read_text("utf-8", errors="ignore") if text_path.exists() else ""
+        pages.append(PageImage(page=int(match.group(1)), image_path=item, text=text))
+    return pages
+
+
+def render_pdf_pages(pdf_path: Path, out_dir: Path, *, dpi: int = 110) -> None:
+    """Render every PDF page to PNG and store its text layer alongside."""
+    try:
+        import fitz  # PyMuPDF, optional dependency
+    except ImportError as exc:
+        msg = "Rendering PDF pages requires PyMuPDF (pip install pymupdf)."
+        raise ValueError(msg) from exc
+
+    tmp_dir = out_dir.with_name(out_dir.name + ".partial")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    with fitz.open(pdf_path) as doc:
+        for index, page in enumerate(doc, start=1):
+            stem = tmp_dir / f"page-{index:04d}"
+            page.get_pixmap(dpi=dpi).save(str(stem.with_suffix(".png")))
+            stem.with_suffix(".txt").write_text(page.get_text(), "utf-8")
+    tmp_dir.rename(out_dir)
+
+
+class CaptioningService:
+    """Generate ``caption`` chunks for pages lacking a usable text layer.
+
+    Pages that do have one are written as ``text`` chunks instead, so every
+    page ends up searchable.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        store: MaterialStore,
+        *,
+        pages_per_request: int = 4,
+        concurrency: int = 4,
+        min_text_chars: int = 200,
+    ) -> None:
+        self._client = client
+        self._store = store
+        self._pages_per_request = max(1, pages_per_request)
+        self._min_text_chars = min_text_chars
+        self._limiter = asyncio.Semaphore(max(1, concurrency))
+
+    async def caption_material(self, material_id: str) -> CaptionReport:
+        """Caption all pending pages of a material and return a run summary."""
+        material_dir = self._store.path(material_id)
+        original = self._store.original_file(material_id)
+        pages = await asyncio.to_thread(collect_pages, material_dir, original)
+
+        done = {
+            c.get("page")
+            for c in self._store.list_chunks(material_id)
+            if c.get("type") in {"caption", "text"} and c.get("page") is not None
+        }
+        report = CaptionReport(total_pages=len(pages))
+        pending: list[PageImage] = []
+        text_pages: list[PageImage] = []
+        for page in pages:
+            if page.page in done:
+                report.already_done += 1
+            elif len(page.text.strip()) >= self._min_text_chars:
+                report.skipped_text += 1
+                text_pages.append(page)
+            else:
+                pending.append(page)
+        # the text layer is good enough: store it as is, no VQA request needed
+        self._store.append_chunks(
+            material_id,
+            [
+                {
+                    "chunkId": f"{material_id}:text:p{page.page:04d}",
+                    "materialId": material_id,
+                    "type": "text",
+                    "page": page.page,
+                    "text": page.text.strip(),
+                }
+                for page in text_pages
+            ],
+        )
+
+        size = self._pages_per_request
+        batches = [pending[i : i + size] for i in range(0, len(pending), size)]
+        results = await asyncio.gather(
+            *(self._caption_batch(material_id, batch, report) for batch in batches),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        for error in errors:
+            if isinstance(error, asyncio.CancelledError):
+                raise error
+        if errors:
+            raise errors[0]
+        return report
+
+    async def _caption_batch(self, material_id: str, batch: list[PageImage], report: CaptionReport) -> None:
+        async with self._limiter:
+            if self._store.is_cancelled(material_id):
+                raise asyncio.CancelledError()
+            try:
+                with span("vqa.batch", **{"material.id": material_id, "vqa.pages": len(batch)}):
+                    captions = await self._request_captions(batch, report)
+                missing = [p for p in batch if p.page not in captions]
+                if missing and len(batch) > 1:
+                    # model skipped pages in a packed reply: retry them one by one
+                    for page in missing:
+                        captions.update(await self._request_captions([page], report))
+            except ValueError:
+                report.failed_pages.extend(p.page for p in batch)
+                raise
+
+        chunks = [
+            {
+                "chunkId": f"{material_id}:caption:p{page.page:04d}",
+                "materialId": material_id,
+                "type": "caption",
+                "page": page.page,
+                "text": captions[page.page],
+            }
+            for page in batch
+            if captions.get(page.page)
+        ]
+        report.captioned += self._store.append_chunks(material_id, chunks)
+
+    async def _request_captions(self, batch: Sequence[PageImage], report: CaptionReport) -> dict[int, str]:
+        content: list[dict[str, Any]] = [
+            {"type": "text", "text": "页码：" + ", ".join(str(p.page) for p in batch)}
+        ]
+        for page in batch:
+            data = await asyncio.to_thread(page.image_path.read_bytes)
+            mime = _IMAGE_MIME.get(page.image_path.suffix.lower().lstrip("."), "image/png")
+            encoded = base64.b64encode(data).decode("ascii")
+            content.append({"type": "image_url", "image_url": {"url": f"data:{mime};base64,{encoded}"}})
+
+        messages = [
+            {"role": "system", "content": CAPTION_PROMPT},
+            {"role": "user", "content": content},
+        ]
+        report.requests += 1
+        result = await self._client.generate(messages=messages, options=LLMGenerationOptions(temperature=0.0))
+        return _parse_captions(result.content, batch)
+
+
+def _parse_captions(raw: str, batch: Sequence[PageImage]) -> dict[int, str]:
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1 :] if "\n" in text else text
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # single page requests may come back as plain prose; accept it as-is
+        return {batch[0].page: raw.strip()} if len(batch) == 1 and raw.strip() else {}
+
+    items = data.get("captions") if isinstance(data, dict) else data
+    expected = {p.page for p in batch}
+    captions: dict[int, str] = {}
+    if isinstance(items, list):
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                page = int(item.get("page"))
+            except (TypeError, ValueError):
+                continue
+            caption = str(item.get("caption") or "").strip()
+            if page in expected and caption:
+                captions[page] = caption
+    return captions
+
+
+@lru_cache
+def get_captioning_service() -> CaptioningService:
+    """Cached service wired to VQA_* settings (falling back to VLM_*)."""
+    client = OpenAIClient(
+        api_key=settings.vision_api_key,
+        model=settings.vision_model,
+        base_url=settings.vision_base_url,
+        timeout=settings.request_timeout_seconds,
+        provider=(settings.vqa_provider or settings.text_provider).lower(),
+    )
+    return CaptioningService(
+        client=client,
+        store=get_material_store(),
+        pages_per_request=settings.vqa_pages_per_request,
+        concurrency=settings.vqa_concurrency,
+        min_text_chars=settings.vqa_min_text_chars,
+    )
@@ -0,0 +1,346 @@
+"""Near-duplicate chunk detection (MinHash + LSH) for the ingest pipeline.
+
+Course materials repeat themselves: the same slide template on every page,
+textbook excerpts pasted into handouts. After a material is parsed, each chunk
+gets a MinHash signature over character shingles and is looked up in an LSH
+index of the course's canonical chunks (and of earlier chunks of the same
+material). Chunks whose estimated Jaccard similarity reaches
+``DEDUP_THRESHOLD`` are marked ``duplicateOf``/``similarity`` in
+``chunks.jsonl``, so embedding and retrieval can skip them; the per-material
+dedup ratio is recorded in the parse status.
+
+Hashing is vectorized: shingles are rolled into 64-bit polynomial hashes with
+one NumPy matmul, and all permutations are applied at once with
+multiply-shift hashing (``(a * x + b) >> 32`` modulo 2**64), then reduced per
+chunk with ``np.minimum.reduceat``.
+
+Signatures of canonical chunks are kept next to the material
+(``minhash.npz``); the per-course index is rebuilt from them on demand, so it
+follows deletes and parses done by other workers. Which materials belong to a
+course is kept in memory and refreshed only when the store's root directory
+changes, so a parse does not read every material's metadata.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Sequence
+
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.metrics import DEDUP_CHUNKS
+from app.services.material_store import MaterialStore, get_material_store
+
+np = lazy_import("numpy")
+
+SIGNATURE_FILE = "minhash.npz"
+ROWS_PER_BAND = 4
+_SEED = 0x5EED
+_MAX_BLOCK = 1 << 16  # shingles hashed per block (x num_perm uint64s)
+_SKIP = re.compile(r"[\W_]+")
+
+
+def normalize_chunk(text: str) -> str:
+    """Drop case, width, whitespace and punctuation differences before shingling."""
+    return _SKIP.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+@dataclass(slots=True)
+class DedupReport:
+    chunks: int = 0
+    duplicates: int = 0
+    within_material: int = 0
+    cross_material: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicates / self.chunks if self.chunks else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "withinMaterial": self.within_material,
+            "crossMaterial": self.cross_material,
+            "ratio": round(self.ratio, 4),
+        }
+
+
+class MinHasher:
+    """MinHash signatures over character ``shingle_size``-grams."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = _SEED) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # odd multipliers keep multiply-shift hashing universal
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._powers = np.uint64(1_000_003) ** np.arange(shingle_size, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Distinct 64-bit shingle hashes of normalized ``text``."""
+        codes = np.frombuffer(normalize_chunk(text).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if codes.size == 0:
+            return codes
+        if codes.size < self.shingle_size:
+            return np.array([codes @ self._powers[: codes.size]], dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            hashes = np.lib.stride_tricks.sliding_window_view(codes, self.shingle_size) @ self._powers
+        return np.unique(hashes)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), num_perm)`` uint32 signatures; empty texts get all-ones rows."""
+        out = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        pending: list[tuple[int, np.ndarray]] = []
+        size = 0
+        for row, text in enumerate(texts):
+            hashes = self.shingles(text)
+            if hashes.size == 0:
+                continue
+            if pending and size + hashes.size > _MAX_BLOCK:
+                self._fill(out, pending)
+                pending, size = [], 0
+            pending.append((row, hashes))
+            size += hashes.size
+        if pending:
+            self._fill(out, pending)
+        return out
+
+    def _fill(self, out: np.ndarray, pending: list[tuple[int, np.ndarray]]) -> None:
+        hashes = np.concatenate([h for _, h in pending])
+        offsets = np.cumsum([0] + [h.size for _, h in pending[:-1]])
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        out[[row for row, _ in pending]] = np.minimum.reduceat(permuted, offsets, axis=0).astype(np.uint32)
+
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures; candidates are verified by signature agreement.
+
+    Removing a material takes its slots out of the buckets at once; the slot
+    storage is compacted when dead slots outnumber live ones, so an index that
+    sees the same materials re-added after every reparse stays bounded.
+    """
+
+    def __init__(self, num_perm: int, rows_per_band: int = ROWS_PER_BAND) -> None:
+        self.rows = rows_per_band
+        self.bands = num_perm // rows_per_band
+        self._buckets: dict[tuple[int, bytes], list[int]] = defaultdict(list)
+        self._keys: list[str] = []
+        self._signatures: list[np.ndarray] = []
+        self._alive: list[bool] = []
+        self._live = 0
+        self._by_material: dict[str, list[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def slots(self) -> int:
+        """Allocated slots, live or dead."""
+        return len(self._keys)
+
+    def add(self, key: str, material_id: str, signature: np.ndarray) -> None:
+        slot = len(self._keys)
+        self._keys.append(key)
+        self._signatures.append(signature)
+        self._alive.append(True)
+        self._live += 1
+        self._by_material[material_id].append(slot)
+        for band, token in self._band_tokens(signature):
+            self._buckets[(band, token)].append(slot)
+
+    def remove_material(self, material_id: str) -> None:
+        for slot in self._by_material.pop(material_id, []):
+            for band_token in self._band_tokens(self._signatures[slot]):
+                bucket = self._buckets.get(band_token)
+                if bucket is not None:
+                    bucket.remove(slot)
+                    if not bucket:
+                        del self._buckets[band_token]
+            self._alive[slot] = False
+            self._live -= 1
+        if len(self._keys) > 2 * self._live:
+            self._compact()
+
+    def _compact(self) -> None:
+        keys, signatures = self._keys, self._signatures
+        members = [(material_id, slots) for material_id, slots in self._by_material.items()]
+        self._buckets = defaultdict(list)
+        self._keys, self._signatures, self._alive, self._live = [], [], [], 0
+        self._by_material = defaultdict(list)
+        for material_id, slots in members:
+            for slot in slots:
+                self.add(keys[slot], material_id, signatures[slot])
+
+    def materials(self) -> set[str]:
+        return set(self._by_material)
+
+    def query(self, signature: np.ndarray, threshold: float) -> tuple[str, float] | None:
+        """Most similar indexed key with estimated Jaccard >= ``threshold``."""
+        candidates = {
+            slot
+            for band, token in self._band_tokens(signature)
+            for slot in self._buckets.get((band, token), ())
+            if self._alive[slot]
+        }
+        if not candidates:
+            return None
+        slots = sorted(candidates)
+        similarity = (np.stack([self._signatures[s] for s in slots]) == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] < threshold:
+            return None
+        return self._keys[slots[best]], float(similarity[best])
+
+    def _band_tokens(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        rows = signature[: self.bands * self.rows].reshape(self.bands, self.rows)
+        return [(band, rows[band].tobytes()) for band in range(self.bands)]
+
+
+class DedupService:
+    """Marks near-duplicate chunks of a material against its course."""
+
+    def __init__(
+        self,
+        store: MaterialStore,
+        *,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        max_courses: int = 64,
+    ) -> None:
+        self.store = store
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.max_courses = max_courses
+        self._indexes: OrderedDict[str, LSHIndex] = OrderedDict()
+        # material -> course from meta.json, rescanned only when the store root changes
+        self._courses: dict[str, str | None] = {}
+        self._members: dict[str, set[str]] = defaultdict(set)
+        self._pending: set[str] = set()
+        self._scanned: int | None = None
+        # dedup runs in worker threads; one material at a time per process
+        self._lock = threading.Lock()
+
+    def dedupe_material(self, material_id: str) -> DedupReport:
+        """Mark duplicates in ``chunks.jsonl`` (blocking; run it in a thread)."""
+        with self._lock:
+            return self._dedupe(material_id)
+
+    def _dedupe(self, material_id: str) -> DedupReport:
+        chunks = self.store.list_chunks(material_id)
+        course_id = self.store.read_meta(material_id).get("courseId")
+        index = self._course_index(course_id, exclude=material_id)
+        local = LSHIndex(self.hasher.num_perm)
+        signatures = self.hasher.signatures([chunk.get("text") or "" for chunk in chunks])
+        report = DedupReport()
+        canonical: list[int] = []
+
+        for row, chunk in enumerate(chunks):
+            chunk.pop("duplicateOf", None)
+            chunk.pop("similarity", None)
+            if not normalize_chunk(chunk.get("text") or ""):
+                continue
+            report.chunks += 1
+            signature = signatures[row]
+            match = local.query(signature, self.threshold)
+            cross = index.query(signature, self.threshold) if match is None and index is not None else None
+            if match is None and cross is None:
+                local.add(chunk["chunkId"], material_id, signature)
+                canonical.append(row)
+                DEDUP_CHUNKS.inc("unique")
+                continue
+            duplicate_of, similarity = match or cross
+            chunk["duplicateOf"] = duplicate_of
+            chunk["similarity"] = round(similarity, 4)
+            report.duplicates += 1
+            if match is not None:
+                report.within_material += 1
+            else:
+                report.cross_material += 1
+            DEDUP_CHUNKS.inc("duplicate")
+
+        self.store.rewrite_chunks(material_id, chunks)
+        np.savez(
+            self.store.path(material_id) / SIGNATURE_FILE,
+            ids=np.array([chunks[row]["chunkId"] for row in canonical], dtype=str),
+            signatures=signatures[canonical],
+        )
+        if index is not None:
+            for row in canonical:
+                index.add(chunks[row]["chunkId"], material_id, signatures[row])
+        return report
+
+    def _course_index(self, course_id: str | None, exclude: str) -> LSHIndex | None:
+        """Index of the course's canonical chunks, synced with the materials on disk."""
+        if not course_id:
+            return None
+        index = self._indexes.get(course_id)
+        if index is None:
+            index = self._indexes[course_id] = LSHIndex(self.hasher.num_perm)
+            if len(self._indexes) > self.max_courses:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(course_id)
+
+        members = {
+            material_id
+            for material_id in self._course_members(course_id)
+            if material_id != exclude and (self.store.path(material_id) / SIGNATURE_FILE).exists()
+        }
+        index.remove_material(exclude)
+        for material_id in index.materials() - members:
+            index.remove_material(material_id)
+        for material_id in members - index.materials():
+            try:
+                with np.load(self.store.path(material_id) / SIGNATURE_FILE, allow_pickle=False) as data:
+                    for key, signature in zip(data["ids"], data["signatures"]):
+                        index.add(str(key), material_id, signature)
+            except (OSError, ValueError, KeyError):
+                continue  # removed or half-written; picked up on the next run
+        return index
+
+    def _course_members(self, course_id: str) -> set[str]:
+        """Materials of ``course_id``; the store is listed again only after its root changed.
+
+        Creating, publishing or deleting a material changes the root directory's
+        mtime. Timestamps are coarse, so a root modified within the last second
+        is always rescanned, and materials whose metadata is not written yet are
+        retried on every call.
+        """
+        root = self.store.root.stat().st_mtime_ns
+        if root != self._scanned or time.time_ns() - root < 1_000_000_000:
+            present = {path.name for path in self.store.root.iterdir() if not path.name.startswith(".")}
+            for material_id in self._courses.keys() - present:
+                self._members[self._courses.pop(material_id) or ""].discard(material_id)
+            self._pending = (self._pending & present) | (present - self._courses.keys())
+            self._scanned = root
+        for material_id in list(self._pending):
+            meta = self.store.read_meta(material_id)
+            if not meta:
+                continue
+            self._pending.discard(material_id)
+            course = self._courses[material_id] = meta.get("courseId")
+            self._members[course or ""].add(material_id)
+        return self._members.get(course_id, set())
+
+
+@lru_cache
+def get_dedup_service() -> DedupService | None:
+    """Dedup stage configured from DEDUP_*; ``None`` when disabled."""
+    if not settings.dedup_enabled:
+        return None
+    return DedupService(
+        get_material_store(),
+        threshold=settings.dedup_threshold,
+        num_perm=settings.dedup_num_perm,
+        shingle_size=settings.dedup_shingle_size,
+    )
@@ -0,0 +1,338 @@
+"""Versioned, incrementally updated vector index per material.
+
+Each material keeps its embeddings under ``index/``:
+
+ - ``v000007.npz``: one immutable index version (chunk IDs, fingerprints,
+   texts and a ``live`` mask), with its unit vectors in ``v000007.npy`` so
+   they are memory-mapped instead of read: loading is cheap and workers on
+   one host share the pages
+ - ``CURRENT.json``: manifest naming the live version, swapped with an atomic
+   ``os.replace``; readers always see a complete version
+
+Re-indexing after a reparse diffs the chunk set against the live version by
+fingerprint (SHA-1 of embedding model + text): unchanged chunks keep their row
+and vector, rows whose chunk was removed or changed are tombstoned in place
+(``live=False``), and only new or changed texts are embedded and appended.
+Vectors of identical texts are reused even across chunk IDs. Once tombstones
+outnumber live rows the version is written compacted.
+
+The previous version stays on disk so a reader that loaded the old manifest
+can still open it; older ones are deleted after each swap. Chunks marked
+``duplicateOf`` another chunk of the same material are not embedded;
+duplicates of other materials are, since each material is searched alone.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from app.clients.embedding_client import EmbeddingClient
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.tracing import span
+from app.services.material_store import INDEX_DIR, MaterialStore, get_material_store
+from app.services.semantic_cache import build_embedding_client
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "CURRENT.json"
+
+
+def fingerprint(text: str, model: str) -> str:
+    """Identity of a chunk's embedding: same model and text, same vector."""
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+@dataclass(slots=True)
+class IndexVersion:
+    version: int
+    model: str
+    chunk_ids: np.ndarray
+    fingerprints: np.ndarray
+    texts: np.ndarray
+    vectors: np.ndarray
+    live: np.ndarray
+
+    @property
+    def live_count(self) -> int:
+        return int(self.live.sum())
+
+    @property
+    def tombstones(self) -> int:
+        return int(self.live.size - self.live.sum())
+
+
+@dataclass(slots=True)
+class IndexReport:
+    version: int | None
+    embedded: int = 0
+    reused: int = 0
+    tombstoned: int = 0
+    live: int = 0
+    compacted: bool = False
+    unchanged: bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "tombstoned": self.tombstoned,
+            "live": self.live,
+            "compacted": self.compacted,
+            "unchanged": self.unchanged,
+        }
+
+
+class MaterialIndexer:
+    """Builds and queries the per-material index; see the module docstring."""
+
+    def __init__(
+        self,
+        store: MaterialStore,
+        embedder: EmbeddingClient,
+        *,
+        model: str,
+        cache_size: int = 32,
+    ) -> None:
+        self.store = store
+        self.embedder = embedder
+        self.model = model
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[str, int], IndexVersion] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    # ---- Reads ----
+    def manifest(self, material_id: str) -> dict[str, Any] | None:
+        try:
+            return json.loads((self._dir(material_id) / MANIFEST_FILE).read_text("utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def load(self, material_id: str) -> IndexVersion | None:
+        """The live version (blocking on a cache miss)."""
+        manifest = self.manifest(material_id)
+        if manifest is None:
+            return None
+        key = (material_id, manifest["version"])
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        base = self._dir(material_id)
+        with np.load(base / manifest["file"], allow_pickle=False) as data:
+            loaded = IndexVersion(
+                version=manifest["version"],
+                model=manifest["model"],
+                chunk_ids=data["chunk_ids"],
+                fingerprints=data["fingerprints"],
+                texts=data["texts"],
+                vectors=np.load(base / manifest["vectors"], mmap_mode="r", allow_pickle=False),
+                live=data["live"],
+            )
+        self._cache[key] = loaded
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return loaded
+
+    def preload(self, limit: int) -> int:
+        """Map the live versions of the ``limit`` most recently used materials (blocking)."""
+        materials = [
+            path.parents[1]
+            for path in self.store.root.glob(f"*/{INDEX_DIR}/{MANIFEST_FILE}")
+            if not path.parents[1].name.startswith(".")
+        ]
+        loaded = 0
+        for material in sorted(materials, key=_last_used, reverse=True)[:limit]:
+            try:
+                loaded += self.load(material.name) is not None
+            except (OSError, ValueError, KeyError):
+                continue  # removed or half-written; loaded on first search instead
+        return loaded
+
+    async def search(self, material_id: str, query: str, top_k: int = 5) -> list[dict[str, Any]]:
+        """Top ``top_k`` live chunks by cosine similarity to ``query``."""
+        current = await asyncio.to_thread(self.load, material_id)
+        if current is None or not current.live_count:
+            return []
+        vector = _normalize(np.asarray(await self.embedder.embed([query]), dtype=np.float32))[0]
+        scores = current.vectors @ vector
+        scores[~current.live] = -np.inf
+        top = np.argsort(-scores)[: min(top_k, current.live_count)]
+        return [
+            {
+                "chunkId": str(current.chunk_ids[row]),
+                "materialId": material_id,
+                "text": str(current.texts[row]),
+                "score": round(float(scores[row]), 4),
+            }
+            for row in top
+        ]
+
+    # ---- Writes ----
+    async def reindex(self, material_id: str) -> IndexReport:
+        """Bring the index in line with ``chunks.jsonl`` and swap in a new version."""
+        lock = self._locks.setdefault(material_id, asyncio.Lock())
+        async with lock:
+            with span("materials.index", **{"material.id": material_id}) as index_span:
+                report = await self._reindex(material_id)
+                index_span.set(
+                    **{"index.version": report.version, "index.embedded": report.embedded, "index.reused": report.reused}
+                )
+                return report
+
+    async def _reindex(self, material_id: str) -> IndexReport:
+        current = await asyncio.to_thread(self.load, material_id)
+        if current is not None and current.model != self.model:
+            current = None  # another embedding space: start over
+        # only repeats within this material are skipped: the index is per material,
+        # so text shared with another material must still be searchable here
+        own = f"{material_id}:"
+        chunks = [
+            chunk
+            for chunk in self.store.list_chunks(material_id)
+            if not str(chunk.get("duplicateOf") or "").startswith(own) and (chunk.get("text") or "").strip()
+        ]
+        wanted = {(chunk["chunkId"], fingerprint(chunk["text"], self.model)): chunk for chunk in chunks}
+
+        existing: dict[tuple[str, str], int] = {}
+        by_fingerprint: dict[str, int] = {}
+        if current is not None:
+            for row, (chunk_id, fp) in enumerate(zip(current.chunk_ids.tolist(), current.fingerprints.tolist())):
+                by_fingerprint.setdefault(fp, row)
+                if current.live[row]:
+                    existing[(chunk_id, fp)] = row
+        removed = [row for key, row in existing.items() if key not in wanted]
+        added = [key for key in wanted if key not in existing]
+        report = IndexReport(version=current.version if current else None, reused=len(existing) - len(removed))
+        if current is not None and not removed and not added:
+            report.unchanged = True
+            report.live = current.live_count
+            return report
+
+        # embed each new text once; texts already in this version reuse their vector
+        missing = list(dict.fromkeys(fp for _, fp in added if fp not in by_fingerprint))
+        texts = {fp: chunk["text"] for (_, fp), chunk in wanted.items()}
+        fresh: dict[str, np.ndarray] = {}
+        if missing:
+            vectors = _normalize(np.asarray(await self.embedder.embed([texts[fp] for fp in missing]), dtype=np.float32))
+            fresh = dict(zip(missing, vectors))
+        report.embedded = len(missing)
+        report.reused += len(added) - len(missing)
+
+        new_vectors = [fresh[fp] if fp in fresh else current.vectors[by_fingerprint[fp]] for _, fp in added]
+        if current is None:
+            live = np.ones(len(added), dtype=bool)
+            chunk_ids = np.array([chunk_id for chunk_id, _ in added], dtype=str)
+            fingerprints = np.array([fp for _, fp in added], dtype=str)
+            text_rows = np.array([texts[fp] for _, fp in added], dtype=str)
+            matrix = np.stack(new_vectors) if new_vectors else np.zeros((0, 0), dtype=np.float32)
+        else:
+            live = current.live.copy()
+            live[removed] = False
+            live = np.concatenate([live, np.ones(len(added), dtype=bool)])
+            chunk_ids = np.concatenate([current.chunk_ids, np.array([c for c, _ in added], dtype=str)])
+            fingerprints = np.concatenate([current.fingerprints, np.array([fp for _, fp in added], dtype=str)])
+            text_rows = np.concatenate([current.texts, np.array([texts[fp] for _, fp in added], dtype=str)])
+            matrix = current.vectors
+            if new_vectors:
+                stacked = np.stack(new_vectors)
+                matrix = np.concatenate([matrix, stacked]) if matrix.size else stacked
+        report.tombstoned = len(removed)
+
+        if live.size - live.sum() > live.sum():
+            chunk_ids, fingerprints, text_rows, matrix = (a[live] for a in (chunk_ids, fingerprints, text_rows, matrix))
+            live = live[live]
+            report.compacted = True
+
+        version = (current.version if current else self._latest_version(material_id)) + 1
+        report.version = version
+        report.live = int(live.sum())
+        await asyncio.to_thread(
+            self._write_version, material_id, version, report, chunk_ids, fingerprints, text_rows, matrix, live
+        )
+        return report
+
+    def _write_version(
+        self,
+        material_id: str,
+        version: int,
+        report: IndexReport,
+        chunk_ids: np.ndarray,
+        fingerprints: np.ndarray,
+        texts: np.ndarray,
+        vectors: np.ndarray,
+        live: np.ndarray,
+    ) -> None:
+        base = self._dir(material_id)
+        base.mkdir(exist_ok=True)
+        name = f"v{version:06d}.npz"
+        vectors_name = f"v{version:06d}.npy"
+        tmp = base / f".{vectors_name}.{uuid.uuid4().hex[:8]}.tmp"
+        with tmp.open("wb") as fh:
+            np.save(fh, np.ascontiguousarray(vectors, dtype=np.float32))
+        tmp.replace(base / vectors_name)
+        tmp = base / f".{name}.{uuid.uuid4().hex[:8]}.tmp"
+        with tmp.open("wb") as fh:
+            np.savez(fh, chunk_ids=chunk_ids, fingerprints=fingerprints, texts=texts, live=live)
+        tmp.replace(base / name)
+        manifest = {
+            "version": version,
+            "file": name,
+            "vectors": vectors_name,
+            "model": self.model,
+            "live": int(live.sum()),
+            "tombstones": int(live.size - live.sum()),
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
+            "lastRun": report.to_dict(),
+        }
+        tmp = base / f".{MANIFEST_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp.write_text(json.dumps(manifest), "utf-8")
+        tmp.replace(base / MANIFEST_FILE)
+        # keep the previous version for readers holding the old manifest
+        for path in base.glob("v*.np[yz]"):
+            if int(path.stem[1:]) < version - 1:
+                path.unlink(missing_ok=True)
+
+    def _latest_version(self, material_id: str) -> int:
+        versions = [int(path.stem[1:]) for path in self._dir(material_id).glob("v*.npz")]
+        return max(versions, default=0)
+
+    def _dir(self, material_id: str) -> Path:
+        return self.store.path(material_id) / INDEX_DIR
+
+    async def aclose(self) -> None:
+        await self.embedder.aclose()
+
+
+def _last_used(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@lru_cache
+def get_material_indexer() -> MaterialIndexer | None:
+    """Indexer over EMB_* embeddings; ``None`` when no embedding model is configured."""
+    embedder = build_embedding_client()
+    if embedder is None:
+        return None
+    return MaterialIndexer(get_material_store(), embedder, model=settings.emb_model or "")
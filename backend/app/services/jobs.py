@@ -0,0 +1,53 @@
+"""In-process registry for background jobs (parsing, captioning, ...)."""
+
+from __future__ import annotations
+
+import asyncio
+from functools import lru_cache
+from typing import Any, Coroutine
+
+
+class JobRegistry:
+    """Track fire-and-forget asyncio tasks keyed by an identifier.
+
+    At most one task runs per key, so a repeated ``reparse`` while a job is
+    still running does not start duplicate work.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Task[Any]] = {}
+
+    def start(self, key: str, coro: Coroutine[Any, Any, Any]) -> bool:
+        """Schedule ``coro`` under ``key``; return False if a job is already running."""
+        if self.is_running(key):
+            coro.close()
+            return False
+        task = asyncio.create_task(coro)
+        self._tasks[key] = task
+
+        def _forget(done: asyncio.Task[Any]) -> None:
+            if self._tasks.get(key) is done:
+                del self._tasks[key]
+
+        task.add_done_callback(_forget)
+        return True
+
+    def is_running(self, key: str) -> bool:
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    def get(self, key: str) -> asyncio.Task[Any] | None:
+        return self._tasks.get(key)
+
+    def cancel(self, key: str) -> bool:
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+
+@lru_cache
+def get_job_registry() -> JobRegistry:
+    """Shared registry used by routes that launch background work."""
+    return JobRegistry()
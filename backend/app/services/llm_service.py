@@ -2,9 +2,14 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import time
+from contextlib import aclosing
+from dataclasses import asdict, replace
 from functools import lru_cache
-from typing import AsyncIterator, Sequence
+from typing import Any, AsyncIterator, Sequence
+
+import httpx
 
 from app.clients.base import (
     LLMClient,
@@ -14,14 +19,28 @@ from app.clients.base import (
 )
 from app.clients.openai_client import OpenAIClient
 from app.core.config import settings
+from app.core.tracing import span, start_span
+from app.services.response_cache import CacheSource, ResponseCache, cache_key
+from app.services.routing import ModelRoute, ModelRouter, RequestFeatures, RouteDecision, routes_from_settings
+from app.services.shared_state import get_shared_state
+
+# failures that make the router try the next route
+_FALLBACK_ERRORS = (ValueError, httpx.HTTPError)
 
 
 class LLMService:
     """High-level abstraction that other layers use to interact with LLMs."""
 
-    def __init__(self, client: LLMClient) -> None:
+    def __init__(
+        self,
+        client: LLMClient,
+        cache: ResponseCache[LLMGenerationResult] | None = None,
+        router: ModelRouter | None = None,
+    ) -> None:
         self._client = client
         self._provider = settings.text_provider
+        self._cache = cache
+        self._router = router or ModelRouter([ModelRoute(name="default", client=client)])
 
     @property
     def provider(self) -> str:
@@ -34,10 +53,72 @@ class LLMService:
         *,
         model: str | None = None,
         temperature: float | None = None,
+        endpoint: str = "default",
+        attachments: bool = False,
+    ) -> LLMGenerationResult:
+        """Execute a non-streaming completion and aggregate the result (never cached)."""
+        result, _ = await self.complete(
+            messages, model=model, temperature=temperature, endpoint=endpoint, attachments=attachments
+        )
+        return result
+
+    async def complete(
+        self,
+        messages: Sequence[dict[str, Any]],
+        *,
+        model: str | None = None,
+        temperature: float | None = None,
+        endpoint: str = "default",
+        attachments: bool = False,
+        cache: bool = False,
+    ) -> tuple[LLMGenerationResult, CacheSource]:
+        """Like ``generate_completion`` but also report where the result came from.
+
+        With ``cache=True`` identical requests are answered from the response
+        cache (``"hit"``) or share a call that is already running
+        (``"coalesced"``); otherwise every call samples a fresh answer.
+        """
+        features = RequestFeatures.from_messages(messages, endpoint=endpoint, attachments=attachments)
+        attributes = {"llm.model": model or settings.text_model, "llm.messages": len(messages)}
+        with span("llm.generate", **attributes) as active:
+
+            async def call() -> LLMGenerationResult:
+                return await self._generate_routed(messages, model, temperature, features)
+
+            if self._cache is None or not cache:
+                result, source = await call(), "miss"
+            else:
+                key = cache_key(list(messages), model, temperature, endpoint, features.attachments)
+                result, source = await self._cache.get_or_compute(key, call)
+                active.set(**{"llm.cache": source})
+            if result.route:
+                active.set(**{"llm.route": result.route["route"]})
+            return result, source
+
+    async def _generate_routed(
+        self,
+        messages: Sequence[dict[str, Any]],
+        model: str | None,
+        temperature: float | None,
+        features: RequestFeatures,
     ) -> LLMGenerationResult:
-        """Execute a non-streaming completion and aggregate the result."""
-        options = LLMGenerationOptions(model=model, temperature=temperature)
-        return await self._client.generate(messages=messages, options=options)
+        routes, decision = self._plan(features, model, streaming=False)
+        for index, route in enumerate(routes):
+            options = LLMGenerationOptions(model=model or route.model, temperature=temperature)
+            started = time.perf_counter()
+            try:
+                result = await route.client.generate(messages=messages, options=options)
+            except _FALLBACK_ERRORS:
+                self._router.record_failure(route, "error")
+                decision.fallbacks.append({"route": route.name, "reason": "error"})
+                if index == len(routes) - 1:
+                    raise
+                continue
+            self._router.record_success(route, time.perf_counter() - started, streaming=False)
+            decision.route, decision.model = route.name, result.model or options.model
+            result.route = decision.to_dict()
+            return result
+        raise AssertionError("unreachable: the last route re-raises")
 
     async def stream_completion(
         self,
@@ -45,11 +126,90 @@ class LLMService:
         *,
         model: str | None = None,
         temperature: float | None = None,
+        endpoint: str = "default",
+        attachments: bool = False,
     ) -> AsyncIterator[LLMStreamChunk]:
-        """Yield streaming chunks for the provided chat messages."""
-        options = LLMGenerationOptions(model=model, temperature=temperature)
-        async for chunk in self._client.stream(messages=messages, options=options):
-            yield chunk
+        """Yield streaming chunks for the provided chat messages.
+
+        A route that fails before its first chunk, or misses its TTFT target,
+        is abandoned for the next candidate; once tokens flow there is no
+        fallback. The ``end`` chunk carries the routing decision.
+        """
+        features = RequestFeatures.from_messages(messages, endpoint=endpoint, attachments=attachments)
+        routes, decision = self._plan(features, model, streaming=True)
+        # generator: span is not made current, see app.core.tracing
+        stream_span = start_span("llm.stream", **{"llm.model": model or settings.text_model, "llm.messages": len(messages)})
+        try:
+            for index, route in enumerate(routes):
+                last = index == len(routes) - 1
+                options = LLMGenerationOptions(model=model or route.model, temperature=temperature)
+                started = time.perf_counter()
+                chunks = route.client.stream(messages=messages, options=options)
+                # aclosing: stopping early must close the upstream stream now, not on GC
+                async with aclosing(chunks):
+                    try:
+                        # the last candidate has nobody to fall back to: no deadline
+                        deadline = None if last else route.ttft_target
+                        if deadline is None:
+                            first = await anext(chunks)
+                        else:
+                            first = await asyncio.wait_for(anext(chunks), deadline)
+                    except StopAsyncIteration:
+                        first = None
+                    except (asyncio.TimeoutError, *_FALLBACK_ERRORS) as exc:
+                        reason = "ttft_timeout" if isinstance(exc, asyncio.TimeoutError) else "error"
+                        self._router.record_failure(route, reason)
+                        decision.fallbacks.append({"route": route.name, "reason": reason})
+                        if last:
+                            raise
+                        continue
+
+                    self._router.record_success(route, time.perf_counter() - started, streaming=True)
+                    decision.route, decision.model = route.name, options.model
+                    stream_span.set(**{"llm.route": route.name})
+                    try:
+                        if first is not None:
+                            yield _with_route(first, decision)
+                        async for chunk in chunks:
+                            yield _with_route(chunk, decision)
+                    except _FALLBACK_ERRORS:
+                        self._router.record_failure(route, "error")
+                        raise
+                    return
+        except Exception as exc:
+            stream_span.fail(exc)
+            raise
+        finally:
+            stream_span.end()
+
+    def _plan(
+        self, features: RequestFeatures, model: str | None, *, streaming: bool
+    ) -> tuple[list[ModelRoute], RouteDecision]:
+        if model:
+            # an explicit model bypasses routing and goes to the default endpoint
+            routes, reason = [self._router.default], "explicit_model"
+        else:
+            routes, reason = self._router.plan(features, streaming=streaming)
+        decision = RouteDecision(
+            route=routes[0].name,
+            model=model or routes[0].model,
+            reason=reason,
+            candidates=[r.name for r in routes],
+        )
+        return routes, decision
+
+    async def aclose(self) -> None:
+        """Close the connection pools of every routed client."""
+        clients = {id(r.client): r.client for r in self._router.routes}
+        clients.setdefault(id(self._client), self._client)
+        for client in clients.values():
+            await client.aclose()
+
+    async def warm(self, connections: int = 1) -> None:
+        """Pre-open pooled connections of every routed client."""
+        clients = {id(r.client): r.client for r in self._router.routes}
+        clients.setdefault(id(self._client), self._client)
+        await asyncio.gather(*(client.warm(connections) for client in clients.values()))
 
     async def generate_response(self, prompt: str, context: str | None = None) -> str:
         """Compatibility helper mirroring the legacy prompt endpoint."""
@@ -61,21 +221,47 @@ class LLMService:
         return result.content
 
 
-def _build_client() -> LLMClient:
+def _with_route(chunk: LLMStreamChunk, decision: RouteDecision) -> LLMStreamChunk:
+    if chunk.type == "end":
+        chunk.route = decision.to_dict()
+    return chunk
+
+
+def _build_client(
+    base_url: str | None = None,
+    api_key: str | None = None,
+    provider: str | None = None,
+    model: str | None = None,
+) -> LLMClient:
     """Build an OpenAI-compatible client using VLM_* settings.
 
     Many providers（含 OpenAI 兼容）通过 Chat Completions 暴露多模态/文本能力，
-    这里统一读取 VLM_BASEURL/VLM_APIKEY/VLM_MODEL。
+    这里统一读取 VLM_BASEURL/VLM_APIKEY/VLM_MODEL；路由（LLM_ROUTES）可按需覆盖。
     """
     return OpenAIClient(
-        api_key=settings.text_api_key,
-        model=settings.text_model,
-        base_url=settings.text_base_url,
+        api_key=api_key or settings.text_api_key,
+        model=model or settings.text_model,
+        base_url=base_url or settings.text_base_url,
         timeout=settings.request_timeout_seconds,
+        provider=(provider or settings.text_provider).lower(),
+        max_connections=settings.llm_max_connections,
+        max_concurrency=settings.llm_max_concurrency,
     )
 
 
 @lru_cache
 def get_llm_service() -> LLMService:
     """FastAPI dependency that caches the service instance."""
-    return LLMService(client=_build_client())
+    cache: ResponseCache[LLMGenerationResult] = ResponseCache(
+        max_entries=settings.llm_cache_size,
+        ttl_seconds=settings.llm_cache_ttl_seconds,
+        shared=get_shared_state(),
+        namespace="llm_response",
+        # the raw provider payload is not worth sharing
+        encode=lambda result: asdict(replace(result, raw=None)),
+        decode=lambda data: LLMGenerationResult(**data),
+    )
+    if settings.llm_routes:
+        routes = routes_from_settings(settings.llm_routes, _build_client)
+        return LLMService(client=routes[0].client, cache=cache, router=ModelRouter(routes))
+    return LLMService(client=_build_client(), cache=cache)
@@ -0,0 +1,262 @@
+"""Local persistence helpers for uploaded materials.
+
+Every material lives in its own directory under ``STORAGE_TMP_DIR``. Besides the
+original upload, background jobs keep their state next to it:
+
+ - ``.meta.json``: upload metadata (course, title, mime, storage tier)
+ - ``.status.json``: latest parse status (``queued/processing/ready/...``)
+ - ``.cancelled``: cancellation flag written by ``POST /materials/{id}/cancel``
+ - ``chunks.jsonl``: parser output (text blocks / captions), one JSON per line
+ - ``minhash.npz``: MinHash signatures of the chunks kept by near-duplicate
+   detection (``app.services.dedup``)
+ - ``index/``: versioned embedding index of the chunks (``app.services.indexing``)
+ - ``pages/``: rendered page images (``page-0001.png``) plus optional text layer
+   (``page-0001.txt``) produced by the page renderer
+
+The directory mtime doubles as "last used" for the lifecycle manager
+(``touch``). Cold originals are gzip-compressed in place (``<name>.gz``) and
+restored on first use by ``rehydrate``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable
+
+from app.core.config import settings
+
+META_FILE = ".meta.json"
+STATUS_FILE = ".status.json"
+CANCEL_FLAG = ".cancelled"
+CHUNKS_FILE = "chunks.jsonl"
+PAGES_DIR = "pages"
+INDEX_DIR = "index"
+ARTIFACTS_FILE = "artifacts.json"
+COLD_SUFFIX = ".gz"
+# hidden directories holding materials of an archive upload until they are published
+STAGING_PREFIX = ".ingest_"
+# upload types accepted by ``POST /materials`` and archive ingestion
+ALLOWED_SUFFIXES = {"txt", "pdf", "ppt", "pptx", "doc", "docx", "jpg", "jpeg", "png", "mp3", "m4a", "wav", "mp4"}
+
+_INTERNAL_NAMES = {META_FILE, STATUS_FILE, CANCEL_FLAG, CHUNKS_FILE, PAGES_DIR, INDEX_DIR, ARTIFACTS_FILE}
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MaterialStore:
+    """File-system backed store for material status and parsed chunks."""
+
+    @property
+    def root(self) -> Path:
+        """Storage root, created on first access."""
+        root = Path(settings.storage_tmp_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        return root
+
+    def path(self, material_id: str) -> Path:
+        return self.root / material_id
+
+    def exists(self, material_id: str) -> bool:
+        return self.path(material_id).is_dir()
+
+    def original_file(self, material_id: str) -> Path | None:
+        """Return the uploaded file, ignoring files written by background jobs.
+
+        ``None`` while the original sits compressed in the cold tier; see
+        ``rehydrate``.
+        """
+        return self._find_original(material_id, cold=False)
+
+    def cold_file(self, material_id: str) -> Path | None:
+        """Return the compressed original, if the material is in the cold tier."""
+        return self._find_original(material_id, cold=True)
+
+    def _find_original(self, material_id: str, *, cold: bool) -> Path | None:
+        base = self.path(material_id)
+        if not base.is_dir():
+            return None
+        for item in sorted(base.iterdir()):
+            name = item.name
+            if name in _INTERNAL_NAMES or name.startswith(".") or name.endswith(".tmp"):
+                continue
+            if name.endswith(COLD_SUFFIX) == cold and item.is_file():
+                return item
+        return None
+
+    def touch(self, material_id: str) -> None:
+        """Mark the material as used now (best-effort)."""
+        try:
+            os.utime(self.path(material_id))
+        except OSError:
+            pass
+
+    # ---- Metadata / tiers ----
+    def read_meta(self, material_id: str) -> dict[str, Any]:
+        try:
+            return json.loads((self.path(material_id) / META_FILE).read_text("utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def write_meta(self, material_id: str, **fields: Any) -> dict[str, Any]:
+        """Merge ``fields`` into the metadata file (atomic replace)."""
+        record = {**self.read_meta(material_id), **fields}
+        self._replace_json(self.path(material_id) / META_FILE, record)
+        return record
+
+    def compress_original(self, material_id: str) -> tuple[int, int] | None:
+        """Move the original to the cold tier; return ``(before, after)`` sizes.
+
+        Blocking; run it in a worker thread. Originals that shrink by less than
+        10% are left alone and flagged so later sweeps skip them.
+        """
+        original = self.original_file(material_id)
+        if original is None:
+            return None
+        base = self.path(material_id)
+        used = base.stat()
+        target = original.with_name(original.name + COLD_SUFFIX)
+        tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with original.open("rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        before, after = original.stat().st_size, tmp.stat().st_size
+        if after > before * 0.9:
+            tmp.unlink()
+            self.write_meta(material_id, compressible=False)
+        else:
+            tmp.replace(target)
+            original.unlink()
+            self.write_meta(material_id, tier="cold")
+        # tiering is not use: keep the idle clock running
+        os.utime(base, ns=(used.st_atime_ns, used.st_mtime_ns))
+        return before, after
+
+    def rehydrate(self, material_id: str) -> Path | None:
+        """Return the original, decompressing it from the cold tier if needed.
+
+        Blocking; concurrent callers may race, the loser returns the winner's file.
+        """
+        original = self.original_file(material_id)
+        cold = self.cold_file(material_id) if original is None else None
+        if cold is None:
+            return original
+        target = cold.with_name(cold.name.removesuffix(COLD_SUFFIX))
+        tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with gzip.open(cold, "rb") as src, tmp.open("wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        except FileNotFoundError:
+            tmp.unlink(missing_ok=True)
+            return self.original_file(material_id)
+        tmp.replace(target)
+        cold.unlink(missing_ok=True)
+        self.write_meta(material_id, tier="hot")
+        return target
+
+    def commit_staged(self, staging: Path, records: dict[str, dict[str, Any]]) -> list[str]:
+        """Publish the materials prepared under ``staging`` with their metadata (blocking).
+
+        All metadata files are written before the first directory is renamed into
+        the store, so no material of the batch is ever visible without its record.
+        If a rename fails, the directories already published are moved back into
+        ``staging`` before the error is raised.
+        """
+        for material_id, record in records.items():
+            self._replace_json(staging / material_id / META_FILE, record)
+        published: list[str] = []
+        try:
+            for material_id in records:
+                (staging / material_id).rename(self.path(material_id))
+                published.append(material_id)
+        except BaseException:
+            for material_id in reversed(published):
+                self.path(material_id).rename(staging / material_id)
+            raise
+        staging.rmdir()
+        return list(records)
+
+    def _replace_json(self, target: Path, record: dict[str, Any]) -> None:
+        tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text(json.dumps(record, ensure_ascii=False), "utf-8")
+        tmp.replace(target)
+
+    # ---- Status ----
+    def read_status(self, material_id: str) -> dict[str, Any] | None:
+        try:
+            return json.loads((self.path(material_id) / STATUS_FILE).read_text("utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def write_status(self, material_id: str, status: str, **fields: Any) -> dict[str, Any]:
+        record = {"status": status, "updatedAt": _now_iso(), **fields}
+        target = self.path(material_id) / STATUS_FILE
+        tmp = target.with_suffix(".tmp")
+        tmp.write_text(json.dumps(record, ensure_ascii=False), "utf-8")
+        tmp.replace(target)
+        return record
+
+    # ---- Cancellation ----
+    def is_cancelled(self, material_id: str) -> bool:
+        return (self.path(material_id) / CANCEL_FLAG).exists()
+
+    def clear_cancelled(self, material_id: str) -> None:
+        (self.path(material_id) / CANCEL_FLAG).unlink(missing_ok=True)
+
+    # ---- Chunks ----
+    def append_chunks(self, material_id: str, chunks: Iterable[dict[str, Any]]) -> int:
+        """Append chunks to the material's chunk log and return how many were written.
+
+        Each call is a single write, so concurrent jobs on the event loop never
+        interleave partial lines; this doubles as the per-page checkpoint.
+        """
+        lines = [json.dumps(chunk, ensure_ascii=False) + "\n" for chunk in chunks]
+        if not lines:
+            return 0
+        with (self.path(material_id) / CHUNKS_FILE).open("a", encoding="utf-8") as fh:
+            fh.write("".join(lines))
+        return len(lines)
+
+    def rewrite_chunks(self, material_id: str, chunks: Iterable[dict[str, Any]]) -> None:
+        """Replace the chunk log, e.g. after annotating chunks (atomic replace)."""
+        target = self.path(material_id) / CHUNKS_FILE
+        tmp = target.with_name(f".{CHUNKS_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text("".join(json.dumps(chunk, ensure_ascii=False) + "\n" for chunk in chunks), "utf-8")
+        tmp.replace(target)
+
+    def list_chunks(self, material_id: str, type: str | None = None) -> list[dict[str, Any]]:
+        """Return stored chunks ordered by page / start time."""
+        path = self.path(material_id) / CHUNKS_FILE
+        if not path.exists():
+            return []
+        items: list[dict[str, Any]] = []
+        with path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash mid-write can leave a truncated last line
+                    continue
+                if type is None or chunk.get("type") == type:
+                    items.append(chunk)
+        items.sort(key=lambda c: (c.get("page") or 0, c.get("startMs") or 0))
+        return items
+
+
+def upload_limit_bytes(suffix: str) -> int:
+    """Size cap for an upload of type ``suffix`` (``VIDEO_MAX_MB`` for MP4, else ``UPLOAD_MAX_MB``)."""
+    limit_mb = settings.video_max_mb if suffix == "mp4" else settings.upload_max_mb
+    return limit_mb * 1024 * 1024
+
+
+@lru_cache
+def get_material_store() -> MaterialStore:
+    """Provide a shared store instance for routes and background jobs."""
+    return MaterialStore()
@@ -0,0 +1,115 @@
+"""Background parse pipeline launched by ``POST /materials/{id}/parse``."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.audio import AUDIO_SUFFIXES
+from app.services.captioning import IMAGE_SUFFIXES, get_captioning_service
+from app.services.dedup import get_dedup_service
+from app.services.indexing import get_material_indexer
+from app.services.jobs import get_job_registry
+from app.services.material_store import get_material_store
+from app.services.semantic_cache import get_semantic_cache
+from app.services.study_artifacts import get_study_artifact_service
+from app.services.transcription import get_transcription_service
+
+logger = logging.getLogger(__name__)
+
+VISION_SUFFIXES = IMAGE_SUFFIXES | {"pdf", "ppt", "pptx"}
+# Modes with a wired parser; others are accepted but not processed yet
+SUPPORTED_MODES = {"vision", "asr"}
+
+
+def resolve_mode(original: Path | None, mode: str) -> str:
+    """Map ``auto`` to a concrete parse mode based on the uploaded file type."""
+    if mode != "auto":
+        return mode
+    suffix = original.suffix.lower().lstrip(".") if original else ""
+    if suffix in VISION_SUFFIXES:
+        return "vision"
+    if suffix in AUDIO_SUFFIXES:
+        return "asr"
+    return "text"
+
+
+async def run_parse(material_id: str, mode: str) -> None:
+    """Run the parse stages for ``mode`` and record the outcome in the status file."""
+    store = get_material_store()
+    store.write_status(material_id, "processing", mode=mode)
+    with span("materials.parse", new_trace=True, **{"material.id": material_id, "parse.mode": mode}) as parse_span:
+        try:
+            if mode == "asr":
+                asr_report = await get_transcription_service().transcribe_material(material_id)
+                result = {"transcription": asdict(asr_report)}
+            else:
+                report = await get_captioning_service().caption_material(material_id)
+                result = {"captioning": asdict(report)}
+            dedup = await _dedupe(material_id)
+            if dedup is not None:
+                result["dedup"] = dedup
+            index = await run_index(material_id)
+            if index is not None:
+                result["index"] = index
+            store.write_status(material_id, "ready", mode=mode, **result)
+            if settings.artifacts_enabled:
+                # own job: "ready" does not wait for the LLM calls
+                get_job_registry().start(f"artifacts:{material_id}", run_artifacts(material_id))
+        except asyncio.CancelledError:
+            store.write_status(material_id, "cancelled", mode=mode)
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Parsing material %s failed", material_id)
+            parse_span.fail(exc)
+            store.write_status(material_id, "failed", mode=mode, error=str(exc))
+
+
+async def _dedupe(material_id: str) -> dict[str, Any] | None:
+    """Mark near-duplicate chunks; a failure here never fails the parse."""
+    service = get_dedup_service()
+    if service is None:
+        return None
+    with span("materials.dedup", **{"material.id": material_id}) as dedup_span:
+        try:
+            report = await asyncio.to_thread(service.dedupe_material, material_id)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Dedup of material %s failed", material_id)
+            dedup_span.fail(exc)
+            return {"error": str(exc)}
+        dedup_span.set(**{"dedup.chunks": report.chunks, "dedup.ratio": report.ratio})
+    return report.to_dict()
+
+
+async def run_index(material_id: str) -> dict[str, Any] | None:
+    """Incrementally re-index the material's chunks; failures are reported, not raised."""
+    indexer = get_material_indexer()
+    if indexer is None:
+        return None
+    try:
+        report = await indexer.reindex(material_id)
+    except Exception as exc:  # noqa: BLE001
+        # the previous index version stays live
+        logger.exception("Indexing material %s failed", material_id)
+        return {"error": str(exc)}
+    if not report.unchanged:
+        # answers cached while the job ran were built on the old version
+        get_semantic_cache().invalidate_material(material_id)
+    return report.to_dict()
+
+
+async def run_artifacts(material_id: str, *, force: bool = False) -> dict[str, Any]:
+    """(Re)generate study artifacts when the content changed; failures are recorded, not raised."""
+    service = get_study_artifact_service()
+    try:
+        return (await service.generate(material_id, force=force)).to_dict()
+    except Exception as exc:  # noqa: BLE001
+        # artifacts of the previous content stay on disk, reported stale
+        logger.exception("Generating study artifacts for material %s failed", material_id)
+        service.record_failure(material_id, str(exc))
+        return {"error": str(exc)}
@@ -0,0 +1,355 @@
+"""Request- and token-rate limiting for the LLM-backed routers.
+
+Every ``POST /api/llm/*`` and ``/api/qa/*`` request is checked against token
+buckets keyed by client IP, and additionally by user (``X-User-Id``), session
+(``X-Session-Id``) and course (``X-Course-Id``) when those headers are sent.
+The headers are client-supplied, so they only ever add keys: rotating
+``X-User-Id`` does not get around the IP buckets. Each key has two buckets:
+
+ - requests: one token per request, refilled at ``*_RPM`` per minute; a batch
+   (``POST /api/qa/batch``) is charged one per item and may go into debt
+ - tokens: provider-reported ``usage`` is charged after the call completes; the
+   bucket may go into debt and new requests wait until it is back to zero
+
+Buckets hold ``RATE_LIMIT_BURST_SECONDS`` worth of rate. State lives in an
+LRU-bounded dict (O(1) per key); with a shared state backend
+(``SHARED_STATE_BACKEND=sqlite``) all workers count against the same fixed
+60 s windows instead: no burst, the counters reset at the top of each minute. Rejections are ``429`` with ``Retry-After`` or, for
+SSE clients, a single ``error`` event.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Mapping, Sequence
+
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_DECISIONS, RATE_LIMIT_TOKENS, usage_listener
+from app.services.shared_state import SharedState, get_shared_state
+from app.services.stream_buffer import format_event
+
+logger = logging.getLogger(__name__)
+
+_NAMESPACE = "rate_limit"
+_IDENTITY_HEADERS = {"user": b"x-user-id", "session": b"x-session-id", "course": b"x-course-id"}
+# scope["state"] key holding the identity the middleware admitted
+_STATE_KEY = "rate_limit_identity"
+_SSE_PATHS = {"/api/qa/instant", "/api/llm/messages/stream"}
+
+
+@dataclass(slots=True, frozen=True)
+class LimitRule:
+    """Per-minute limits for one key scope; 0 leaves a bucket unlimited."""
+
+    scope: str
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+
+
+@dataclass(slots=True)
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+    scope: str | None = None
+    reason: str | None = None  # "requests" | "tokens"
+
+
+class _Bucket:
+    __slots__ = ("level", "updated")
+
+    def __init__(self, capacity: float, now: float) -> None:
+        self.level = capacity
+        self.updated = now
+
+    def refill(self, rate: float, capacity: float, now: float) -> None:
+        self.level = min(capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+
+class _KeyState:
+    __slots__ = ("requests", "tokens", "admitted", "rejected", "tokens_used", "last_seen")
+
+    def __init__(self) -> None:
+        self.requests: _Bucket | None = None
+        self.tokens: _Bucket | None = None
+        self.admitted = 0
+        self.rejected = 0
+        self.tokens_used = 0.0
+        self.last_seen = time.time()
+
+
+class RateLimiter:
+    """Token buckets per ``scope:key``; see the module docstring."""
+
+    def __init__(
+        self,
+        rules: Sequence[LimitRule],
+        *,
+        burst_seconds: float = 10.0,
+        max_keys: int = 100_000,
+        shared: SharedState | None = None,
+    ) -> None:
+        self.rules = [r for r in rules if r.requests_per_minute > 0 or r.tokens_per_minute > 0]
+        self.burst_seconds = burst_seconds
+        self.max_keys = max_keys
+        self._shared = shared if shared is not None and shared.shared else None
+        self._states: OrderedDict[str, _KeyState] = OrderedDict()
+        self._pending: set[asyncio.Task[Any]] = set()
+
+    def targets(self, identity: Mapping[str, str | None]) -> list[tuple[LimitRule, str]]:
+        return [(rule, f"{rule.scope}:{identity[rule.scope]}") for rule in self.rules if identity.get(rule.scope)]
+
+    async def acquire(self, identity: Mapping[str, str | None]) -> Decision:
+        """Admit one request for every key of ``identity`` or say how long to wait."""
+        targets = self.targets(identity)
+        if self._shared is not None:
+            decision = await self._acquire_shared(targets)
+        else:
+            decision = self._acquire_local(targets)
+        for rule, key in targets:
+            state = self._state(key)
+            state.last_seen = time.time()
+            if decision.allowed:
+                state.admitted += 1
+                RATE_LIMIT_DECISIONS.inc(rule.scope, "allowed")
+            elif rule.scope == decision.scope:
+                state.rejected += 1
+                RATE_LIMIT_DECISIONS.inc(rule.scope, f"rejected_{decision.reason}")
+        return decision
+
+    async def charge_requests(self, identity: Mapping[str, str | None], count: float) -> None:
+        """Charge ``count`` more requests to every key of ``identity``; the buckets may go into debt."""
+        if count <= 0:
+            return
+        now = time.monotonic()
+        window = _window()
+        for rule, key in self.targets(identity):
+            if rule.requests_per_minute <= 0:
+                continue
+            state = self._state(key)
+            state.admitted += int(count)
+            if self._shared is not None:
+                await self._shared.incr(_NAMESPACE, f"{key}:r:{window}", count, ttl=120)
+            elif state.requests is not None:
+                state.requests.refill(*self._rate(rule.requests_per_minute), now)
+                state.requests.level -= count
+
+    def charge(self, identity: Mapping[str, str | None], tokens: float) -> None:
+        """Charge provider-reported tokens to every key of ``identity``."""
+        if tokens <= 0:
+            return
+        now = time.monotonic()
+        for rule, key in self.targets(identity):
+            state = self._state(key)
+            state.tokens_used += tokens
+            RATE_LIMIT_TOKENS.inc(rule.scope, amount=tokens)
+            if self._shared is not None:
+                if rule.tokens_per_minute > 0:
+                    self._spawn(self._shared.incr(_NAMESPACE, f"{key}:t:{_window()}", tokens, ttl=120))
+            elif state.tokens is not None:
+                state.tokens.refill(*self._rate(rule.tokens_per_minute), now)
+                state.tokens.level -= tokens
+
+    def stats(self, scope: str | None = None, top: int = 50) -> list[dict[str, Any]]:
+        """Per-key consumption seen by this process, heaviest token users first."""
+        rows = []
+        for key, state in self._states.items():
+            key_scope, _, value = key.partition(":")
+            if scope and key_scope != scope:
+                continue
+            rows.append(
+                {
+                    "scope": key_scope,
+                    "key": value,
+                    "requests": state.admitted,
+                    "rejected": state.rejected,
+                    "tokens": state.tokens_used,
+                    "lastSeen": datetime.fromtimestamp(state.last_seen, timezone.utc).isoformat(),
+                }
+            )
+        rows.sort(key=lambda row: (row["tokens"], row["requests"]), reverse=True)
+        return rows[:top]
+
+    def _acquire_local(self, targets: list[tuple[LimitRule, str]]) -> Decision:
+        now = time.monotonic()
+        states = [(rule, self._state(key)) for rule, key in targets]
+        # check every key before consuming so a rejection costs nothing
+        for rule, state in states:
+            if rule.requests_per_minute > 0:
+                rate, capacity = self._rate(rule.requests_per_minute)
+                state.requests = state.requests or _Bucket(capacity, now)
+                state.requests.refill(rate, capacity, now)
+                if state.requests.level < 1:
+                    return Decision(False, (1 - state.requests.level) / rate, rule.scope, "requests")
+            if rule.tokens_per_minute > 0:
+                rate, capacity = self._rate(rule.tokens_per_minute)
+                state.tokens = state.tokens or _Bucket(capacity, now)
+                state.tokens.refill(rate, capacity, now)
+                if state.tokens.level < 0:
+                    return Decision(False, -state.tokens.level / rate, rule.scope, "tokens")
+        for _, state in states:
+            if state.requests is not None:
+                state.requests.level -= 1
+        return Decision(True)
+
+    async def _acquire_shared(self, targets: list[tuple[LimitRule, str]]) -> Decision:
+        """Fixed 60 s windows shared by all workers (not a token bucket, no burst).
+
+        Token windows are only read, so they are all checked first. Request
+        counters are incremented atomically one key at a time; when one of them
+        is over its limit the increments already made are taken back, so a
+        rejected request is not charged to any key.
+        """
+        assert self._shared is not None
+        window = _window()
+        retry_after = 60 - time.time() % 60
+        for rule, key in targets:
+            if rule.tokens_per_minute > 0:
+                used = await self._shared.get(_NAMESPACE, f"{key}:t:{window}") or 0
+                if used >= rule.tokens_per_minute:
+                    return Decision(False, retry_after, rule.scope, "tokens")
+        charged: list[str] = []
+        for rule, key in targets:
+            if rule.requests_per_minute <= 0:
+                continue
+            counter = f"{key}:r:{window}"
+            count = await self._shared.incr(_NAMESPACE, counter, ttl=120)
+            charged.append(counter)
+            if count > rule.requests_per_minute:
+                for name in charged:
+                    await self._shared.incr(_NAMESPACE, name, -1, ttl=120)
+                return Decision(False, retry_after, rule.scope, "requests")
+        return Decision(True)
+
+    def _rate(self, per_minute: float) -> tuple[float, float]:
+        rate = per_minute / 60
+        return rate, max(1.0, rate * self.burst_seconds)
+
+    def _state(self, key: str) -> _KeyState:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState()
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._settled)
+
+    def _settled(self, task: asyncio.Task[Any]) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Shared rate limit update failed", exc_info=task.exception())
+
+
+def _window() -> int:
+    return int(time.time() // 60)
+
+
+def usage_tokens(usage: Mapping[str, Any]) -> float:
+    total = usage.get("total_tokens")
+    if isinstance(total, (int, float)):
+        return float(total)
+    return float(sum(v for k in ("prompt_tokens", "completion_tokens") if isinstance(v := usage.get(k), (int, float))))
+
+
+def identify(scope: Scope) -> dict[str, str | None]:
+    """Rate limit identity of a request: the client IP plus any identity headers."""
+    headers = dict(scope.get("headers") or [])
+    client = scope.get("client")
+    identity: dict[str, str | None] = {"ip": client[0] if client else None}
+    for name, header in _IDENTITY_HEADERS.items():
+        identity[name] = headers.get(header, b"").decode("latin-1").strip() or None
+    return identity
+
+
+async def charge_requests(scope: Scope, count: float) -> None:
+    """Charge ``count`` more requests to the caller the middleware admitted (no-op when unlimited)."""
+    limiter = get_rate_limiter()
+    identity = scope.get("state", {}).get(_STATE_KEY)
+    if limiter is not None and identity is not None:
+        await limiter.charge_requests(identity, count)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying ``get_rate_limiter()`` to POSTs under ``prefixes``."""
+
+    def __init__(self, app: ASGIApp, prefixes: Sequence[str] = ("/api/llm", "/api/qa")) -> None:
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limiter = get_rate_limiter()
+        if (
+            limiter is None
+            or scope["type"] != "http"
+            or scope.get("method") != "POST"
+            or not scope.get("path", "").startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        identity = identify(scope)
+        decision = await limiter.acquire(identity)
+        if not decision.allowed:
+            await _rejection(scope, decision)(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})[_STATE_KEY] = identity
+        token = usage_listener.set(lambda usage: limiter.charge(identity, usage_tokens(usage)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            usage_listener.reset(token)
+
+
+def _rejection(scope: Scope, decision: Decision) -> Response:
+    retry_after = max(1, math.ceil(decision.retry_after))
+    headers = {"Retry-After": str(retry_after)}
+    error = {
+        "code": "rate_limited",
+        "scope": decision.scope,
+        "reason": decision.reason,
+        "retryAfter": retry_after,
+    }
+    accept = dict(scope.get("headers") or []).get(b"accept", b"").decode("latin-1")
+    if "text/event-stream" in accept or scope.get("path") in _SSE_PATHS:
+        # SSE clients read errors from the stream, not from the status line
+        what = "请求过于频繁" if decision.reason == "requests" else "模型用量已达上限"
+        event = {"type": "error", **error, "message": f"{what}，请 {retry_after} 秒后重试"}
+        return Response(format_event(None, event), media_type="text/event-stream", headers=headers)
+    error["message"] = f"Rate limit exceeded ({decision.scope} {decision.reason}); retry in {retry_after}s"
+    return JSONResponse({"data": None, "error": error}, status_code=429, headers=headers)
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter | None:
+    """Limiter configured from RATE_LIMIT_*; ``None`` when disabled."""
+    if not settings.rate_limit_enabled:
+        return None
+    limiter = RateLimiter(
+        [
+            LimitRule("ip", settings.rate_limit_ip_rpm, settings.rate_limit_ip_tpm),
+            LimitRule("user", settings.rate_limit_user_rpm, settings.rate_limit_user_tpm),
+            LimitRule("session", settings.rate_limit_session_rpm, settings.rate_limit_session_tpm),
+            LimitRule("course", settings.rate_limit_course_rpm, settings.rate_limit_course_tpm),
+        ],
+        burst_seconds=settings.rate_limit_burst_seconds,
+        max_keys=settings.rate_limit_max_keys,
+        shared=get_shared_state(),
+    )
+    return limiter if limiter.rules else None
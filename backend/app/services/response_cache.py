@@ -0,0 +1,152 @@
+"""LRU/TTL cache with in-flight coalescing for non-streaming completions.
+
+Identical requests (same messages, model and temperature) that arrive while
+one is still running await the same call instead of calling the provider
+again; successful results are then kept for ``LLM_CACHE_TTL_SECONDS``.
+
+Only callers that ask for it use the cache (``LLMService.complete(cache=True)``,
+i.e. ``/qa/batch``): everywhere else a repeated request is meant to get a new
+sample, not the answer another request got minutes ago.
+
+With a shared state backend (``SHARED_STATE_BACKEND=sqlite``) results are also
+written there, so a miss on one worker is answered by another worker's result
+(``"shared"``) instead of calling the provider again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, Literal, TypeVar
+
+from app.core.metrics import LLM_CACHE_REQUESTS
+from app.services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+CacheSource = Literal["hit", "coalesced", "shared", "miss"]
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable digest of JSON-serialisable request parts."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass(slots=True)
+class _InFlight(Generic[T]):
+    task: asyncio.Task[tuple[T, CacheSource]]
+    waiters: int = 0
+
+
+class ResponseCache(Generic[T]):
+    """Bounded LRU of recent results plus a map of calls still in flight."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 600.0,
+        *,
+        shared: SharedState | None = None,
+        namespace: str = "response_cache",
+        encode: Callable[[T], Any] | None = None,
+        decode: Callable[[Any], T] | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # a per-process backend would only duplicate the local LRU
+        self._shared = shared if shared is not None and shared.shared and max_entries > 0 else None
+        self._namespace = namespace
+        self._encode: Callable[[T], Any] = encode or (lambda value: value)
+        self._decode: Callable[[Any], T] = decode or (lambda value: value)
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        self._inflight: dict[str, _InFlight[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[T]]) -> tuple[T, CacheSource]:
+        """Return the cached value for ``key`` or compute it exactly once.
+
+        The computation runs in its own task that every caller awaits through
+        ``shield``: a caller going away (including the one that started it)
+        never cancels it for the others. It is cancelled only once every
+        caller has gone.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                LLM_CACHE_REQUESTS.inc("hit")
+                return value, "hit"
+            del self._entries[key]
+
+        call = self._inflight.get(key)
+        joined = call is not None
+        if call is None:
+            call = _InFlight(asyncio.get_running_loop().create_task(self._compute(key, compute)))
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+        else:
+            LLM_CACHE_REQUESTS.inc("coalesced")
+        call.waiters += 1
+        try:
+            value, source = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+        return value, "coalesced" if joined else source
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[T]]) -> tuple[T, CacheSource]:
+        value = await self._load_shared(key)
+        if value is not None:
+            LLM_CACHE_REQUESTS.inc("shared")
+            source: CacheSource = "shared"
+        else:
+            LLM_CACHE_REQUESTS.inc("miss")
+            value = await compute()
+            await self._save_shared(key, value)
+            source = "miss"
+        self._store(key, value)
+        return value, source
+
+    def _forget(self, key: str, call: _InFlight[T]) -> None:
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+
+    async def _load_shared(self, key: str) -> T | None:
+        if self._shared is None:
+            return None
+        try:
+            stored = await self._shared.get(self._namespace, key)
+        except Exception:  # noqa: BLE001 - the shared tier is an optimisation only
+            logger.warning("Shared cache read failed", exc_info=True)
+            return None
+        return None if stored is None else self._decode(stored)
+
+    async def _save_shared(self, key: str, value: T) -> None:
+        if self._shared is None:
+            return
+        try:
+            await self._shared.set(self._namespace, key, self._encode(value), ttl=self.ttl_seconds)
+        except Exception:  # noqa: BLE001
+            logger.warning("Shared cache write failed", exc_info=True)
+
+    def _store(self, key: str, value: T) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,203 @@
+"""Per-request model routing for ``LLMService``.
+
+Each configured route is a model on some endpoint with eligibility limits
+(prompt length, history size, attachments, calling endpoint), a relative cost
+and an optional hard TTFT target. For every request the router filters the
+eligible routes with cheap local features and orders them by health, live
+latency and cost; the service tries them in that order, falling back when a
+call fails or a stream misses its TTFT target.
+
+Routes come from ``LLM_ROUTES`` (JSON list); without it there is a single
+``default`` route built from ``VLM_*``, i.e. the previous behaviour.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Sequence
+
+from app.clients.base import LLMClient
+from app.core.metrics import LLM_ROUTE_DECISIONS
+
+
+@dataclass(slots=True)
+class RequestFeatures:
+    """Cheap request properties used for routing."""
+
+    endpoint: str = "default"
+    prompt_chars: int = 0
+    history: int = 0
+    attachments: bool = False
+
+    @classmethod
+    def from_messages(
+        cls, messages: Sequence[dict[str, Any]], *, endpoint: str = "default", attachments: bool = False
+    ) -> "RequestFeatures":
+        last = messages[-1].get("content") if messages else ""
+        has_parts = any(isinstance(m.get("content"), list) for m in messages)
+        if isinstance(last, list):
+            prompt_chars = sum(len(str(p.get("text", ""))) for p in last if isinstance(p, dict))
+        else:
+            prompt_chars = len(str(last or ""))
+        history = sum(1 for m in messages[:-1] if m.get("role") in {"user", "assistant"})
+        return cls(endpoint=endpoint, prompt_chars=prompt_chars, history=history, attachments=attachments or has_parts)
+
+
+@dataclass(slots=True)
+class RouteStats:
+    """Exponentially weighted latency/error figures of one route."""
+
+    alpha: float = 0.2
+    ttft: float | None = None
+    latency: float | None = None
+    error_rate: float = 0.0
+    last_failure_at: float = 0.0
+
+    def observe(self, seconds: float, *, ttft: bool) -> None:
+        attr = "ttft" if ttft else "latency"
+        current = getattr(self, attr)
+        setattr(self, attr, seconds if current is None else current + self.alpha * (seconds - current))
+        self.error_rate -= self.alpha * self.error_rate
+
+    def failure(self) -> None:
+        self.error_rate += self.alpha * (1.0 - self.error_rate)
+        self.last_failure_at = time.monotonic()
+
+
+@dataclass(slots=True)
+class ModelRoute:
+    """A routable model; ``model=None`` uses the client's configured model."""
+
+    name: str
+    client: LLMClient
+    model: str | None = None
+    cost: float = 1.0
+    max_prompt_chars: int | None = None
+    max_history: int | None = None
+    vision: bool = True
+    endpoints: frozenset[str] | None = None
+    ttft_target_ms: float | None = None
+    stats: RouteStats = field(default_factory=RouteStats)
+
+    def accepts(self, features: RequestFeatures) -> bool:
+        if self.max_prompt_chars is not None and features.prompt_chars > self.max_prompt_chars:
+            return False
+        if self.max_history is not None and features.history > self.max_history:
+            return False
+        if features.attachments and not self.vision:
+            return False
+        return self.endpoints is None or features.endpoint in self.endpoints
+
+    @property
+    def ttft_target(self) -> float | None:
+        return self.ttft_target_ms / 1000 if self.ttft_target_ms else None
+
+
+@dataclass(slots=True)
+class RouteDecision:
+    """What the router chose and why; reported in ``end`` event metadata."""
+
+    route: str
+    model: str | None
+    reason: str
+    candidates: list[str] = field(default_factory=list)
+    fallbacks: list[dict[str, str]] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "route": self.route,
+            "model": self.model,
+            "reason": self.reason,
+            "candidates": self.candidates,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class ModelRouter:
+    """Orders routes per request and keeps their live stats."""
+
+    def __init__(
+        self,
+        routes: Sequence[ModelRoute],
+        *,
+        error_threshold: float = 0.5,
+        cooldown_seconds: float = 30.0,
+    ) -> None:
+        if not routes:
+            msg = "ModelRouter needs at least one route"
+            raise ValueError(msg)
+        self.routes = list(routes)
+        self.error_threshold = error_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+    @property
+    def default(self) -> ModelRoute:
+        return self.routes[0]
+
+    def plan(self, features: RequestFeatures, *, streaming: bool) -> tuple[list[ModelRoute], str]:
+        """Return the routes to try in order and the reason for the first pick."""
+        eligible = [r for r in self.routes if r.accepts(features)]
+        if not eligible:
+            return [self.default], "no_eligible_route"
+
+        now = time.monotonic()
+
+        def key(route: ModelRoute) -> tuple[bool, bool, float, float]:
+            stats = route.stats
+            # unhealthy routes get a probe again once the cooldown has passed
+            unhealthy = stats.error_rate > self.error_threshold and now - stats.last_failure_at < self.cooldown_seconds
+            observed = stats.ttft if streaming else stats.latency
+            target = route.ttft_target if streaming else None
+            slow = bool(target and observed and observed > target)
+            return unhealthy, slow, route.cost, observed or 0.0
+
+        ordered = sorted(eligible, key=key)
+        first = key(ordered[0])
+        if first[0]:
+            reason = "all_unhealthy"
+        elif first[1]:
+            reason = "all_slow"
+        elif len(eligible) < len(self.routes):
+            reason = "features"
+        else:
+            reason = "cost"
+        return ordered, reason
+
+    @staticmethod
+    def record_success(route: ModelRoute, seconds: float, *, streaming: bool) -> None:
+        route.stats.observe(seconds, ttft=streaming)
+        LLM_ROUTE_DECISIONS.inc(route.name, "selected")
+
+    @staticmethod
+    def record_failure(route: ModelRoute, reason: str) -> None:
+        route.stats.failure()
+        LLM_ROUTE_DECISIONS.inc(route.name, reason)
+
+
+def routes_from_settings(
+    specs: Sequence[dict[str, Any]],
+    build_client: Callable[[str | None, str | None, str | None, str | None], LLMClient],
+) -> list[ModelRoute]:
+    """Build routes from ``LLM_ROUTES`` entries.
+
+    ``build_client(base_url, api_key, provider, model)`` returns the client for a
+    route; missing connection fields fall back to the VLM_* settings there.
+    """
+    routes: list[ModelRoute] = []
+    for index, spec in enumerate(specs):
+        endpoints = spec.get("endpoints")
+        routes.append(
+            ModelRoute(
+                name=str(spec.get("name") or f"route{index}"),
+                client=build_client(spec.get("baseUrl"), spec.get("apiKey"), spec.get("provider"), spec.get("model")),
+                model=spec.get("model"),
+                cost=float(spec.get("cost", 1.0)),
+                max_prompt_chars=spec.get("maxPromptChars"),
+                max_history=spec.get("maxHistory"),
+                vision=bool(spec.get("vision", True)),
+                endpoints=frozenset(endpoints) if endpoints else None,
+                ttft_target_ms=spec.get("ttftTargetMs"),
+            )
+        )
+    return routes
@@ -0,0 +1,324 @@
+"""Semantic answer cache for Q&A endpoints.
+
+Repeated questions are rarely byte-identical ("什么是导数" / "导数是什么意思"),
+so answers are cached by meaning: the normalised question is embedded and
+compared (cosine) against recent questions of the same scope — the course plus
+the exact set of materials the question was asked against. A stored answer is
+served when the best similarity reaches ``SEMANTIC_CACHE_THRESHOLD``.
+
+Each scope keeps its vectors in one NumPy matrix so a lookup is a single
+matrix-vector product. Entries are evicted LRU (``SEMANTIC_CACHE_SIZE``) and by
+age (``SEMANTIC_CACHE_TTL_SECONDS``); re-parsing, re-indexing or deleting a
+material drops every scope that includes it.
+
+A sample of semantic hits (``SEMANTIC_CACHE_AUDIT_RATE``) is re-answered in the
+background; when the fresh answer is not similar to the cached one the hit is
+counted as false and the entry evicted, which tells whether the threshold is
+too loose.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterable
+
+import httpx
+
+from app.clients.embedding_client import EmbeddingClient, OpenAIEmbeddingClient
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.metrics import SEMANTIC_CACHE_AUDITS, SEMANTIC_CACHE_REQUESTS, SEMANTIC_CACHE_SIMILARITY
+from app.core.tracing import span
+
+np = lazy_import("numpy")
+
+_SPACES = re.compile(r"\s+")
+# 句末标点/语气词不影响语义
+_TRAILING = re.compile(r"[\s?？!！。.,，~～、;；:：呢吗呀啊]+$")
+
+
+def normalize_question(text: str) -> str:
+    """Canonical form used for exact matches and embedding."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _SPACES.sub(" ", text).strip()
+    return _TRAILING.sub("", text)
+
+
+def scope_key(course_id: str | None, material_ids: Iterable[str] = ()) -> str:
+    return f"{course_id or '-'}|{','.join(sorted(set(material_ids)))}"
+
+
+@dataclass(slots=True)
+class SemanticEntry:
+    question: str
+    answer: str
+    scope: str
+    row: int
+    expires_at: float
+    model: str | None = None
+
+
+@dataclass(slots=True)
+class SemanticLookup:
+    """Outcome of a lookup; keep it to ``store`` the answer after a miss."""
+
+    question: str
+    scope: str
+    materials: frozenset[str]
+    vector: np.ndarray | None = None
+    entry: SemanticEntry | None = None
+    similarity: float = 0.0
+    exact: bool = False
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+    def to_dict(self) -> dict[str, object]:
+        return {"hit": self.hit, "exact": self.exact, "similarity": round(self.similarity, 4)}
+
+
+@dataclass(slots=True)
+class _ScopeIndex:
+    """Row-addressed vector matrix of one scope; freed rows are zeroed and reused."""
+
+    materials: frozenset[str]
+    matrix: np.ndarray | None = None
+    entries: dict[int, SemanticEntry] = field(default_factory=dict)
+    free: list[int] = field(default_factory=list)
+    size: int = 0
+
+    def add(self, vector: np.ndarray) -> int:
+        if self.matrix is None:
+            self.matrix = np.zeros((8, vector.shape[0]), dtype=np.float32)
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.matrix.shape[0]:
+                grown = np.zeros((self.size * 2, self.matrix.shape[1]), dtype=np.float32)
+                grown[: self.size] = self.matrix
+                self.matrix = grown
+            row = self.size
+            self.size += 1
+        self.matrix[row] = vector
+        return row
+
+    def remove(self, row: int) -> None:
+        self.entries.pop(row, None)
+        if self.matrix is not None:
+            self.matrix[row] = 0.0
+            self.free.append(row)
+
+    def best(self, vector: np.ndarray) -> tuple[int, float]:
+        if self.matrix is None or not self.entries or self.matrix.shape[1] != vector.shape[0]:
+            return -1, 0.0
+        # vectors are unit length, so the dot product is the cosine; free rows score 0
+        scores = self.matrix[: self.size] @ vector
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+
+class SemanticCache:
+    """Embedding-similarity answer cache; disabled without an embedding client."""
+
+    def __init__(
+        self,
+        embedder: EmbeddingClient | None,
+        *,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        threshold: float = 0.92,
+        audit_rate: float = 0.0,
+        audit_threshold: float = 0.85,
+    ) -> None:
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.audit_threshold = audit_threshold
+        self._lru: OrderedDict[tuple[str, str], SemanticEntry] = OrderedDict()
+        self._scopes: dict[str, _ScopeIndex] = {}
+        self._audits: set[asyncio.Task[None]] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.embedder is not None and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    async def lookup(
+        self, question: str, *, course_id: str | None = None, material_ids: Iterable[str] = ()
+    ) -> SemanticLookup:
+        """Find a cached answer; embedding failures count as misses."""
+        materials = frozenset(material_ids)
+        result = SemanticLookup(normalize_question(question), scope_key(course_id, materials), materials)
+        if not self.enabled or not result.question:
+            return result
+
+        exact = self._lru.get((result.scope, result.question))
+        if exact is not None and self._alive(exact):
+            result.entry, result.similarity, result.exact = exact, 1.0, True
+            self._lru.move_to_end((exact.scope, exact.question))
+            SEMANTIC_CACHE_REQUESTS.inc("hit")
+            return result
+
+        try:
+            result.vector = await self._embed(result.question)
+        except (ValueError, httpx.HTTPError):
+            SEMANTIC_CACHE_REQUESTS.inc("error")
+            return result
+
+        index = self._scopes.get(result.scope)
+        if index is not None:
+            row, similarity = index.best(result.vector)
+            entry = index.entries.get(row)
+            result.similarity = similarity
+            SEMANTIC_CACHE_SIMILARITY.observe(similarity)
+            if entry is not None and similarity >= self.threshold and self._alive(entry):
+                result.entry = entry
+                self._lru.move_to_end((entry.scope, entry.question))
+                SEMANTIC_CACHE_REQUESTS.inc("hit")
+                return result
+        SEMANTIC_CACHE_REQUESTS.inc("miss")
+        return result
+
+    def store(self, lookup: SemanticLookup, answer: str, *, model: str | None = None) -> None:
+        """Cache ``answer`` for a missed lookup (no-op when it was not embedded)."""
+        if lookup.vector is None or not answer.strip():
+            return
+        key = (lookup.scope, lookup.question)
+        if key in self._lru:
+            self._drop(self._lru[key])
+        index = self._scopes.get(lookup.scope)
+        if index is not None and index.matrix is not None and index.matrix.shape[1] != lookup.vector.shape[0]:
+            # the embedding model changed dimension: old vectors are not comparable
+            self._invalidate(lambda scope, _: scope == lookup.scope)
+            index = None
+        if index is None:
+            index = self._scopes[lookup.scope] = _ScopeIndex(lookup.materials)
+        row = index.add(lookup.vector)
+        entry = SemanticEntry(
+            question=lookup.question,
+            answer=answer,
+            scope=lookup.scope,
+            row=row,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            model=model,
+        )
+        index.entries[row] = entry
+        self._lru[key] = entry
+        while len(self._lru) > self.max_entries:
+            self._drop(next(iter(self._lru.values())))
+
+    def invalidate_material(self, material_id: str) -> int:
+        """Drop every scope that includes ``material_id``; returns entries removed."""
+        return self._invalidate(lambda scope, index: material_id in index.materials)
+
+    def invalidate_course(self, course_id: str) -> int:
+        return self._invalidate(lambda scope, index: scope.startswith(f"{course_id}|"))
+
+    def clear(self) -> None:
+        self._lru.clear()
+        self._scopes.clear()
+
+    def maybe_audit(self, lookup: SemanticLookup, regenerate: Callable[[], Awaitable[str]]) -> bool:
+        """Sample a semantic hit for a background false-hit check."""
+        if lookup.entry is None or lookup.exact or random.random() >= self.audit_rate:
+            return False
+        task = asyncio.get_running_loop().create_task(self._audit(lookup.entry, regenerate))
+        self._audits.add(task)
+        task.add_done_callback(self._audits.discard)
+        return True
+
+    async def _audit(self, entry: SemanticEntry, regenerate: Callable[[], Awaitable[str]]) -> None:
+        with span("semantic_cache.audit", new_trace=True, **{"cache.scope": entry.scope}) as audit_span:
+            try:
+                fresh = await regenerate()
+                cached_vec, fresh_vec = await self._embed_many([entry.answer, fresh])
+            except (ValueError, httpx.HTTPError):
+                SEMANTIC_CACHE_AUDITS.inc("error")
+                return
+            agreement = float(cached_vec @ fresh_vec)
+            audit_span.set(**{"cache.agreement": round(agreement, 4)})
+            if agreement >= self.audit_threshold:
+                SEMANTIC_CACHE_AUDITS.inc("confirmed")
+                return
+            SEMANTIC_CACHE_AUDITS.inc("false_hit")
+            if self._lru.get((entry.scope, entry.question)) is entry:
+                self._drop(entry)
+
+    async def aclose(self) -> None:
+        for task in list(self._audits):
+            task.cancel()
+        if self.embedder is not None:
+            await self.embedder.aclose()
+
+    def _alive(self, entry: SemanticEntry) -> bool:
+        if entry.expires_at > time.monotonic():
+            return True
+        self._drop(entry)
+        return False
+
+    def _drop(self, entry: SemanticEntry) -> None:
+        self._lru.pop((entry.scope, entry.question), None)
+        index = self._scopes.get(entry.scope)
+        if index is not None and index.entries.get(entry.row) is entry:
+            index.remove(entry.row)
+            if not index.entries:
+                del self._scopes[entry.scope]
+
+    def _invalidate(self, matches: Callable[[str, _ScopeIndex], bool]) -> int:
+        removed = 0
+        for scope in [s for s, index in self._scopes.items() if matches(s, index)]:
+            for entry in list(self._scopes[scope].entries.values()):
+                self._lru.pop((entry.scope, entry.question), None)
+                removed += 1
+            del self._scopes[scope]
+        return removed
+
+    async def _embed(self, text: str) -> np.ndarray:
+        (vector,) = await self._embed_many([text])
+        return vector
+
+    async def _embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        assert self.embedder is not None
+        vectors = np.asarray(await self.embedder.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return list(vectors / np.maximum(norms, 1e-12))
+
+
+def build_embedding_client() -> EmbeddingClient | None:
+    """Embedding client from EMB_* settings, or ``None`` when not configured."""
+    if not (settings.emb_base_url and settings.emb_model):
+        return None
+    return OpenAIEmbeddingClient(
+        api_key=settings.emb_api_key,
+        model=settings.emb_model,
+        base_url=settings.emb_base_url,
+        timeout=settings.request_timeout_seconds,
+        provider=(settings.emb_provider or "openai").lower(),
+        batch_size=settings.emb_batch or 64,
+        dimensions=settings.emb_dim,
+    )
+
+
+@lru_cache
+def get_semantic_cache() -> SemanticCache:
+    """Process-wide semantic cache (disabled unless EMB_BASEURL/EMB_MODEL are set)."""
+    return SemanticCache(
+        build_embedding_client(),
+        max_entries=settings.semantic_cache_size,
+        ttl_seconds=settings.semantic_cache_ttl_seconds,
+        threshold=settings.semantic_cache_threshold,
+        audit_rate=settings.semantic_cache_audit_rate,
+        audit_threshold=settings.semantic_cache_audit_threshold,
+    )
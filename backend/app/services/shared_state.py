@@ -0,0 +1,352 @@
+"""Key/value state shared by all uvicorn workers of one host.
+
+``lru_cache`` singletons and in-memory maps are per process, so with several
+workers a cache miss is repeated on every worker and a reconnect that lands on
+another worker finds nothing. ``SharedState`` is the small store that such
+state can move to:
+
+ - ``memory``: a plain in-process store (the default; behaves like before)
+ - ``sqlite``: one SQLite database in WAL mode at ``SHARED_STATE_PATH``; every
+   worker opens it, readers never block the writer and no extra service is
+   needed
+
+Values are JSON documents under ``(namespace, key)`` with an optional TTL. Lists
+(``push``/``items``) are append-only logs with per-key sequence numbers, used
+for SSE replay. Every operation is timed in
+``aiedu_shared_state_op_duration_seconds{backend,op}``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Sequence, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import SHARED_STATE_LATENCY
+
+R = TypeVar("R")
+
+
+class SharedState(ABC):
+    """Async facade; backends implement the synchronous ``_op`` methods."""
+
+    backend: str = "abstract"
+
+    @property
+    def shared(self) -> bool:
+        """Whether other worker processes see the same data."""
+        return False
+
+    async def get(self, namespace: str, key: str) -> Any | None:
+        return await self._timed("get", self._get, namespace, key)
+
+    async def set(self, namespace: str, key: str, value: Any, *, ttl: float | None = None) -> None:
+        await self._timed("set", self._set, namespace, key, value, ttl)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._timed("delete", self._delete, namespace, key)
+
+    async def incr(self, namespace: str, key: str, amount: float = 1.0, *, ttl: float | None = None) -> float:
+        """Add ``amount`` to a numeric value (missing or expired counts as 0)."""
+        return await self._timed("incr", self._incr, namespace, key, amount, ttl)
+
+    async def push(
+        self, namespace: str, key: str, value: Any, *, max_items: int | None = None, ttl: float | None = None
+    ) -> int:
+        """Append to the list at ``key`` and return the new item's sequence number (1-based)."""
+        return await self._timed("push", self._push, namespace, key, [value], max_items, ttl)
+
+    async def push_many(
+        self,
+        namespace: str,
+        key: str,
+        values: Sequence[Any],
+        *,
+        max_items: int | None = None,
+        ttl: float | None = None,
+    ) -> int:
+        """Append ``values`` in one write and return the last item's sequence number."""
+        return await self._timed("push", self._push, namespace, key, list(values), max_items, ttl)
+
+    async def items(self, namespace: str, key: str, after: int = 0) -> list[tuple[int, Any]]:
+        """List items with ``seq > after`` in order."""
+        return await self._timed("items", self._items, namespace, key, after)
+
+    async def aclose(self) -> None:
+        """Release backend resources."""
+
+    async def _timed(self, op: str, func: Callable[..., R], *args: Any) -> R:
+        started = time.perf_counter()
+        try:
+            return await self._run(func, *args)
+        finally:
+            SHARED_STATE_LATENCY.observe(time.perf_counter() - started, self.backend, op)
+
+    async def _run(self, func: Callable[..., R], *args: Any) -> R:
+        return func(*args)
+
+    @abstractmethod
+    def _get(self, namespace: str, key: str) -> Any | None: ...
+
+    @abstractmethod
+    def _set(self, namespace: str, key: str, value: Any, ttl: float | None) -> None: ...
+
+    @abstractmethod
+    def _delete(self, namespace: str, key: str) -> None: ...
+
+    @abstractmethod
+    def _incr(self, namespace: str, key: str, amount: float, ttl: float | None) -> float: ...
+
+    @abstractmethod
+    def _push(
+        self, namespace: str, key: str, values: list[Any], max_items: int | None, ttl: float | None
+    ) -> int: ...
+
+    @abstractmethod
+    def _items(self, namespace: str, key: str, after: int) -> list[tuple[int, Any]]: ...
+
+
+def _expiry(ttl: float | None) -> float | None:
+    # wall clock: expiry times are compared across processes
+    return time.time() + ttl if ttl else None
+
+
+class MemoryState(SharedState):
+    """Per-process store; runs inline on the event loop."""
+
+    backend = "memory"
+
+    def __init__(self) -> None:
+        self._values: dict[tuple[str, str], tuple[Any, float | None]] = {}
+        self._lists: dict[tuple[str, str], tuple[list[tuple[int, Any]], float | None]] = defaultdict(lambda: ([], None))
+
+    def _get(self, namespace: str, key: str) -> Any | None:
+        entry = self._values.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[(namespace, key)]
+            return None
+        return value
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float | None) -> None:
+        # stored as JSON so callers get the same copy semantics as the SQLite backend
+        self._values[(namespace, key)] = (json.loads(json.dumps(value)), _expiry(ttl))
+
+    def _delete(self, namespace: str, key: str) -> None:
+        self._values.pop((namespace, key), None)
+        self._lists.pop((namespace, key), None)
+
+    def _incr(self, namespace: str, key: str, amount: float, ttl: float | None) -> float:
+        current = self._get(namespace, key)
+        entry = self._values.get((namespace, key))
+        expires_at = entry[1] if entry is not None else _expiry(ttl)
+        value = float(current or 0) + amount
+        self._values[(namespace, key)] = (value, expires_at)
+        return value
+
+    def _push(self, namespace: str, key: str, values: list[Any], max_items: int | None, ttl: float | None) -> int:
+        items, expires_at = self._lists[(namespace, key)]
+        if expires_at is not None and expires_at <= time.time():
+            items = []
+        seq = items[-1][0] if items else 0
+        for value in values:
+            seq += 1
+            items.append((seq, json.loads(json.dumps(value))))
+        if max_items is not None and len(items) > max_items:
+            del items[: len(items) - max_items]
+        self._lists[(namespace, key)] = (items, _expiry(ttl) or expires_at)
+        return seq
+
+    def _items(self, namespace: str, key: str, after: int) -> list[tuple[int, Any]]:
+        entry = self._lists.get((namespace, key))
+        if entry is None:
+            return []
+        items, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._lists[(namespace, key)]
+            return []
+        return [item for item in items if item[0] > after]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS list_items (
+    ns TEXT NOT NULL, key TEXT NOT NULL, seq INTEGER NOT NULL, value TEXT NOT NULL, expires_at REAL,
+    PRIMARY KEY (ns, key, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_expiry ON kv (expires_at) WHERE expires_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS list_expiry ON list_items (expires_at) WHERE expires_at IS NOT NULL;
+"""
+
+_LIVE = "(expires_at IS NULL OR expires_at > ?)"
+
+
+class SQLiteState(SharedState):
+    """SQLite (WAL) store shared by every process that opens ``path``.
+
+    Calls run in worker threads with one connection per thread; expired rows
+    are swept at most every ``purge_interval`` seconds.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str | Path, *, busy_timeout_ms: int = 5000, purge_interval: float = 30.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @property
+    def shared(self) -> bool:
+        return True
+
+    async def _run(self, func: Callable[..., R], *args: Any) -> R:
+        return await asyncio.to_thread(func, *args)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit; writes that read first use explicit IMMEDIATE transactions
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _get(self, namespace: str, key: str) -> Any | None:
+        row = (
+            self._connect()
+            .execute(f"SELECT value FROM kv WHERE ns = ? AND key = ? AND {_LIVE}", (namespace, key, time.time()))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def _set(self, namespace: str, key: str, value: Any, ttl: float | None) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), _expiry(ttl)),
+        )
+        self._maybe_purge()
+
+    def _delete(self, namespace: str, key: str) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (namespace, key))
+        conn.execute("DELETE FROM list_items WHERE ns = ? AND key = ?", (namespace, key))
+
+    def _incr(self, namespace: str, key: str, amount: float, ttl: float | None) -> float:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM kv WHERE ns = ? AND key = ? AND {_LIVE}", (namespace, key, now)
+            ).fetchone()
+            value = (float(json.loads(row[0])) if row else 0.0) + amount
+            expires_at = row[1] if row else _expiry(ttl)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def _push(self, namespace: str, key: str, values: list[Any], max_items: int | None, ttl: float | None) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT MAX(seq) FROM list_items WHERE ns = ? AND key = ?", (namespace, key)).fetchone()
+            first = (row[0] or 0) + 1
+            seq = first + len(values) - 1
+            expires_at = _expiry(ttl)
+            conn.executemany(
+                "INSERT INTO list_items (ns, key, seq, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (namespace, key, first + offset, json.dumps(value, ensure_ascii=False), expires_at)
+                    for offset, value in enumerate(values)
+                ],
+            )
+            if expires_at is not None:
+                # the list lives as long as its newest item
+                conn.execute(
+                    "UPDATE list_items SET expires_at = ? WHERE ns = ? AND key = ?", (expires_at, namespace, key)
+                )
+            if max_items is not None:
+                conn.execute(
+                    "DELETE FROM list_items WHERE ns = ? AND key = ? AND seq <= ?", (namespace, key, seq - max_items)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._maybe_purge()
+        return seq
+
+    def _items(self, namespace: str, key: str, after: int) -> list[tuple[int, Any]]:
+        rows = (
+            self._connect()
+            .execute(
+                f"SELECT seq, value FROM list_items WHERE ns = ? AND key = ? AND seq > ? AND {_LIVE} ORDER BY seq",
+                (namespace, key, after, time.time()),
+            )
+            .fetchall()
+        )
+        return [(seq, json.loads(value)) for seq, value in rows]
+
+    def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        conn = self._connect()
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("DELETE FROM list_items WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+
+def create_shared_state(backend: str, path: str | Path | None = None) -> SharedState:
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(path or Path(settings.storage_tmp_dir).parent / "aiedu_state.sqlite3")
+    msg = f"Unsupported SHARED_STATE_BACKEND: {backend} (expected memory or sqlite)"
+    raise ValueError(msg)
+
+
+@lru_cache
+def get_shared_state() -> SharedState:
+    """Process-wide handle on the configured shared-state backend."""
+    return create_shared_state(settings.shared_state_backend, settings.shared_state_path)
@@ -0,0 +1,58 @@
+"""Signed, expiring URLs for locally stored originals.
+
+They mimic S3 presigned URLs: the query string carries ``expires`` (Unix time)
+and ``signature`` (HMAC-SHA256 over material ID and expiry), so a URL can be
+handed to a ``<video>``/``<iframe>`` without extra auth headers and stops
+working after ``LOCAL_URL_EXPIRES`` seconds.
+
+The key comes from ``LOCAL_URL_SECRET``; without it a random key is created
+once under ``STORAGE_TMP_DIR`` so every worker on the host signs alike.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from app.core.config import settings
+
+_KEY_FILE = ".url_signing_key"
+
+
+@lru_cache
+def _signing_key() -> bytes:
+    if settings.local_url_secret:
+        return settings.local_url_secret.encode("utf-8")
+    path = Path(settings.storage_tmp_dir) / _KEY_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # O_EXCL: the first worker creates the key, the others read it
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes()
+    with os.fdopen(fd, "wb") as file:
+        key = secrets.token_hex(32).encode("ascii")
+        file.write(key)
+    return key
+
+
+def sign(material_id: str, expires: int) -> str:
+    message = f"{material_id}:{expires}".encode("utf-8")
+    return hmac.new(_signing_key(), message, hashlib.sha256).hexdigest()
+
+
+def issue(material_id: str, ttl_seconds: int | None = None) -> tuple[int, str]:
+    """Return ``(expires, signature)`` for a new URL."""
+    expires = int(time.time()) + (ttl_seconds or settings.local_url_expires)
+    return expires, sign(material_id, expires)
+
+
+def verify(material_id: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign(material_id, expires), signature)
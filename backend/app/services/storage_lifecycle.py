@@ -0,0 +1,466 @@
+"""Background lifecycle management for ``STORAGE_TMP_DIR``.
+
+A periodic sweep (``STORAGE_SWEEP_INTERVAL_SECONDS``) scans the material
+directories once and then:
+
+ - evicts abandoned uploads (no original, or parse ``failed``/``cancelled``)
+   idle for ``STORAGE_ABANDONED_HOURS`` and any material idle for
+   ``STORAGE_TTL_DAYS``; staging areas of interrupted archive uploads
+   (``.ingest_*``) follow the abandoned rule
+ - enforces ``STORAGE_COURSE_QUOTA_MB`` per course and ``STORAGE_QUOTA_MB``
+   overall by evicting the least recently used materials
+ - gzips originals idle for ``STORAGE_COLD_DAYS`` (text/PDF/legacy Office/WAV;
+   media and OOXML are already compressed); they are restored on first use
+
+Materials with a running or queued parse job are never touched. Deletes (from
+the sweep and ``DELETE /materials/{id}``) first rename the directory into
+``.trash/`` so it disappears at once, then a worker removes the trash in
+batches of ``STORAGE_DELETE_BATCH`` off the event loop.
+
+With several workers on one host only the process holding the sweep lock
+(``flock`` on ``.lifecycle.lock``) sweeps; the others skip that round.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable
+
+from app.core.config import settings
+from app.core.metrics import STORAGE_BYTES_FREED, STORAGE_COMPRESSED_BYTES, STORAGE_EVICTIONS
+from app.core.tracing import span
+from app.services.jobs import get_job_registry
+from app.services.material_store import COLD_SUFFIX, STAGING_PREFIX, MaterialStore, get_material_store
+from app.services.semantic_cache import get_semantic_cache
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR = ".trash"
+LOCK_FILE = ".lifecycle.lock"
+UNASSIGNED = "_unassigned"
+COMPRESSIBLE_SUFFIXES = {"txt", "pdf", "doc", "ppt", "wav"}
+_ABANDONED_STATUSES = {"failed", "cancelled"}
+_ACTIVE_STATUSES = {"queued", "processing"}
+_MB = 1024 * 1024
+
+
+class QuotaExceeded(Exception):
+    """An upload would push its course over ``STORAGE_COURSE_QUOTA_MB``."""
+
+    def __init__(self, course_id: str, used: int, quota: int) -> None:
+        super().__init__(f"Course {course_id} storage quota exceeded ({used}/{quota} bytes)")
+        self.course_id = course_id
+        self.used = used
+        self.quota = quota
+
+
+@dataclass(slots=True)
+class MaterialUsage:
+    """One material directory as seen by a scan."""
+
+    material_id: str
+    course_id: str
+    type: str
+    original_bytes: int
+    derived_bytes: int
+    last_used: float
+    status: str
+    tier: str
+    compressible: bool = True
+
+    @property
+    def total_bytes(self) -> int:
+        return self.original_bytes + self.derived_bytes
+
+
+@dataclass(slots=True)
+class SweepReport:
+    started_at: str
+    duration_seconds: float = 0.0
+    scanned: int = 0
+    evicted: dict[str, int] = field(default_factory=dict)
+    freed_bytes: int = 0
+    compressed: int = 0
+    compressed_saved_bytes: int = 0
+    skipped: bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "startedAt": self.started_at,
+            "durationSeconds": round(self.duration_seconds, 3),
+            "scanned": self.scanned,
+            "evicted": dict(self.evicted),
+            "freedBytes": self.freed_bytes,
+            "compressed": self.compressed,
+            "compressedSavedBytes": self.compressed_saved_bytes,
+            "skipped": self.skipped,
+        }
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    continue
+    return total
+
+
+def scan(store: MaterialStore) -> list[MaterialUsage]:
+    """Walk every material directory (blocking; run it in a thread)."""
+    items: list[MaterialUsage] = []
+    for base in store.root.iterdir():
+        if base.name.startswith(".") or not base.is_dir():
+            continue
+        try:
+            material_id = base.name
+            meta = store.read_meta(material_id)
+            status = (store.read_status(material_id) or {}).get("status", "uploaded")
+            original = store.original_file(material_id) or store.cold_file(material_id)
+            name = original.name.removesuffix(COLD_SUFFIX) if original else ""
+            original_bytes = original.stat().st_size if original else 0
+            items.append(
+                MaterialUsage(
+                    material_id=material_id,
+                    course_id=meta.get("courseId") or UNASSIGNED,
+                    type=name.rsplit(".", 1)[-1].lower() if "." in name else "unknown",
+                    original_bytes=original_bytes,
+                    derived_bytes=_dir_size(base) - original_bytes,
+                    last_used=base.stat().st_mtime,
+                    status=status if original else "missing",
+                    tier="cold" if original and original.name.endswith(COLD_SUFFIX) else "hot",
+                    compressible=meta.get("compressible", True),
+                )
+            )
+        except FileNotFoundError:
+            # deleted while scanning
+            continue
+    return items
+
+
+def summarize(items: Iterable[MaterialUsage], quota_bytes: int = 0, course_quota_bytes: int = 0) -> dict[str, Any]:
+    """Usage by course, type and tier for capacity planning."""
+    courses: dict[str, dict[str, int]] = defaultdict(lambda: {"bytes": 0, "materials": 0})
+    types: dict[str, dict[str, int]] = defaultdict(lambda: {"bytes": 0, "materials": 0})
+    tiers = {"hot": 0, "cold": 0}
+    total = count = 0
+    for item in items:
+        count += 1
+        total += item.total_bytes
+        courses[item.course_id]["bytes"] += item.total_bytes
+        courses[item.course_id]["materials"] += 1
+        types[item.type]["bytes"] += item.original_bytes
+        types[item.type]["materials"] += 1
+        types["derived"]["bytes"] += item.derived_bytes
+        tiers[item.tier] += item.original_bytes
+    return {
+        "totalBytes": total,
+        "quotaBytes": quota_bytes or None,
+        "materials": count,
+        "tiers": tiers,
+        "courses": sorted(
+            (
+                {"courseId": course, **usage, "quotaBytes": course_quota_bytes or None}
+                for course, usage in courses.items()
+            ),
+            key=lambda row: row["bytes"],
+            reverse=True,
+        ),
+        "types": sorted(
+            ({"type": kind, **usage} for kind, usage in types.items()), key=lambda row: row["bytes"], reverse=True
+        ),
+    }
+
+
+class StorageLifecycle:
+    """Quotas, TTL eviction, cold-tier compression and batched deletes."""
+
+    def __init__(
+        self,
+        store: MaterialStore,
+        *,
+        quota_bytes: int = 0,
+        course_quota_bytes: int = 0,
+        ttl_seconds: float = 0,
+        abandoned_seconds: float = 0,
+        cold_seconds: float = 0,
+        interval_seconds: float = 600,
+        delete_batch: int = 64,
+    ) -> None:
+        self.store = store
+        self.quota_bytes = quota_bytes
+        self.course_quota_bytes = course_quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.abandoned_seconds = abandoned_seconds
+        self.cold_seconds = cold_seconds
+        self.interval_seconds = interval_seconds
+        self.delete_batch = max(1, delete_batch)
+        self.last_sweep: SweepReport | None = None
+        self._course_usage: dict[str, int] | None = None
+        self._loop_task: asyncio.Task[None] | None = None
+        self._purge_task: asyncio.Task[None] | None = None
+        self._restoring: dict[str, asyncio.Task[Path | None]] = {}
+
+    # ---- Foreground hooks ----
+    async def admit_upload(self, course_id: str | None, size: int) -> None:
+        """Account for a finished upload; raise ``QuotaExceeded`` over the course quota."""
+        await self.check_upload(course_id, size)
+        assert self._course_usage is not None
+        course = course_id or UNASSIGNED
+        self._course_usage[course] = self._course_usage.get(course, 0) + size
+
+    def release_upload(self, course_id: str | None, size: int) -> None:
+        """Give back bytes admitted for an upload that was never stored."""
+        if self._course_usage is None:
+            return
+        course = course_id or UNASSIGNED
+        self._course_usage[course] = max(0, self._course_usage.get(course, 0) - size)
+
+    async def check_upload(self, course_id: str | None, size: int) -> None:
+        """Raise ``QuotaExceeded`` if ``size`` more bytes would not fit; accounts nothing."""
+        if self._course_usage is None:
+            await self._refresh_usage()
+        assert self._course_usage is not None
+        used = self._course_usage.get(course_id or UNASSIGNED, 0)
+        if self.course_quota_bytes and course_id and used + size > self.course_quota_bytes:
+            raise QuotaExceeded(course_id, used, self.course_quota_bytes)
+
+    async def restore(self, material_id: str) -> Path | None:
+        """Return the original, decompressing a cold one in a worker thread."""
+        self.store.touch(material_id)
+        original = self.store.original_file(material_id)
+        if original is not None:
+            return original
+        # one decompression per material, however many requests ask for it
+        task = self._restoring.get(material_id)
+        if task is None:
+            task = asyncio.create_task(asyncio.to_thread(self.store.rehydrate, material_id))
+            self._restoring[material_id] = task
+            task.add_done_callback(lambda _: self._restoring.pop(material_id, None))
+        return await asyncio.shield(task)
+
+    def delete(self, material_id: str, reason: str = "deleted") -> bool:
+        """Hide the material at once and remove its files in the background."""
+        base = self.store.path(material_id)
+        trash = self.store.root / TRASH_DIR
+        trash.mkdir(exist_ok=True)
+        try:
+            base.rename(trash / f"{material_id}-{uuid.uuid4().hex[:8]}")
+        except FileNotFoundError:
+            return False
+        STORAGE_EVICTIONS.inc(reason)
+        get_semantic_cache().invalidate_material(material_id)
+        self._schedule_purge()
+        return True
+
+    def discard(self, path: Path) -> None:
+        """Move a directory that is not a material (e.g. ingest staging) to the trash."""
+        trash = self.store.root / TRASH_DIR
+        trash.mkdir(exist_ok=True)
+        try:
+            path.rename(trash / f"{path.name.lstrip('.')}-{uuid.uuid4().hex[:8]}")
+        except FileNotFoundError:
+            return
+        self._schedule_purge()
+
+    # ---- Background work ----
+    def start(self) -> None:
+        """Start the periodic sweep (idempotent)."""
+        if self.interval_seconds > 0 and (self._loop_task is None or self._loop_task.done()):
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def aclose(self) -> None:
+        for task in (self._loop_task, self._purge_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def usage(self) -> dict[str, Any]:
+        """Fresh usage report (one scan) plus the outcome of the last sweep."""
+        items = await asyncio.to_thread(scan, self.store)
+        self._course_usage = self._by_course(items)
+        report = summarize(items, self.quota_bytes, self.course_quota_bytes)
+        report["pendingDeletes"] = len(await asyncio.to_thread(self._trash_batch))
+        report["lastSweep"] = self.last_sweep.to_dict() if self.last_sweep else None
+        return report
+
+    async def sweep(self, now: float | None = None) -> SweepReport:
+        """Run one lifecycle pass; see the module docstring."""
+        report = SweepReport(started_at=datetime.now(timezone.utc).isoformat())
+        began = time.perf_counter()
+        with span("storage.sweep", new_trace=True) as sweep_span:
+            lock = await asyncio.to_thread(self._try_lock)
+            if lock is None:
+                report.skipped = True
+                return report
+            try:
+                await self._sweep(report, time.time() if now is None else now)
+            finally:
+                os.close(lock)
+            report.duration_seconds = time.perf_counter() - began
+            sweep_span.set(
+                **{
+                    "storage.scanned": report.scanned,
+                    "storage.freed_bytes": report.freed_bytes,
+                    "storage.compressed": report.compressed,
+                }
+            )
+        self.last_sweep = report
+        return report
+
+    async def _sweep(self, report: SweepReport, now: float) -> None:
+        items = await asyncio.to_thread(scan, self.store)
+        report.scanned = len(items)
+        jobs = get_job_registry()
+        candidates = [
+            item for item in items if item.status not in _ACTIVE_STATUSES and not jobs.is_running(item.material_id)
+        ]
+        doomed: dict[str, str] = {}
+        for item in candidates:
+            idle = now - item.last_used
+            abandoned = item.status == "missing" or item.status in _ABANDONED_STATUSES
+            if abandoned and self.abandoned_seconds and idle > self.abandoned_seconds:
+                doomed[item.material_id] = "abandoned"
+            elif self.ttl_seconds and idle > self.ttl_seconds:
+                doomed[item.material_id] = "ttl"
+
+        # quotas: least recently used first, after TTL evictions are accounted for
+        survivors = sorted((i for i in candidates if i.material_id not in doomed), key=lambda i: i.last_used)
+        kept = [i for i in items if i.material_id not in doomed]
+        if self.course_quota_bytes:
+            course_bytes = self._by_course(kept)
+            for item in survivors:
+                if course_bytes[item.course_id] > self.course_quota_bytes:
+                    doomed[item.material_id] = "course_quota"
+                    course_bytes[item.course_id] -= item.total_bytes
+        if self.quota_bytes:
+            total = sum(i.total_bytes for i in kept if i.material_id not in doomed)
+            for item in survivors:
+                if total <= self.quota_bytes:
+                    break
+                if item.material_id not in doomed:
+                    doomed[item.material_id] = "quota"
+                    total -= item.total_bytes
+
+        # staging areas of archive uploads interrupted by a crash or restart
+        if self.abandoned_seconds:
+            for staging in self.store.root.glob(f"{STAGING_PREFIX}*"):
+                try:
+                    stale = now - staging.stat().st_mtime > self.abandoned_seconds
+                except FileNotFoundError:
+                    continue
+                if stale:
+                    self.discard(staging)
+
+        sizes = {item.material_id: item.total_bytes for item in items}
+        for material_id, reason in doomed.items():
+            if self.delete(material_id, reason):
+                report.evicted[reason] = report.evicted.get(reason, 0) + 1
+                report.freed_bytes += sizes[material_id]
+                STORAGE_BYTES_FREED.inc(reason, amount=sizes[material_id])
+
+        if self.cold_seconds:
+            for item in candidates:
+                if (
+                    item.material_id not in doomed
+                    and item.tier == "hot"
+                    and item.compressible
+                    and item.type in COMPRESSIBLE_SUFFIXES
+                    and now - item.last_used > self.cold_seconds
+                ):
+                    result = await asyncio.to_thread(self.store.compress_original, item.material_id)
+                    if result is not None and result[1] < result[0]:
+                        before, after = result
+                        report.compressed += 1
+                        report.compressed_saved_bytes += before - after
+                        STORAGE_COMPRESSED_BYTES.inc(amount=before - after)
+
+        self._course_usage = self._by_course(i for i in items if i.material_id not in doomed)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep the loop alive
+                logger.exception("Storage lifecycle sweep failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def _schedule_purge(self) -> None:
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.get_running_loop().create_task(self._purge())
+
+    async def _purge(self) -> None:
+        """Remove everything under ``.trash/``, one thread hop per batch."""
+        while True:
+            batch = await asyncio.to_thread(self._trash_batch, self.delete_batch)
+            if not batch:
+                return
+            await asyncio.to_thread(_remove_all, batch)
+
+    def _trash_batch(self, limit: int | None = None) -> list[Path]:
+        trash = self.store.root / TRASH_DIR
+        if not trash.is_dir():
+            return []
+        return sorted(trash.iterdir())[:limit]
+
+    async def _refresh_usage(self) -> None:
+        self._course_usage = self._by_course(await asyncio.to_thread(scan, self.store))
+
+    @staticmethod
+    def _by_course(items: Iterable[MaterialUsage]) -> dict[str, int]:
+        usage: dict[str, int] = defaultdict(int)
+        for item in items:
+            usage[item.course_id] += item.total_bytes
+        return usage
+
+    def _try_lock(self) -> int | None:
+        fd = os.open(self.store.root / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+
+def _remove_all(paths: Iterable[Path]) -> None:
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@lru_cache
+def get_storage_lifecycle() -> StorageLifecycle:
+    """Lifecycle manager configured from STORAGE_*."""
+    return StorageLifecycle(
+        get_material_store(),
+        quota_bytes=settings.storage_quota_mb * _MB,
+        course_quota_bytes=settings.storage_course_quota_mb * _MB,
+        ttl_seconds=settings.storage_ttl_days * 86400,
+        abandoned_seconds=settings.storage_abandoned_hours * 3600,
+        cold_seconds=settings.storage_cold_days * 86400,
+        interval_seconds=settings.storage_sweep_interval_seconds,
+        delete_batch=settings.storage_delete_batch,
+    )
@@ -0,0 +1,365 @@
+"""Resumable SSE streams backed by a bounded, per-message event ring.
+
+A generation runs as a background task that appends its events to a
+``StreamBuffer``; HTTP responses only subscribe to that buffer. Every event
+gets an ``id: <streamId>:<seq>`` line, so a client that reconnects with
+``Last-Event-ID`` is served the events it missed and then follows the live
+generation instead of starting a new one.
+
+The stream ID (``new_stream_id``) is an unguessable token that only appears in
+the ``id:`` lines sent to the client of that stream, never the ``messageId``
+shown in the UI: presenting it is what entitles a reconnect to the buffered
+answer.
+
+When the last subscriber leaves, the generation is kept alive for a grace
+period (``SSE_RESUME_GRACE_SECONDS``) and cancelled if nobody reattaches;
+finished buffers are evicted ``SSE_BUFFER_TTL_SECONDS`` after completion.
+
+With a shared state backend every event is mirrored there too, so a reconnect
+that lands on another worker replays the events from shared state and keeps
+polling it until the owning worker finishes. Mirroring is off the producer's
+path: events are queued and a per-stream flusher writes them in one
+transaction every ``mirror_interval`` seconds, or as soon as ``mirror_batch``
+are waiting, so tokens are never held up by the shared write lock. Such remote followers refresh a
+watch key, which keeps the owner from cancelling the generation after the
+grace period.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import secrets
+import time
+from collections import deque
+from contextlib import aclosing
+from functools import lru_cache
+from itertools import islice
+from typing import Any, AsyncIterator
+
+from app.core.config import settings
+from app.core.metrics import StreamMeter
+from app.services.shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+_EVENTS_NS = "sse_events"
+_META_NS = "sse_meta"
+_WATCH_NS = "sse_watch"
+
+
+def format_event(event_id: str | None, payload: dict[str, Any]) -> str:
+    """Serialise one SSE frame, with an ``id:`` line when ``event_id`` is given."""
+    data = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    return f"id: {event_id}\n{data}" if event_id else data
+
+
+def new_stream_id() -> str:
+    """Resume token of a new stream; see the module docstring."""
+    return f"rs_{secrets.token_urlsafe(18)}"
+
+
+def parse_event_id(value: str | None) -> tuple[str, int] | None:
+    """Split a ``Last-Event-ID`` value into ``(stream_id, seq)``."""
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamBuffer:
+    """Ring of the most recent events of one message plus its producer task."""
+
+    def __init__(self, stream_id: str, max_events: int) -> None:
+        self.stream_id = stream_id
+        self.done = False
+        self.finished_at: float | None = None
+        self.subscribers = 0
+        self.mirrored = False
+        self.mirror_pending: list[dict[str, Any]] = []
+        self.mirror_wake = asyncio.Event()
+        self.mirror_task: asyncio.Task[None] | None = None
+        self.mirror_closing = False
+        self.task: asyncio.Task[None] | None = None
+        self.idle_timer: asyncio.TimerHandle | None = None
+        self._events: deque[tuple[int, str]] = deque(maxlen=max(1, max_events))
+        self._seq = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def append(self, payload: dict[str, Any]) -> None:
+        self._seq += 1
+        self._events.append((self._seq, format_event(f"{self.stream_id}:{self._seq}", payload)))
+        self._wake()
+
+    def close(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def replay(self, after: int = 0) -> AsyncIterator[str]:
+        """Yield frames with ``seq > after``, then follow live events until done."""
+        cursor = after
+        while True:
+            first = self._events[0][0] if self._events else self._seq + 1
+            if cursor + 1 < first:
+                # the client is further behind than the ring reaches back
+                yield format_event(
+                    None,
+                    {"type": "error", "code": "resume_gap", "message": "缓冲区已过期，请重新提问"},
+                )
+                return
+            pending = list(islice(self._events, cursor + 1 - first, None))
+            if pending:
+                for _, frame in pending:
+                    yield frame
+                cursor = pending[-1][0]
+                continue
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class StreamRegistry:
+    """Message ID → ``StreamBuffer`` map with grace-period cancellation and TTL eviction."""
+
+    def __init__(
+        self,
+        *,
+        max_events: int = 2048,
+        ttl_seconds: float = 120.0,
+        grace_seconds: float = 15.0,
+        shared: SharedState | None = None,
+        poll_interval: float = 0.05,
+        mirror_interval: float = 0.05,
+        mirror_batch: int = 64,
+    ) -> None:
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+        self.poll_interval = poll_interval
+        self.mirror_interval = mirror_interval
+        self.mirror_batch = max(1, mirror_batch)
+        self._shared = shared if shared is not None and shared.shared else None
+        self._buffers: dict[str, StreamBuffer] = {}
+
+    def start(
+        self,
+        stream_id: str,
+        events: AsyncIterator[dict[str, Any]],
+        *,
+        meter: StreamMeter | None = None,
+    ) -> StreamBuffer:
+        """Run ``events`` in the background, buffering everything it yields."""
+        self._evict()
+        buffer = StreamBuffer(stream_id, self.max_events)
+        buffer.task = asyncio.create_task(self._pump(buffer, events, meter))
+        self._buffers[stream_id] = buffer
+        return buffer
+
+    def get(self, stream_id: str) -> StreamBuffer | None:
+        self._evict()
+        return self._buffers.get(stream_id)
+
+    async def has_remote(self, stream_id: str) -> bool:
+        """Whether another worker is producing (or produced) ``stream_id``."""
+        if self._shared is None:
+            return False
+        return await self._shared.get(_META_NS, stream_id) is not None
+
+    async def follow_remote(self, stream_id: str, after: int = 0) -> AsyncIterator[str]:
+        """Replay a stream owned by another worker from shared state until it ends."""
+        assert self._shared is not None
+        cursor = after
+        watched_at = 0.0
+        while True:
+            now = time.monotonic()
+            if now - watched_at >= 1.0:
+                # keep the owner from cancelling the generation while we follow it
+                await self._shared.set(_WATCH_NS, stream_id, True, ttl=max(self.grace_seconds, 1.0))
+                watched_at = now
+            meta = await self._shared.get(_META_NS, stream_id)
+            items = await self._shared.items(_EVENTS_NS, stream_id, after=cursor)
+            if items and items[0][0] > cursor + 1:
+                yield format_event(
+                    None,
+                    {"type": "error", "code": "resume_gap", "message": "缓冲区已过期，请重新提问"},
+                )
+                return
+            for seq, payload in items:
+                yield format_event(f"{stream_id}:{seq}", payload)
+                cursor = seq
+            if not items and (meta is None or meta.get("done")):
+                return
+            if not items:
+                await asyncio.sleep(self.poll_interval)
+
+    async def subscribe(self, buffer: StreamBuffer, after: int = 0) -> AsyncIterator[str]:
+        """Stream ``buffer`` to one client; detaching may cancel the generation."""
+        buffer.subscribers += 1
+        if buffer.idle_timer is not None:
+            buffer.idle_timer.cancel()
+            buffer.idle_timer = None
+        try:
+            async for frame in buffer.replay(after):
+                yield frame
+        finally:
+            buffer.subscribers -= 1
+            if buffer.subscribers == 0 and not buffer.done:
+                await self._detached(buffer)
+
+    async def _pump(
+        self,
+        buffer: StreamBuffer,
+        events: AsyncIterator[dict[str, Any]],
+        meter: StreamMeter | None,
+    ) -> None:
+        await self._mirror_start(buffer)
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    buffer.append(event)
+                    self._mirror(buffer, event)
+        except asyncio.CancelledError:
+            if meter is not None and not meter.finished:
+                meter.abandon()
+            abandoned = {"type": "error", "code": "abandoned", "message": "连接已断开，生成已取消"}
+            buffer.append(abandoned)
+            self._mirror(buffer, abandoned)
+            await asyncio.shield(self._mirror_close(buffer))
+            raise
+        except Exception as exc:  # noqa: BLE001 - surfaced to subscribers instead
+            logger.exception("Stream %s failed", buffer.stream_id)
+            failure = {"type": "error", "message": str(exc)}
+            buffer.append(failure)
+            self._mirror(buffer, failure)
+            await self._mirror_close(buffer)
+        else:
+            await self._mirror_close(buffer)
+        finally:
+            buffer.close()
+
+    async def _mirror_start(self, buffer: StreamBuffer) -> None:
+        if self._shared is None:
+            return
+        try:
+            await self._shared.set(_META_NS, buffer.stream_id, {"done": False}, ttl=self._shared_ttl)
+            buffer.mirrored = True
+        except Exception:  # noqa: BLE001 - local subscribers are unaffected
+            logger.warning("Cannot mirror stream %s to shared state", buffer.stream_id, exc_info=True)
+            return
+        buffer.mirror_task = asyncio.create_task(self._mirror_loop(buffer))
+
+    def _mirror(self, buffer: StreamBuffer, event: dict[str, Any]) -> None:
+        """Queue ``event`` for the flusher; never waits for shared state."""
+        if not buffer.mirrored:
+            return
+        buffer.mirror_pending.append(event)
+        if len(buffer.mirror_pending) >= self.mirror_batch:
+            buffer.mirror_wake.set()
+
+    async def _mirror_loop(self, buffer: StreamBuffer) -> None:
+        # exits once the stream is done and everything queued is written
+        while buffer.mirrored:
+            try:
+                await asyncio.wait_for(buffer.mirror_wake.wait(), timeout=self.mirror_interval)
+            except asyncio.TimeoutError:
+                pass
+            buffer.mirror_wake.clear()
+            await self._flush(buffer)
+            if buffer.mirror_closing and not buffer.mirror_pending:
+                return
+
+    async def _flush(self, buffer: StreamBuffer) -> None:
+        if not buffer.mirror_pending or not buffer.mirrored or self._shared is None:
+            return
+        batch, buffer.mirror_pending = buffer.mirror_pending, []
+        try:
+            await self._shared.push_many(
+                _EVENTS_NS, buffer.stream_id, batch, max_items=self.max_events, ttl=self._shared_ttl
+            )
+        except Exception:  # noqa: BLE001
+            # a partial mirror would replay wrong sequence numbers: stop mirroring
+            buffer.mirrored = False
+            logger.warning("Stopped mirroring stream %s", buffer.stream_id, exc_info=True)
+
+    async def _mirror_close(self, buffer: StreamBuffer) -> None:
+        if buffer.mirror_task is not None:
+            # the flusher writes what is still queued, then exits
+            buffer.mirror_closing = True
+            buffer.mirror_wake.set()
+            await asyncio.shield(buffer.mirror_task)
+        if not buffer.mirrored or self._shared is None:
+            return
+        try:
+            await self._shared.set(_META_NS, buffer.stream_id, {"done": True}, ttl=self.ttl_seconds)
+        except Exception:  # noqa: BLE001
+            logger.warning("Cannot mark stream %s finished", buffer.stream_id, exc_info=True)
+
+    @property
+    def _shared_ttl(self) -> float:
+        # running streams must outlive a reconnect window; refreshed on completion
+        return self.ttl_seconds + self.grace_seconds + 3600.0
+
+    async def _detached(self, buffer: StreamBuffer) -> None:
+        task = buffer.task
+        if task is None or task.done():
+            return
+        if self.grace_seconds <= 0:
+            task.cancel()
+            await asyncio.wait({task})
+            return
+        buffer.idle_timer = asyncio.get_running_loop().call_later(self.grace_seconds, self._expire, buffer)
+
+    def _expire(self, buffer: StreamBuffer) -> None:
+        buffer.idle_timer = None
+        if buffer.subscribers == 0 and buffer.task is not None and not buffer.task.done():
+            if buffer.mirrored:
+                asyncio.get_running_loop().create_task(self._expire_unless_watched(buffer))
+            else:
+                buffer.task.cancel()
+
+    async def _expire_unless_watched(self, buffer: StreamBuffer) -> None:
+        assert self._shared is not None
+        try:
+            watched = await self._shared.get(_WATCH_NS, buffer.stream_id) is not None
+        except Exception:  # noqa: BLE001
+            watched = False
+        if buffer.subscribers or buffer.task is None or buffer.task.done():
+            return
+        if watched:
+            # a follower on another worker is reading: check again later
+            buffer.idle_timer = asyncio.get_running_loop().call_later(self.grace_seconds, self._expire, buffer)
+        else:
+            buffer.task.cancel()
+
+    def _evict(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [
+            key
+            for key, buffer in self._buffers.items()
+            if buffer.done and buffer.finished_at is not None and buffer.finished_at < deadline
+        ]
+        for key in expired:
+            del self._buffers[key]
+
+
+@lru_cache
+def get_stream_registry() -> StreamRegistry:
+    """Process-wide registry configured from SSE_* settings."""
+    return StreamRegistry(
+        max_events=settings.sse_buffer_max_events,
+        ttl_seconds=settings.sse_buffer_ttl_seconds,
+        grace_seconds=settings.sse_resume_grace_seconds,
+        shared=get_shared_state(),
+    )
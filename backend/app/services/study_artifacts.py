@@ -0,0 +1,268 @@
+"""Precomputed study artifacts (summary, outline, practice questions) per material.
+
+"Summarize this", "give me an outline" and "make practice questions" are the
+usual first requests after an upload. Instead of a long-context call when the
+student asks, they are generated once after indexing (``ARTIFACTS_ENABLED``)
+or on ``POST /materials/{id}/artifacts``, and served from ``artifacts.json``.
+
+Generation is map-reduce over the parsed chunks (near-duplicates within the
+material skipped):
+
+ - map: chunks are packed into windows of ``ARTIFACTS_MAP_CHARS`` and each
+   window is condensed into notes (summary, topics, candidate questions);
+   windows run concurrently, bounded by ``ARTIFACTS_CONCURRENCY``
+ - collapse: while the notes are still longer than one window they are
+   condensed again the same way, at least two notes per window so each
+   round shrinks them
+ - reduce: the three artifacts are written from the notes concurrently
+
+Artifacts record the content hash (SHA-256 of the chunk texts) they were built
+from; once the material's chunks change they are reported ``stale`` and the
+next pipeline run regenerates them, unchanged content is never regenerated.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Sequence
+
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.material_store import ARTIFACTS_FILE, CHUNKS_FILE, MaterialStore, get_material_store
+
+ARTIFACT_KINDS = ("summary", "outline", "questions")
+
+MAP_PROMPT = (
+    "你是课程资料整理助手。下面是一份课程资料的一部分（或前一轮整理出的笔记）。"
+    "请提炼要点，只返回 JSON："
+    '{"summary": "这部分内容的中文摘要（不超过 300 字）", '
+    '"topics": ["按出现顺序的章节/主题，可用“主题 > 子主题”表示层级"], '
+    '"questions": [{"question": "可用于练习的题目", "answer": "参考答案"}]}，不要输出其他内容。'
+)
+REDUCE_PROMPTS = {
+    "summary": (
+        "你是课程助教。根据按顺序给出的各部分笔记，为整份资料写一篇中文总结（Markdown，"
+        "先一段总体概述，再列出 3-8 条核心要点），不要编造笔记以外的内容。"
+    ),
+    "outline": (
+        "你是课程助教。根据按顺序给出的各部分笔记，整理整份资料的中文大纲（Markdown 多级列表，"
+        "保持原有顺序，合并重复主题），只输出大纲。"
+    ),
+    "questions": (
+        "你是课程助教。根据各部分笔记中的候选题目与要点，出 {count} 道覆盖全部内容、难度由浅入深的练习题。"
+        '只返回 JSON：{{"questions": [{{"question": "题目", "answer": "参考答案", "difficulty": "easy|medium|hard"}}]}}，'
+        "不要输出其他内容。"
+    ),
+}
+
+
+def content_hash(texts: Sequence[str]) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass(slots=True)
+class ArtifactsReport:
+    status: str  # generated | unchanged | empty
+    content_hash: str
+    chunks: int = 0
+    map_calls: int = 0
+    reduce_calls: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.status,
+            "contentHash": self.content_hash,
+            "chunks": self.chunks,
+            "mapCalls": self.map_calls,
+            "reduceCalls": self.reduce_calls,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class StudyArtifactService:
+    """Generates and stores study artifacts; see the module docstring."""
+
+    def __init__(
+        self,
+        store: MaterialStore,
+        llm: LLMService,
+        *,
+        map_chars: int = 6000,
+        concurrency: int = 4,
+        questions: int = 10,
+    ) -> None:
+        self.store = store
+        self.llm = llm
+        self.map_chars = max(500, map_chars)
+        self.questions = questions
+        self._limiter = asyncio.Semaphore(max(1, concurrency))
+        # material -> ((mtime_ns, size) of chunks.jsonl, content hash)
+        self._hashes: OrderedDict[str, tuple[tuple[int, int], str]] = OrderedDict()
+
+    # ---- Reads ----
+    def texts(self, material_id: str) -> list[str]:
+        # only repeats within this material are skipped; text shared with another
+        # material still belongs in this one's summary
+        own = f"{material_id}:"
+        return [
+            chunk["text"]
+            for chunk in self.store.list_chunks(material_id)
+            if not str(chunk.get("duplicateOf") or "").startswith(own) and (chunk.get("text") or "").strip()
+        ]
+
+    def read(self, material_id: str) -> dict[str, Any] | None:
+        try:
+            return json.loads((self.store.path(material_id) / ARTIFACTS_FILE).read_text("utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def current_hash(self, material_id: str) -> str:
+        """Hash of the material's chunks, recomputed only after ``chunks.jsonl`` changed."""
+        try:
+            stat = (self.store.path(material_id) / CHUNKS_FILE).stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = (0, 0)
+        cached = self._hashes.get(material_id)
+        if cached is not None and cached[0] == stamp:
+            self._hashes.move_to_end(material_id)
+            return cached[1]
+        digest = content_hash(self.texts(material_id))
+        self._hashes[material_id] = (stamp, digest)
+        if len(self._hashes) > 1024:
+            self._hashes.popitem(last=False)
+        return digest
+
+    # ---- Generation ----
+    async def generate(self, material_id: str, *, force: bool = False) -> ArtifactsReport:
+        """Build all artifacts unless they already match the material's content."""
+        began = time.perf_counter()
+        texts = self.texts(material_id)
+        digest = content_hash(texts)
+        report = ArtifactsReport(status="generated", content_hash=digest, chunks=len(texts))
+        existing = self.read(material_id)
+        if not force and existing is not None and existing.get("contentHash") == digest and existing.get("items"):
+            report.status = "unchanged"
+            return report
+        if not texts:
+            report.status = "empty"
+            return report
+
+        with span("materials.artifacts", **{"material.id": material_id, "artifacts.chunks": len(texts)}) as art_span:
+            notes = await self._map(texts, report)
+            while len(notes) > 1 and sum(len(n) for n in notes) > self.map_chars:
+                # at least two notes per window, so every round shrinks the list
+                collapsed = await self._map(notes, report, min_per_window=2)
+                if len(collapsed) >= len(notes):
+                    break
+                notes = collapsed
+            summary, outline, questions = await asyncio.gather(
+                *(self._reduce(kind, notes, report) for kind in ARTIFACT_KINDS)
+            )
+            report.seconds = time.perf_counter() - began
+            art_span.set(**{"artifacts.map_calls": report.map_calls, "artifacts.reduce_calls": report.reduce_calls})
+
+        generated_at = datetime.now(timezone.utc).isoformat()
+        items = {
+            "summary": {"content": summary},
+            "outline": {"content": outline},
+            "questions": {"content": questions, "items": _parse_questions(questions)},
+        }
+        self._write(
+            material_id,
+            {
+                "contentHash": digest,
+                "generatedAt": generated_at,
+                "items": {kind: {"kind": kind, **item, "generatedAt": generated_at} for kind, item in items.items()},
+                "lastRun": report.to_dict(),
+            },
+        )
+        return report
+
+    def record_failure(self, material_id: str, error: str) -> None:
+        record = self.read(material_id) or {}
+        record["lastRun"] = {"status": "failed", "error": error, "at": datetime.now(timezone.utc).isoformat()}
+        self._write(material_id, record)
+
+    async def _map(self, texts: Sequence[str], report: ArtifactsReport, *, min_per_window: int = 1) -> list[str]:
+        windows: list[str] = []
+        current: list[str] = []
+        size = 0
+        for text in texts:
+            if len(current) >= min_per_window and size + len(text) > self.map_chars:
+                windows.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(text)
+            size += len(text)
+        if current:
+            windows.append("\n\n".join(current))
+        return list(await asyncio.gather(*(self._call(MAP_PROMPT, window, report, "map") for window in windows)))
+
+    async def _reduce(self, kind: str, notes: Sequence[str], report: ArtifactsReport) -> str:
+        prompt = REDUCE_PROMPTS[kind].format(count=self.questions)
+        body = "\n\n".join(f"【第 {i} 部分笔记】\n{note}" for i, note in enumerate(notes, start=1))
+        return await self._call(prompt, body, report, "reduce")
+
+    async def _call(self, prompt: str, content: str, report: ArtifactsReport, stage: str) -> str:
+        async with self._limiter:
+            if stage == "map":
+                report.map_calls += 1
+            else:
+                report.reduce_calls += 1
+            result = await self.llm.generate_completion(
+                [{"role": "system", "content": prompt}, {"role": "user", "content": content}],
+                temperature=0.2,
+                endpoint="study_artifacts",
+            )
+        return result.content.strip()
+
+    def _write(self, material_id: str, record: dict[str, Any]) -> None:
+        target = self.store.path(material_id) / ARTIFACTS_FILE
+        tmp = target.with_name(f".{ARTIFACTS_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text(json.dumps(record, ensure_ascii=False), "utf-8")
+        tmp.replace(target)
+
+
+def _parse_questions(raw: str) -> list[dict[str, Any]]:
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1 :] if "\n" in text else text
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return []
+    items = data.get("questions") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return []
+    return [
+        {key: str(item[key]) for key in ("question", "answer", "difficulty") if item.get(key)}
+        for item in items
+        if isinstance(item, dict) and item.get("question")
+    ]
+
+
+@lru_cache
+def get_study_artifact_service() -> StudyArtifactService:
+    """Service over the shared LLM service, configured from ARTIFACTS_*."""
+    return StudyArtifactService(
+        get_material_store(),
+        get_llm_service(),
+        map_chars=settings.artifacts_map_chars,
+        concurrency=settings.artifacts_concurrency,
+        questions=settings.artifacts_questions,
+    )
@@ -0,0 +1,171 @@
+"""Segmented, concurrent ASR transcription (``reparse(mode="asr")``).
+
+Audio is decoded incrementally and cut at silences; each segment is sent to the
+ASR endpoint as soon as it is cut, with at most ``ASR_CONCURRENCY`` requests in
+flight. Finished segments are written to the chunk store immediately as
+timestamped ``caption`` chunks, so the transcript becomes searchable while the
+rest of the recording is still being processed. Segment boundaries are
+deterministic, which lets a restarted job skip segments already stored.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Callable
+
+from app.clients.asr_client import ASRClient, ASRResult, OpenAIASRClient
+from app.core.config import settings
+from app.core.tracing import span
+from app.services.audio import AudioDecoder, AudioSegment, SilenceSegmenter, default_decoder
+from app.services.material_store import MaterialStore, get_material_store
+
+
+@dataclass(slots=True)
+class TranscriptionReport:
+    """Summary of a transcription run."""
+
+    segments: int = 0
+    already_done: int = 0
+    transcribed: int = 0
+    chunks: int = 0
+    duration_seconds: float = 0.0
+    truncated: bool = False
+    failed_segments: list[int] = field(default_factory=list)
+
+
+class TranscriptionService:
+    """Transcribe audio/video materials into timestamped caption chunks."""
+
+    def __init__(
+        self,
+        client: ASRClient,
+        store: MaterialStore,
+        *,
+        segment_seconds: float = 60.0,
+        concurrency: int = 4,
+        max_minutes: float = 120,
+        language: str | None = None,
+        decoder_factory: Callable[..., AudioDecoder] = default_decoder,
+    ) -> None:
+        self._client = client
+        self._store = store
+        self._segmenter = SilenceSegmenter(target_seconds=segment_seconds)
+        self._limiter = asyncio.Semaphore(max(1, concurrency))
+        self._max_seconds = max_minutes * 60
+        self._language = language
+        self._decoder_factory = decoder_factory
+
+    async def transcribe_material(self, material_id: str) -> TranscriptionReport:
+        original = self._store.original_file(material_id)
+        if original is None:
+            msg = "Material has no uploaded file to transcribe."
+            raise ValueError(msg)
+
+        done = {c.get("segment") for c in self._store.list_chunks(material_id, type="caption")}
+        report = TranscriptionReport()
+        stream = await self._decoder_factory(original).open(original)
+        segments = self._segmenter.segments(stream)
+        tasks: list[asyncio.Task[None]] = []
+
+        try:
+            async for segment in segments:
+                if self._store.is_cancelled(material_id):
+                    raise asyncio.CancelledError()
+                if segment.start_seconds >= self._max_seconds:
+                    report.truncated = True
+                    break
+                end_seconds = segment.start_seconds + segment.duration_seconds
+                if end_seconds > self._max_seconds:
+                    # the segment crossing the cap is cut at it; nothing after it is read
+                    keep = int((self._max_seconds - segment.start_seconds) * segment.sample_rate)
+                    segment = replace(segment, samples=segment.samples[:keep])
+                    report.truncated = True
+                report.segments += 1
+                report.duration_seconds = segment.start_seconds + segment.duration_seconds
+                if segment.index in done:
+                    report.already_done += 1
+                else:
+                    # wait for a free slot before cutting further: bounds buffered audio
+                    await self._limiter.acquire()
+                    task = asyncio.create_task(self._transcribe_segment(material_id, segment, report))
+                    task.add_done_callback(lambda _: self._limiter.release())
+                    tasks.append(task)
+                if report.truncated:
+                    break
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            # stops the decoder (e.g. kills ffmpeg) when we leave early
+            await segments.aclose()
+            await stream.blocks.aclose()
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        for error in errors:
+            if isinstance(error, asyncio.CancelledError):
+                raise error
+        if errors:
+            raise errors[0]
+        return report
+
+    async def _transcribe_segment(self, material_id: str, segment: AudioSegment, report: TranscriptionReport) -> None:
+        attributes = {"material.id": material_id, "asr.segment": segment.index, "asr.seconds": segment.duration_seconds}
+        try:
+            with span("asr.segment", **attributes):
+                audio = await asyncio.to_thread(segment.to_wav)
+                result = await self._client.transcribe(
+                    audio,
+                    filename=f"{material_id}-{segment.index:04d}.wav",
+                    language=self._language,
+                )
+        except ValueError:
+            report.failed_segments.append(segment.index)
+            raise
+
+        chunks = _stitch(material_id, segment, result)
+        report.chunks += self._store.append_chunks(material_id, chunks)
+        report.transcribed += 1
+
+
+def _stitch(material_id: str, segment: AudioSegment, result: ASRResult) -> list[dict[str, Any]]:
+    """Shift segment-relative timestamps onto the material's timeline."""
+    offset = segment.start_seconds
+    pieces = [(s.start, s.end, s.text) for s in result.segments if s.text]
+    if not pieces and result.text:
+        pieces = [(0.0, segment.duration_seconds, result.text)]
+    return [
+        {
+            "chunkId": f"{material_id}:caption:s{segment.index:04d}-{i:03d}",
+            "materialId": material_id,
+            "type": "caption",
+            "segment": segment.index,
+            "startMs": int((offset + start) * 1000),
+            "endMs": int((offset + min(end, segment.duration_seconds)) * 1000),
+            "text": text,
+        }
+        for i, (start, end, text) in enumerate(pieces)
+    ]
+
+
+@lru_cache
+def get_transcription_service() -> TranscriptionService:
+    """Cached service wired to ASR_* settings (falling back to VLM_* credentials)."""
+    client = OpenAIASRClient(
+        api_key=settings.speech_api_key,
+        model=settings.speech_model,
+        base_url=settings.speech_base_url,
+        timeout=settings.request_timeout_seconds,
+    )
+    return TranscriptionService(
+        client=client,
+        store=get_material_store(),
+        segment_seconds=settings.asr_segment_seconds,
+        concurrency=settings.asr_concurrency,
+        max_minutes=settings.audio_max_minutes,
+        language=settings.asr_language,
+    )
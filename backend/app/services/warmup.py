@@ -0,0 +1,183 @@
+"""Startup warm-up behind the readiness probe (``/api/health/ready``).
+
+A fresh worker answers ``/api/health`` as soon as it listens, but the first
+real requests would still pay for deferred imports (``app.core.lazy``), TCP +
+TLS setup to the model providers and reading vector indexes from disk. The
+lifespan starts ``Warmup.run`` in the background; its steps run concurrently:
+
+ - ``imports``: execute the lazily imported heavy modules in a worker thread
+ - ``llm``: open ``WARMUP_CONNECTIONS`` pooled connections per routed client
+   (``VLM_BASEURL`` and any ``LLM_ROUTES`` base URLs)
+ - ``embeddings``: the same for ``EMB_BASEURL`` (semantic cache and indexer)
+ - ``indexes``: memory-map the index versions of the ``WARMUP_INDEXES`` most
+   recently used materials
+
+Failing steps are retried until ``WARMUP_TIMEOUT_SECONDS``; the worker then
+reports ready anyway with ``degraded: true`` so an unreachable provider does
+not take every pod out of rotation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from app.core.config import settings
+from app.core.lazy import import_deferred
+from app.core.tracing import span
+from app.services.indexing import get_material_indexer
+from app.services.llm_service import get_llm_service
+from app.services.semantic_cache import get_semantic_cache
+
+logger = logging.getLogger(__name__)
+
+_RETRY_SECONDS = (0.5, 1.0, 2.0, 5.0)
+
+
+@dataclass(slots=True)
+class WarmupStep:
+    status: str = "pending"  # pending | ok | failed | skipped
+    seconds: float | None = None
+    attempts: int = 0
+    detail: Any = None
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.status,
+            "seconds": None if self.seconds is None else round(self.seconds, 3),
+            "attempts": self.attempts,
+            "detail": self.detail,
+            "error": self.error,
+        }
+
+
+class Warmup:
+    """Runs the warm-up steps once and tracks readiness; see the module docstring."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        timeout_seconds: float = 30.0,
+        connections: int = 4,
+        indexes: int = 32,
+    ) -> None:
+        self.enabled = enabled
+        self.timeout_seconds = timeout_seconds
+        self.connections = connections
+        self.indexes = indexes
+        self.ready = False
+        self.steps: dict[str, WarmupStep] = {}
+        self._started: float | None = None
+        self._seconds: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        """Begin warming up in the background (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self) -> None:
+        self._started = time.perf_counter()
+        if not self.enabled:
+            self._finish()
+            return
+        steps: dict[str, Callable[[], Awaitable[Any]]] = {
+            "imports": self._imports,
+            "llm": self._llm,
+            "embeddings": self._embeddings,
+            "indexes": self._indexes,
+        }
+        self.steps = {name: WarmupStep() for name in steps}
+        deadline = time.monotonic() + self.timeout_seconds
+        with span("startup.warmup", new_trace=True) as warmup_span:
+            await asyncio.gather(*(self._step(name, fn, deadline) for name, fn in steps.items()))
+            warmup_span.set(**{"warmup.degraded": self.degraded})
+        self._finish()
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]], deadline: float) -> None:
+        step = self.steps[name]
+        began = time.perf_counter()
+        while True:
+            step.attempts += 1
+            try:
+                remaining = max(0.0, deadline - time.monotonic())
+                detail = await asyncio.wait_for(fn(), timeout=remaining)
+            except Exception as exc:  # noqa: BLE001
+                step.error = str(exc) or type(exc).__name__
+                delay = _RETRY_SECONDS[min(step.attempts, len(_RETRY_SECONDS)) - 1]
+                if time.monotonic() + delay >= deadline:
+                    logger.warning("Warm-up step %s failed after %d attempts: %s", name, step.attempts, step.error)
+                    step.status = "failed"
+                    break
+                await asyncio.sleep(delay)
+                continue
+            step.status = "skipped" if detail is None else "ok"
+            step.detail = detail
+            step.error = None
+            break
+        step.seconds = time.perf_counter() - began
+
+    def _finish(self) -> None:
+        self._seconds = time.perf_counter() - (self._started or time.perf_counter())
+        self.ready = True
+
+    # ---- Steps: return a detail, or None when there is nothing to warm ----
+    async def _imports(self) -> list[str]:
+        return await asyncio.to_thread(import_deferred)
+
+    async def _llm(self) -> dict[str, int]:
+        await get_llm_service().warm(self.connections)
+        return {"connections": self.connections}
+
+    async def _embeddings(self) -> dict[str, int] | None:
+        clients = [get_semantic_cache().embedder]
+        if (indexer := get_material_indexer()) is not None:
+            clients.append(indexer.embedder)
+        clients = [client for client in clients if client is not None]
+        if not clients:
+            return None
+        await asyncio.gather(*(client.warm(self.connections) for client in clients))
+        return {"clients": len(clients), "connections": self.connections}
+
+    async def _indexes(self) -> dict[str, int] | None:
+        indexer = get_material_indexer()
+        if indexer is None or self.indexes <= 0:
+            return None
+        return {"mapped": await asyncio.to_thread(indexer.preload, self.indexes)}
+
+    @property
+    def degraded(self) -> bool:
+        return any(step.status == "failed" for step in self.steps.values())
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "warming",
+            "degraded": self.degraded,
+            "seconds": None if self._seconds is None else round(self._seconds, 3),
+            "steps": {name: step.to_dict() for name, step in self.steps.items()},
+        }
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+@lru_cache
+def get_warmup() -> Warmup:
+    """Process-wide warm-up configured from WARMUP_*."""
+    return Warmup(
+        enabled=settings.warmup_enabled,
+        timeout_seconds=settings.warmup_timeout_seconds,
+        connections=settings.warmup_connections,
+        indexes=settings.warmup_indexes,
+    )
@@ -0,0 +1,94 @@
+"""Compare two benchmark reports produced by ``benchmarks.run``.
+
+Prints per-scenario deltas and exits with status 1 when a tracked metric
+regresses by more than ``--max-regression`` percent, so it can gate CI::
+
+    python -m benchmarks.compare base.json head.json --max-regression 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+# (path into the scenario result, True when higher is better)
+TRACKED: tuple[tuple[tuple[str, ...], bool], ...] = (
+    (("rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p95"), False),
+    (("rss_per_stream_kb",), False),
+    # benchmarks.startup
+    (("import_ms", "p50"), False),
+    (("live_ms", "p50"), False),
+    (("ready_ms", "p50"), False),
+)
+
+
+def _get(data: dict[str, Any], path: tuple[str, ...]) -> float | None:
+    value: Any = data
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def compare(base: dict[str, Any], head: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return one row per tracked metric present in both reports."""
+    rows: list[dict[str, Any]] = []
+    for name, head_result in head.get("scenarios", {}).items():
+        base_result = base.get("scenarios", {}).get(name)
+        if base_result is None:
+            continue
+        for path, higher_is_better in TRACKED:
+            old, new = _get(base_result, path), _get(head_result, path)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old * 100
+            rows.append(
+                {
+                    "scenario": name,
+                    "metric": ".".join(path),
+                    "base": old,
+                    "head": new,
+                    "change_pct": round(change, 1),
+                    "regression_pct": round(-change if higher_is_better else change, 1),
+                }
+            )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--max-regression", type=float, default=None, help="fail above this percentage")
+    args = parser.parse_args(argv)
+
+    base = json.loads(Path(args.base).read_text("utf-8"))
+    head = json.loads(Path(args.head).read_text("utf-8"))
+    rows = compare(base, head)
+
+    print(f"base {base.get('commit') or '?'}  ->  head {head.get('commit') or '?'}")
+    print(f"{'scenario':<18}{'metric':<20}{'base':>12}{'head':>12}{'change':>10}")
+    failed = False
+    for row in rows:
+        flag = ""
+        if args.max_regression is not None and row["regression_pct"] > args.max_regression:
+            flag = "  REGRESSION"
+            failed = True
+        print(
+            f"{row['scenario']:<18}{row['metric']:<20}{row['base']:>12.2f}{row['head']:>12.2f}"
+            f"{row['change_pct']:>+9.1f}%{flag}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Mock OpenAI-compatible provider for load tests.
+
+Serves ``/v1/chat/completions`` (plain and streamed) with configurable latency,
+token rate, error injection and heartbeat frames, so throughput can be measured
+without paying for a real provider.
+
+Run standalone::
+
+    python -m benchmarks.mock_provider --port 9100 --latency-ms 300 --tokens-per-second 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass(slots=True)
+class MockConfig:
+    """Behaviour knobs of the mock provider."""
+
+    latency_ms: float = 200.0
+    tokens_per_second: float = 50.0
+    completion_tokens: int = 64
+    error_rate: float = 0.0
+    error_status: int = 429
+    # emit an empty-choices heartbeat frame every N tokens (0 disables)
+    heartbeat_every: int = 0
+    seed: int | None = None
+
+
+def create_mock_app(config: MockConfig | None = None) -> FastAPI:
+    """Build the mock provider ASGI app."""
+    cfg = config or MockConfig()
+    rng = random.Random(cfg.seed)
+    app = FastAPI(title="Mock OpenAI provider")
+    app.state.config = cfg
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model") or "mock-model"
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4 + 1
+
+        await asyncio.sleep(cfg.latency_ms / 1000)
+        if cfg.error_rate and rng.random() < cfg.error_rate:
+            return JSONResponse(
+                status_code=cfg.error_status,
+                content={"error": {"message": f"injected error ({cfg.error_status})"}},
+            )
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": cfg.completion_tokens,
+            "total_tokens": prompt_tokens + cfg.completion_tokens,
+        }
+        if not body.get("stream"):
+            await asyncio.sleep(cfg.completion_tokens / cfg.tokens_per_second)
+            return {
+                "id": f"chatcmpl-{app.state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": _text(cfg.completion_tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        # like OpenAI, the usage frame is only sent when asked for
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream(cfg, model, usage if include_usage else None), media_type="text/event-stream"
+        )
+
+    return app
+
+
+def _text(tokens: int) -> str:
+    return "".join(_token(i) for i in range(tokens))
+
+
+def _token(index: int) -> str:
+    return "测试"[index % 2] if index % 5 else " token"
+
+
+def _frame(payload: dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _stream(cfg: MockConfig, model: str, usage: dict[str, int] | None) -> AsyncIterator[str]:
+    interval = 1.0 / cfg.tokens_per_second if cfg.tokens_per_second > 0 else 0.0
+    started = time.perf_counter()
+    for index in range(cfg.completion_tokens):
+        if cfg.heartbeat_every and index and index % cfg.heartbeat_every == 0:
+            yield _frame({"model": model, "choices": []})
+        # pace against the wall clock so slow consumers do not drift the rate
+        delay = started + index * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield _frame({"model": model, "choices": [{"index": 0, "delta": {"content": _token(index)}}]})
+    yield _frame({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    if usage is not None:
+        yield _frame({"model": model, "choices": [], "usage": usage})
+    yield "data: [DONE]\n\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--heartbeat-every", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        heartbeat_every=args.heartbeat_every,
+        seed=args.seed,
+    )
+    uvicorn.run(create_mock_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Load-test runner for the AIEDU backend.
+
+Starts the mock provider and the backend (``uvicorn app.main:app``) as separate
+processes, drives the selected scenarios over real HTTP at a fixed concurrency
+and prints a JSON report (RPS, p50/p95/p99 latency, TTFT, RSS per stream)
+that ``python -m benchmarks.compare`` can diff across commits.
+
+Example::
+
+    python -m benchmarks.run --scenarios llm_stream,qa_instant --concurrency 32 \\
+        --requests 400 --latency-ms 300 --tokens-per-second 40 --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+SCENARIOS = ("llm_messages", "llm_stream", "qa_instant", "materials_upload")
+STREAMING = {"llm_stream", "qa_instant"}
+
+
+@dataclass(slots=True)
+class Sample:
+    latency: float
+    ttft: float | None = None
+    ok: bool = True
+
+
+@dataclass(slots=True)
+class ScenarioResult:
+    name: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration_s: float
+    rps: float
+    latency_ms: dict[str, float]
+    ttft_ms: dict[str, float] | None
+    rss_baseline_mb: float | None
+    rss_peak_mb: float | None
+    rss_per_stream_kb: float | None
+
+
+def percentiles(values: list[float], points: tuple[int, ...] = (50, 95, 99)) -> dict[str, float]:
+    """Linear-interpolated percentiles, in milliseconds, rounded for stable diffs."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out: dict[str, float] = {}
+    for p in points:
+        rank = (len(ordered) - 1) * p / 100
+        lo = int(rank)
+        hi = min(lo + 1, len(ordered) - 1)
+        value = ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+        out[f"p{p}"] = round(value * 1000, 2)
+    out["mean"] = round(sum(ordered) / len(ordered) * 1000, 2)
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int | None) -> float | None:
+    if pid is None:
+        return None
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def _wait_ready(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    msg = f"Server at {url} did not become ready"
+    raise RuntimeError(msg)
+
+
+def _spawn(args: list[str], env: dict[str, str]) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env={**os.environ, **env})
+
+
+def _stream_request(path: str, body: dict[str, Any]) -> Callable[[httpx.AsyncClient], Awaitable[Sample]]:
+    async def run(client: httpx.AsyncClient) -> Sample:
+        started = time.perf_counter()
+        ttft: float | None = None
+        ok = True
+        async with client.stream("POST", path, json=body) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                return Sample(time.perf_counter() - started, ok=False)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:") :])
+                if event.get("type") == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event.get("type") == "error":
+                    ok = False
+        return Sample(time.perf_counter() - started, ttft, ok and ttft is not None)
+
+    return run
+
+
+def _json_request(path: str, body: dict[str, Any]) -> Callable[[httpx.AsyncClient], Awaitable[Sample]]:
+    async def run(client: httpx.AsyncClient) -> Sample:
+        started = time.perf_counter()
+        response = await client.post(path, json=body)
+        return Sample(time.perf_counter() - started, ok=response.status_code < 400)
+
+    return run
+
+
+def _upload_request(size_kb: int) -> Callable[[httpx.AsyncClient], Awaitable[Sample]]:
+    payload = os.urandom(size_kb * 1024)
+
+    async def run(client: httpx.AsyncClient) -> Sample:
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/materials",
+            files={"file": ("bench.pdf", payload, "application/pdf")},
+            data={"courseId": "bench"},
+        )
+        return Sample(time.perf_counter() - started, ok=response.status_code < 400)
+
+    return run
+
+
+def build_scenario(name: str, args: argparse.Namespace) -> Callable[[httpx.AsyncClient], Awaitable[Sample]]:
+    message = "请用三句话解释什么是导数。"
+    if name == "llm_messages":
+        return _json_request("/api/llm/messages", {"message": message})
+    if name == "llm_stream":
+        return _stream_request("/api/llm/messages/stream", {"message": message})
+    if name == "qa_instant":
+        return _stream_request("/api/qa/instant", {"message": message})
+    if name == "materials_upload":
+        return _upload_request(args.upload_kb)
+    msg = f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}"
+    raise ValueError(msg)
+
+
+async def run_scenario(
+    name: str,
+    request: Callable[[httpx.AsyncClient], Awaitable[Sample]],
+    *,
+    base_url: str,
+    concurrency: int,
+    total: int,
+    app_pid: int | None,
+) -> ScenarioResult:
+    samples: list[Sample] = []
+    remaining = total
+    baseline = _rss_mb(app_pid)
+    peak = baseline
+    done = asyncio.Event()
+
+    async def sample_memory() -> None:
+        nonlocal peak
+        while not done.is_set():
+            current = _rss_mb(app_pid)
+            if current is not None and (peak is None or current > peak):
+                peak = current
+            await asyncio.sleep(0.05)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            try:
+                samples.append(await request(client))
+            except (httpx.HTTPError, json.JSONDecodeError):
+                samples.append(Sample(0.0, ok=False))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        sampler = asyncio.create_task(sample_memory())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+        done.set()
+        await sampler
+
+    good = [s for s in samples if s.ok]
+    ttfts = [s.ttft for s in good if s.ttft is not None]
+    per_stream = None
+    if name in STREAMING and baseline is not None and peak is not None:
+        per_stream = round(max(peak - baseline, 0.0) * 1024 / concurrency, 1)
+    return ScenarioResult(
+        name=name,
+        concurrency=concurrency,
+        requests=len(samples),
+        errors=len(samples) - len(good),
+        duration_s=round(duration, 3),
+        rps=round(len(good) / duration, 2) if duration else 0.0,
+        latency_ms=percentiles([s.latency for s in good]),
+        ttft_ms=percentiles(ttfts) if name in STREAMING else None,
+        rss_baseline_mb=round(baseline, 1) if baseline is not None else None,
+        rss_peak_mb=round(peak, 1) if peak is not None else None,
+        rss_per_stream_kb=per_stream,
+    )
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    requests = {name: build_scenario(name, args) for name in names}
+    processes: list[subprocess.Popen[bytes]] = []
+    storage = tempfile.TemporaryDirectory(prefix="aiedu_bench_")
+    app_pid: int | None = args.app_pid
+    base_url = args.app_url
+
+    try:
+        if base_url is None:
+            mock_port, app_port = _free_port(), _free_port()
+            processes.append(
+                _spawn(
+                    [
+                        sys.executable, "-m", "benchmarks.mock_provider",
+                        "--port", str(mock_port),
+                        "--latency-ms", str(args.latency_ms),
+                        "--tokens-per-second", str(args.tokens_per_second),
+                        "--completion-tokens", str(args.completion_tokens),
+                        "--error-rate", str(args.error_rate),
+                        "--heartbeat-every", str(args.heartbeat_every),
+                        "--seed", "7",
+                    ],
+                    env={},
+                )
+            )
+            await _wait_ready(f"http://127.0.0.1:{mock_port}/docs")
+            app = _spawn(
+                [
+                    sys.executable, "-m", "uvicorn", "app.main:app",
+                    "--port", str(app_port), "--log-level", "warning", "--workers", str(args.workers),
+                ],
+                env={
+                    "VLM_BASEURL": f"http://127.0.0.1:{mock_port}/v1",
+                    "VLM_APIKEY": "bench",
+                    "VLM_MODEL": "mock-model",
+                    "STORAGE_TMP_DIR": storage.name,
+                },
+            )
+            processes.append(app)
+            app_pid = app_pid or (app.pid if args.workers == 1 else None)
+            base_url = f"http://127.0.0.1:{app_port}"
+            await _wait_ready(f"{base_url}/api/health")
+
+        results = []
+        for name in names:
+            if args.warmup:
+                await run_scenario(
+                    name, requests[name], base_url=base_url, concurrency=args.concurrency,
+                    total=min(args.warmup, args.requests), app_pid=None,
+                )
+            results.append(
+                await run_scenario(
+                    name, requests[name], base_url=base_url, concurrency=args.concurrency,
+                    total=args.requests, app_pid=app_pid,
+                )
+            )
+    finally:
+        for proc in reversed(processes):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        storage.cleanup()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "completion_tokens": args.completion_tokens,
+            "error_rate": args.error_rate,
+            "heartbeat_every": args.heartbeat_every,
+        },
+        "scenarios": {r.name: asdict(r) for r in results},
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the AIEDU backend against a mock provider.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned backend")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--heartbeat-every", type=int, default=0)
+    parser.add_argument("--upload-kb", type=int, default=512)
+    parser.add_argument("--app-url", default=None, help="benchmark an already running backend instead")
+    parser.add_argument("--app-pid", type=int, default=None, help="PID to sample RSS from with --app-url")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", "utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Startup benchmark: import time and time-to-ready of the backend.
+
+Each run starts a fresh interpreter, so nothing is cached in-process:
+
+ - ``import_ms``: cumulative ``-X importtime`` of ``app.main`` (app factory included)
+ - ``process_ms``: wall time of ``python -c "import app.main"`` (interpreter start included)
+ - ``live_ms`` / ``ready_ms``: from spawning ``uvicorn app.main:app`` (against the
+   mock provider) until ``/api/health`` and ``/api/health/ready`` answer 200
+
+The report has the same shape as ``benchmarks.run`` (one ``startup`` scenario),
+so ``python -m benchmarks.compare`` tracks it across commits; the slowest
+modules of the last import are listed to show what to defer next.
+
+Example::
+
+    python -m benchmarks.startup --runs 7 --serve-runs 3 --output startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from benchmarks.run import BACKEND_DIR, _free_port, _git_commit, _spawn, _wait_ready, percentiles
+
+
+def parse_importtime(stderr: str) -> list[dict[str, Any]]:
+    """Rows of ``-X importtime`` output as ``{module, self_ms, cumulative_ms}``."""
+    rows: list[dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:") :].split("|"))
+        rows.append(
+            {"module": module, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+        )
+    return rows
+
+
+def measure_import() -> tuple[float, float, list[dict[str, Any]]]:
+    """One cold import of ``app.main``: (import seconds, process seconds, importtime rows)."""
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    rows = parse_importtime(out.stderr)
+    app_main = next(row for row in rows if row["module"] == "app.main")
+    return app_main["cumulative_ms"] / 1000, elapsed, rows
+
+
+async def _wait_status(client: httpx.AsyncClient, url: str, deadline: float) -> None:
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.02)
+    msg = f"{url} did not return 200"
+    raise RuntimeError(msg)
+
+
+async def measure_serve(mock_url: str, storage: str, timeout: float) -> tuple[float, float]:
+    """Seconds from spawning the backend until it is live and until it is ready."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = _spawn(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={"VLM_BASEURL": mock_url, "VLM_APIKEY": "bench", "VLM_MODEL": "mock-model", "STORAGE_TMP_DIR": storage},
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            await _wait_status(client, f"http://127.0.0.1:{port}/api/health", deadline)
+            live = time.perf_counter() - started
+            await _wait_status(client, f"http://127.0.0.1:{port}/api/health/ready", deadline)
+            ready = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return live, ready
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    imports: list[float] = []
+    processes: list[float] = []
+    rows: list[dict[str, Any]] = []
+    for _ in range(args.runs):
+        seconds, elapsed, rows = measure_import()
+        imports.append(seconds)
+        processes.append(elapsed)
+
+    live: list[float] = []
+    ready: list[float] = []
+    if args.serve_runs:
+        mock_port = _free_port()
+        mock = _spawn(
+            [sys.executable, "-m", "benchmarks.mock_provider", "--port", str(mock_port), "--latency-ms", "0"], env={}
+        )
+        try:
+            await _wait_ready(f"http://127.0.0.1:{mock_port}/docs")
+            with tempfile.TemporaryDirectory(prefix="aiedu_bench_") as storage:
+                for _ in range(args.serve_runs):
+                    up, warm = await measure_serve(f"http://127.0.0.1:{mock_port}/v1", storage, args.timeout)
+                    live.append(up)
+                    ready.append(warm)
+        finally:
+            mock.terminate()
+            mock.wait(timeout=10)
+
+    slowest = sorted(rows, key=lambda row: row["self_ms"], reverse=True)[: args.top]
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {"runs": args.runs, "serve_runs": args.serve_runs},
+        "scenarios": {
+            "startup": {
+                "import_ms": percentiles(imports),
+                "process_ms": percentiles(processes),
+                "live_ms": percentiles(live) or None,
+                "ready_ms": percentiles(ready) or None,
+            }
+        },
+        "slowest_imports": slowest,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure backend import time and time-to-ready.")
+    parser.add_argument("--runs", type=int, default=5, help="cold imports of app.main")
+    parser.add_argument("--serve-runs", type=int, default=3, help="uvicorn starts (0 skips the serve phase)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness per start")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules (self time) to list")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", "utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import pytest
+
+from app.core.config import settings
+from app.services.material_store import MaterialStore
+from app.services.storage_lifecycle import get_storage_lifecycle
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> MaterialStore:
+    """An empty material store rooted in the test's tmp dir."""
+    monkeypatch.setattr(settings, "storage_tmp_dir", str(tmp_path))
+    get_storage_lifecycle.cache_clear()
+    yield MaterialStore()
+    get_storage_lifecycle.cache_clear()
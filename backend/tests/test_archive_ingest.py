@@ -0,0 +1,152 @@
+import io
+import json
+import zipfile
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.archive_ingest import ArchiveIngestion
+from app.services.jobs import JobRegistry
+from app.services.material_store import STAGING_PREFIX, MaterialStore
+from app.services.storage_lifecycle import StorageLifecycle
+
+
+def _zip(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _events(body: str) -> list[dict]:
+    return [json.loads(line[len("data: ") :]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+@pytest.fixture
+def ingestion(tmp_path, monkeypatch) -> ArchiveIngestion:
+    monkeypatch.setattr(settings, "storage_tmp_dir", str(tmp_path))
+    store = MaterialStore()
+    service = ArchiveIngestion(store, StorageLifecycle(store), JobRegistry(), parse_concurrency=2)
+    monkeypatch.setattr("app.api.routes.materials.get_archive_ingestion", lambda: service)
+    return service
+
+
+async def test_archive_creates_materials_queues_parses_and_streams_progress(ingestion, monkeypatch) -> None:
+    parsed: list[str] = []
+
+    async def fake_parse(material_id: str, mode: str) -> None:
+        parsed.append(mode)
+        ingestion.store.write_status(material_id, "ready", mode=mode)
+
+    monkeypatch.setattr("app.services.archive_ingest.run_parse", fake_parse)
+    monkeypatch.setattr(settings, "upload_max_mb", 1)
+    archive = _zip(
+        {
+            "第一章/讲义.pdf": b"%PDF-1.4 lecture",
+            "第一章/板书.png": b"\x89PNG board",
+            "notes.txt": "导数的定义".encode(),
+            "__MACOSX/._讲义.pdf": b"junk",
+            "setup.exe": b"MZ",
+            "big.pdf": b"0" * (2 * 1024 * 1024),
+        }
+    )
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/materials/archive",
+            files={"file": ("course.zip", archive, "application/zip")},
+            data={"courseId": "calc101"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert events[0]["type"] == "archive" and (events[0]["entries"], events[0]["accepted"]) == (5, 3)
+    skipped = {e["name"]: e["reason"] for e in events if e["type"] == "file" and e["status"] == "skipped"}
+    assert skipped == {"setup.exe": "unsupported_type", "big.pdf": "too_large"}
+    committed = next(e for e in events if e["type"] == "committed")
+    assert len(committed["materialIds"]) == 3
+    final = {e["name"]: e["status"] for e in events if e["type"] == "file"}
+    # txt has no parser yet and stays uploaded; PDF and image are parsed
+    assert final == {"讲义.pdf": "ready", "板书.png": "ready", "notes.txt": "uploaded", **{k: "skipped" for k in skipped}}
+    assert sorted(parsed) == ["vision", "vision"]
+    assert events[-1]["type"] == "done" and events[-1]["materials"] == 3
+
+    store = ingestion.store
+    meta = {store.read_meta(m)["originalName"]: store.read_meta(m) for m in committed["materialIds"]}
+    assert meta["讲义.pdf"]["courseId"] == "calc101"
+    assert meta["讲义.pdf"]["archive"]["path"] == "第一章/讲义.pdf"
+    assert not list(store.root.glob(f"{STAGING_PREFIX}*"))
+
+
+async def test_archive_over_course_quota_leaves_no_materials(ingestion) -> None:
+    ingestion.lifecycle.course_quota_bytes = 10
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/materials/archive",
+            files={"file": ("course.zip", _zip({"a.txt": b"x" * 64}), "application/zip")},
+            data={"courseId": "calc101", "parse": "false"},
+        )
+        not_zip = await client.post(
+            "/api/materials/archive", files={"file": ("course.zip", b"plain text", "application/zip")}
+        )
+
+    assert _events(response.text)[-1]["type"] == "error"
+    assert not [p for p in ingestion.store.root.iterdir() if not p.name.startswith(".")]
+    assert not list(ingestion.store.root.glob(f"{STAGING_PREFIX}*"))
+    assert not_zip.status_code == 400
+
+
+async def test_archive_over_quota_by_declared_size_is_not_extracted(ingestion, monkeypatch) -> None:
+    ingestion.lifecycle.course_quota_bytes = 100
+    extracted: list[str] = []
+    monkeypatch.setattr(
+        "app.services.archive_ingest._extract", lambda archive, info, dest, limit: extracted.append(info.filename)
+    )
+    archive, entries = ingestion.open(io.BytesIO(_zip({"a.txt": b"x" * 80, "b.txt": b"y" * 80})))
+
+    events = [event async for event in ingestion.ingest(archive, entries, course_id="calc101", parse=False)]
+
+    assert events[-1]["type"] == "error" and "quota" in events[-1]["error"]
+    assert extracted == []
+    assert not [p for p in ingestion.store.root.iterdir() if p.name != ".trash"]
+
+
+async def test_failed_commit_gives_the_admitted_bytes_back(ingestion, monkeypatch) -> None:
+    ingestion.lifecycle.course_quota_bytes = 100
+
+    def fail(staging, records):
+        raise OSError("disk went away")
+
+    monkeypatch.setattr(ingestion.store, "commit_staged", fail)
+    archive, entries = ingestion.open(io.BytesIO(_zip({"a.txt": b"x" * 80})))
+    with pytest.raises(OSError):
+        async for _ in ingestion.ingest(archive, entries, course_id="calc101", parse=False):
+            pass
+
+    # the full quota is still available to the next upload
+    await ingestion.lifecycle.admit_upload("calc101", 100)
+
+
+def test_commit_staged_rolls_back_when_a_rename_fails(ingestion, monkeypatch) -> None:
+    store = ingestion.store
+    staging = store.root / f"{STAGING_PREFIX}arc_test"
+    for material_id in ("mat_a", "mat_b", "mat_c"):
+        (staging / material_id).mkdir(parents=True)
+    real_rename = type(staging).rename
+
+    def rename(self, target):
+        if self.name == "mat_c":
+            raise OSError("disk went away")
+        return real_rename(self, target)
+
+    monkeypatch.setattr(type(staging), "rename", rename)
+    with pytest.raises(OSError):
+        store.commit_staged(staging, {m: {"title": m} for m in ("mat_a", "mat_b", "mat_c")})
+
+    assert not store.exists("mat_a") and not store.exists("mat_b")
+    assert sorted(p.name for p in staging.iterdir()) == ["mat_a", "mat_b", "mat_c"]
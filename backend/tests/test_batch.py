@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.response_cache import ResponseCache
+
+
+class SlowEchoClient(LLMClient):
+    """Answers echo the prompt; prompts containing 'slow' take longer."""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def generate(self, messages, *, options=None):
+        prompt = messages[-1]["content"]
+        self.calls.append(prompt)
+        if prompt == "boom":
+            raise ValueError("upstream failed")
+        await asyncio.sleep(0.05 if "slow" in prompt else 0.005)
+        return LLMGenerationResult(content=f"echo:{prompt}", model="fake")
+
+    async def stream(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+        yield
+
+
+@pytest.fixture
+def echo_client():
+    client = SlowEchoClient()
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=client, cache=ResponseCache())
+    yield client
+    app.dependency_overrides.clear()
+
+
+async def test_batch_streams_ndjson_in_completion_order_and_dedupes(echo_client: SlowEchoClient) -> None:
+    items = [
+        {"id": "a", "prompt": "slow one"},
+        {"id": "b", "prompt": "fast"},
+        {"id": "c", "prompt": "fast"},
+        {"id": "d", "prompt": "boom"},
+    ]
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/qa/batch", json={"items": items})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = [line for line in lines if line["type"] == "result"]
+    assert lines[-1] == {"type": "end", "total": 4, "failed": 1}
+    # the slow prompt finishes last even though it was submitted first
+    assert results[-1]["id"] == "a"
+    by_id = {r["id"]: r for r in results}
+    assert by_id["b"]["content"] == by_id["c"]["content"] == "echo:fast"
+    assert by_id["d"]["error"] == "upstream failed"
+    # duplicate prompts are computed once (coalesced while in flight)
+    assert echo_client.calls.count("fast") == 1
+    assert by_id["b"]["cached"] != by_id["c"]["cached"]
+
+
+async def test_batch_job_can_be_polled(echo_client: SlowEchoClient) -> None:
+    items = [{"prompt": f"q{i}"} for i in range(5)]
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        created = await client.post("/api/qa/batch", json={"items": items, "mode": "job"})
+        job_id = created.json()["data"]["jobId"]
+        for _ in range(100):
+            polled = (await client.get(f"/api/qa/batch/{job_id}")).json()["data"]
+            if polled["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+
+    assert polled["completed"] == 5 and polled["failed"] == 0
+    assert sorted(r["content"] for r in polled["results"]) == [f"echo:q{i}" for i in range(5)]
+
+
+async def test_batch_rejects_items_without_prompt(echo_client: SlowEchoClient) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/qa/batch", json={"items": [{"id": "x"}]})
+    assert response.status_code == 422
+
+
+async def test_cancelling_the_first_caller_does_not_fail_coalesced_waiters() -> None:
+    cache: ResponseCache[str] = ResponseCache()
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    owner = asyncio.create_task(cache.get_or_compute("k", compute))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+    await asyncio.sleep(0.01)
+    owner.cancel()
+
+    assert await waiter == ("answer", "coalesced")
+    assert owner.cancelled()
+    assert calls == 1
+    assert await cache.get_or_compute("k", compute) == ("answer", "hit")
+
+
+async def test_single_completions_bypass_the_response_cache() -> None:
+    client = SlowEchoClient()
+    service = LLMService(client=client, cache=ResponseCache())
+    messages = [{"role": "user", "content": "hi"}]
+
+    await service.generate_completion(messages)
+    await service.generate_completion(messages)
+    _, source = await service.complete(messages, cache=True)
+    _, again = await service.complete(messages, cache=True)
+
+    assert client.calls == ["hi", "hi", "hi"]
+    assert (source, again) == ("miss", "hit")
@@ -0,0 +1,67 @@
+import json
+
+from httpx import AsyncClient
+
+from benchmarks.compare import compare
+from benchmarks.mock_provider import MockConfig, create_mock_app
+from benchmarks.run import percentiles
+from benchmarks.startup import parse_importtime
+
+CHAT = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+
+async def test_mock_provider_streams_tokens_heartbeats_and_usage() -> None:
+    mock = create_mock_app(MockConfig(latency_ms=0, tokens_per_second=1000, completion_tokens=6, heartbeat_every=2))
+    async with AsyncClient(app=mock, base_url="http://mock") as client:
+        response = await client.post(
+            "/v1/chat/completions", json={**CHAT, "stream": True, "stream_options": {"include_usage": True}}
+        )
+
+    frames = [line[len("data: ") :] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert frames[-1] == "[DONE]"
+    events = [json.loads(f) for f in frames[:-1]]
+    tokens = [e for e in events if e["choices"] and e["choices"][0]["delta"].get("content")]
+    heartbeats = [e for e in events if not e["choices"] and "usage" not in e]
+    assert len(tokens) == 6
+    assert len(heartbeats) == 2
+    assert events[-1]["usage"]["completion_tokens"] == 6
+
+
+async def test_mock_provider_injects_errors() -> None:
+    mock = create_mock_app(MockConfig(latency_ms=0, error_rate=1.0, error_status=503))
+    async with AsyncClient(app=mock, base_url="http://mock") as client:
+        response = await client.post("/v1/chat/completions", json=CHAT)
+
+    assert response.status_code == 503
+    assert "injected" in response.json()["error"]["message"]
+
+
+def test_percentiles_and_compare_flag_regressions() -> None:
+    stats = percentiles([0.1, 0.2, 0.3, 0.4, 0.5])
+    assert stats["p50"] == 300.0
+    assert stats["p99"] == 496.0
+
+    base = {"scenarios": {"llm_stream": {"rps": 100.0, "latency_ms": {"p95": 200.0}}}}
+    head = {"scenarios": {"llm_stream": {"rps": 80.0, "latency_ms": {"p95": 180.0}}}}
+    rows = {row["metric"]: row for row in compare(base, head)}
+    assert rows["rps"]["regression_pct"] == 20.0
+    assert rows["latency_ms.p95"]["regression_pct"] == -10.0
+
+
+def test_parse_importtime_and_compare_track_startup() -> None:
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:      1600 |      53531 |   numpy\n"
+        "import time:       688 |     707962 | app.main\n"
+    )
+    rows = parse_importtime(stderr)
+    assert rows == [
+        {"module": "numpy", "self_ms": 1.6, "cumulative_ms": 53.531},
+        {"module": "app.main", "self_ms": 0.688, "cumulative_ms": 707.962},
+    ]
+
+    base = {"scenarios": {"startup": {"import_ms": {"p50": 600.0}, "ready_ms": {"p50": 900.0}}}}
+    head = {"scenarios": {"startup": {"import_ms": {"p50": 660.0}, "ready_ms": {"p50": 900.0}}}}
+    rows = {row["metric"]: row for row in compare(base, head)}
+    assert rows["import_ms.p50"]["regression_pct"] == 10.0
+    assert rows["ready_ms.p50"]["regression_pct"] == 0.0
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult
+from app.clients.embedding_client import EmbeddingClient
+from app.main import app
+from app.services.captioning import CaptioningService
+from app.services.indexing import MaterialIndexer
+from app.services.material_store import MaterialStore
+
+
+class FakeVisionClient(LLMClient):
+    def __init__(self) -> None:
+        self.requested: list[list[int]] = []
+
+    async def generate(self, messages, *, options=None):
+        header = messages[1]["content"][0]["text"]
+        pages = [int(p) for p in header.split("：")[1].split(",")]
+        self.requested.append(pages)
+        captions = [{"page": p, "caption": f"caption {p}"} for p in pages]
+        return LLMGenerationResult(content=json.dumps({"captions": captions}))
+
+    async def stream(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+        yield
+
+
+@pytest.fixture
+def store(store: MaterialStore) -> MaterialStore:
+    pages = store.path("mat_demo") / "pages"
+    pages.mkdir(parents=True)
+    (store.path("mat_demo") / "deck.pptx").write_bytes(b"pptx")
+    for page in range(1, 8):
+        (pages / f"page-{page:04d}.png").write_bytes(b"\x89PNG")
+    # page 2 already has a usable text layer
+    (pages / "page-0002.txt").write_text("x" * 300, "utf-8")
+    return store
+
+
+async def test_caption_material_batches_and_skips_text_pages(store: MaterialStore) -> None:
+    client = FakeVisionClient()
+    service = CaptioningService(client, store, pages_per_request=3, concurrency=2, min_text_chars=200)
+
+    report = await service.caption_material("mat_demo")
+
+    assert sorted(p for batch in client.requested for p in batch) == [1, 3, 4, 5, 6, 7]
+    assert all(len(batch) <= 3 for batch in client.requested)
+    assert report.requests == 2
+    assert report.skipped_text == 1
+    assert report.captioned == 6
+
+
+class CharEmbedder(EmbeddingClient):
+    async def embed(self, texts):
+        vectors = np.zeros((len(texts), 256), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % 256] += 1.0
+        return vectors.tolist()
+
+
+async def test_text_layer_pages_become_searchable_text_chunks(store: MaterialStore) -> None:
+    layer = "导数描述函数在某一点的瞬时变化率。" * 20
+    (store.path("mat_demo") / "pages" / "page-0002.txt").write_text(layer, "utf-8")
+    service = CaptioningService(FakeVisionClient(), store, pages_per_request=10, concurrency=1, min_text_chars=200)
+
+    await service.caption_material("mat_demo")
+    rerun = await service.caption_material("mat_demo")
+
+    texts = store.list_chunks("mat_demo", type="text")
+    assert [(c["chunkId"], c["page"]) for c in texts] == [("mat_demo:text:p0002", 2)]
+    assert texts[0]["text"] == layer
+    assert rerun.already_done == 7 and rerun.skipped_text == 0
+
+    indexer = MaterialIndexer(store, CharEmbedder(), model="emb-test")
+    await indexer.reindex("mat_demo")
+    hits = await indexer.search("mat_demo", "导数 瞬时变化率", top_k=1)
+    assert hits[0]["chunkId"] == "mat_demo:text:p0002"
+
+
+async def test_caption_material_resumes_from_checkpoint(store: MaterialStore) -> None:
+    store.append_chunks(
+        "mat_demo",
+        [{"chunkId": "c1", "type": "caption", "page": 1, "text": "done"}],
+    )
+    client = FakeVisionClient()
+    service = CaptioningService(client, store, pages_per_request=10, concurrency=1, min_text_chars=200)
+
+    report = await service.caption_material("mat_demo")
+
+    assert client.requested == [[3, 4, 5, 6, 7]]
+    assert report.already_done == 1
+
+    async with AsyncClient(app=app, base_url="http://testserver") as http:
+        response = await http.get("/api/materials/mat_demo/chunks", params={"type": "caption"})
+    payload = response.json()["data"]
+    assert payload["pagination"]["total"] == 6
+    assert [item["page"] for item in payload["items"]] == [1, 3, 4, 5, 6, 7]
@@ -0,0 +1,100 @@
+import numpy as np
+from httpx import AsyncClient
+
+from app.main import app
+from app.services.dedup import DedupService, MinHasher
+from app.services.material_store import MaterialStore
+
+TEMPLATE = "北京大学 高等数学（上）第三章 导数与微分 主讲教师：张老师 课程邮箱 calc@pku.edu.cn"
+EXCERPT = (
+    "导数的定义：设函数 y=f(x) 在点 x0 的某个邻域内有定义，当自变量 x 在 x0 处取得增量 Δx 时，"
+    "相应地函数取得增量 Δy；如果 Δy 与 Δx 之比当 Δx→0 时的极限存在，则称函数在点 x0 处可导。"
+)
+
+
+def _jaccard(hasher: MinHasher, a: str, b: str) -> float:
+    sa, sb = set(hasher.shingles(a).tolist()), set(hasher.shingles(b).tolist())
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_signature_agreement_estimates_jaccard() -> None:
+    hasher = MinHasher(num_perm=256)
+    edited = EXCERPT.replace("某个邻域", "一个邻域")
+    other = "积分是微分的逆运算，牛顿—莱布尼茨公式把定积分与原函数联系起来。" * 2
+    sig = hasher.signatures([EXCERPT, f"  {EXCERPT.upper()}！", edited, other, ""])
+
+    assert (sig[0] == sig[1]).all()  # case, width and punctuation are normalized away
+    estimate = (sig[0] == sig[2]).mean()
+    assert abs(estimate - _jaccard(hasher, EXCERPT, edited)) < 0.1
+    assert (sig[0] == sig[3]).mean() < 0.1
+    assert (sig[4] == np.iinfo(np.uint32).max).all()
+
+
+def _material(store: MaterialStore, material_id: str, course: str | None, texts: list[str]) -> None:
+    store.path(material_id).mkdir()
+    store.write_meta(material_id, courseId=course)
+    store.append_chunks(
+        material_id,
+        [
+            {
+                "chunkId": f"{material_id}:caption:p{page:04d}",
+                "materialId": material_id,
+                "type": "caption",
+                "page": page,
+                "text": text,
+            }
+            for page, text in enumerate(texts, start=1)
+        ],
+    )
+
+
+async def test_marks_template_and_copied_chunks_per_course(store) -> None:
+    service = DedupService(store, threshold=0.8)
+    _material(store, "mat_deck", "calc", [TEMPLATE, EXCERPT, TEMPLATE + " 第2页", "极限的ε-δ定义与几个例题的详细推导过程"])
+    _material(store, "mat_handout", "calc", ["课后练习：求 f(x)=x² 在 x=1 处的导数", EXCERPT + "。"])
+    _material(store, "mat_other", "bio", [EXCERPT])
+
+    deck = service.dedupe_material("mat_deck")
+    handout = service.dedupe_material("mat_handout")
+    other = service.dedupe_material("mat_other")
+
+    assert deck.to_dict() == {"chunks": 4, "duplicates": 1, "withinMaterial": 1, "crossMaterial": 0, "ratio": 0.25}
+    assert (handout.duplicates, handout.cross_material) == (1, 1)
+    assert other.duplicates == 0  # other courses are never compared
+
+    copied = store.list_chunks("mat_handout")[1]
+    assert copied["duplicateOf"] == "mat_deck:caption:p0002" and copied["similarity"] >= 0.8
+    assert store.list_chunks("mat_deck")[2]["duplicateOf"] == "mat_deck:caption:p0001"
+
+    # a fresh service (another worker) rebuilds the course index from disk;
+    # deleted materials drop out of it
+    store.path("mat_deck").rename(store.root / ".trash")
+    assert DedupService(store).dedupe_material("mat_handout").duplicates == 0
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get("/api/materials/mat_deck2/chunks")
+        assert response.status_code == 404
+        _material(store, "mat_deck2", "calc", [TEMPLATE, TEMPLATE])
+        service.dedupe_material("mat_deck2")
+        unique = (await client.get("/api/materials/mat_deck2/chunks", params={"includeDuplicates": "false"})).json()
+
+    assert [c["page"] for c in unique["data"]["items"]] == [1]
+
+
+async def test_course_index_stays_bounded_across_reparses_and_deletes(store) -> None:
+    service = DedupService(store, threshold=0.8)
+    _material(store, "mat_deck", "calc", [TEMPLATE, EXCERPT, "极限的ε-δ定义与几个例题的详细推导过程"])
+    _material(store, "mat_handout", "calc", ["课后练习：求 f(x)=x² 在 x=1 处的导数"])
+
+    for _ in range(20):
+        service.dedupe_material("mat_deck")
+        service.dedupe_material("mat_handout")
+
+    index = service._indexes["calc"]
+    assert len(index) == 4
+    assert index.slots <= 2 * len(index)
+
+    store.path("mat_deck").rename(store.root / ".trash")
+    assert service.dedupe_material("mat_handout").duplicates == 0
+    assert index.materials() == {"mat_handout"}
+    assert service._course_members("calc") == {"mat_handout"}
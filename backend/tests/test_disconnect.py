@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+
+from app.clients.base import LLMClient, LLMStreamChunk
+from app.core.metrics import STREAM_ABANDONED, STREAM_ABANDONED_TOKENS
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.stream_buffer import get_stream_registry
+
+
+class SlowStreamClient(LLMClient):
+    def __init__(self, tokens: int | None = None) -> None:
+        self.tokens = tokens
+        self.calls = 0
+        self.closed = asyncio.Event()
+
+    async def generate(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+
+    async def stream(self, messages, *, options=None):
+        self.calls += 1
+        try:
+            index = 0
+            while self.tokens is None or index < self.tokens:
+                yield LLMStreamChunk(type="content", content=f"t{index}", model="fake")
+                index += 1
+                await asyncio.sleep(0.002)
+            yield LLMStreamChunk(type="end", model="fake")
+        finally:
+            self.closed.set()
+
+
+@pytest.fixture
+def fake_client():
+    def install(client: LLMClient) -> LLMClient:
+        app.dependency_overrides[get_llm_service] = lambda: LLMService(client=client)
+        return client
+
+    yield install
+    app.dependency_overrides.clear()
+
+
+async def _call(
+    path: str,
+    body: dict,
+    *,
+    disconnect_after: int | None = None,
+    headers: list[tuple[bytes, bytes]] = (),
+) -> list[tuple[str | None, dict]]:
+    """Drive the app over raw ASGI; optionally disconnect after a few token events."""
+    raw = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode()), *headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    events: list[tuple[str | None, dict]] = []
+    enough = asyncio.Event()
+    body_sent = False
+
+    async def receive() -> dict:
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await enough.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.body" and message.get("body"):
+            event_id = None
+            for line in message["body"].decode().splitlines():
+                if line.startswith("id: "):
+                    event_id = line[len("id: ") :]
+                elif line.startswith("data: "):
+                    events.append((event_id, json.loads(line[len("data: ") :])))
+                    event_id = None
+            tokens = sum(e["type"] == "token" for _, e in events)
+            if disconnect_after is not None and tokens >= disconnect_after:
+                enough.set()
+        # a slow client: the disconnect lands while the generator waits at ``yield``
+        await asyncio.sleep(0.005)
+
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    return events
+
+
+async def test_disconnect_cancels_upstream_and_counts_abandoned_tokens(fake_client, monkeypatch) -> None:
+    monkeypatch.setattr(get_stream_registry(), "grace_seconds", 0)
+    client = fake_client(SlowStreamClient())
+    before_streams = STREAM_ABANDONED.value("qa_instant")
+    before_tokens = STREAM_ABANDONED_TOKENS.value("qa_instant")
+
+    events = await _call("/api/qa/instant", {"message": "hi"}, disconnect_after=3)
+
+    # the upstream generator is closed by the time the response returns, not on GC
+    assert client.closed.is_set()
+    assert events[0][1]["type"] == "start"
+    assert all(e["type"] != "end" for _, e in events)
+    assert STREAM_ABANDONED.value("qa_instant") == before_streams + 1
+    assert STREAM_ABANDONED_TOKENS.value("qa_instant") >= before_tokens + 3
+
+
+async def test_reconnect_with_last_event_id_resumes_running_generation(fake_client) -> None:
+    client = fake_client(SlowStreamClient(tokens=20))
+
+    first = await _call("/api/qa/instant", {"message": "hi"}, disconnect_after=3)
+    message_id = first[0][1]["messageId"]
+    assert message_id.startswith("msg_") and message_id != "msg_stub"
+    last_id = first[-1][0]
+    # event IDs are resume tokens, not derivable from the displayed message ID
+    assert last_id.startswith("rs_") and message_id not in last_id
+
+    second = await _call(
+        "/api/qa/instant", {"message": "hi"}, headers=[(b"last-event-id", last_id.encode())]
+    )
+
+    # one upstream generation served both connections, without gaps or repeats
+    assert client.calls == 1
+    seqs = [int(event_id.rsplit(":", 1)[1]) for event_id, _ in first + second]
+    assert seqs == list(range(1, len(seqs) + 1))
+    tokens = [e["content"] for _, e in first + second if e["type"] == "token"]
+    assert tokens == [f"t{i}" for i in range(20)]
+    assert second[-1][1]["type"] == "end" and second[-1][1]["messageId"] == message_id
+
+    # knowing the message ID is not enough to read someone else's answer
+    guessed = await _call(
+        "/api/qa/instant", {"message": "hi"}, headers=[(b"last-event-id", f"{message_id}:1".encode())]
+    )
+    assert client.calls == 2
+    assert guessed[0][1]["messageId"] != message_id
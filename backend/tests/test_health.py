@@ -1,7 +1,17 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
 import pytest
 from httpx import AsyncClient
 
+from app.clients.base import LLMClient
 from app.main import app
+from app.services.llm_service import LLMService
+from app.services.warmup import Warmup
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
 
 
 @pytest.mark.asyncio
@@ -10,3 +20,61 @@ async def test_health_endpoint_returns_ok() -> None:
         response = await client.get("/api/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
+
+
+class WarmableClient(LLMClient):
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.warmed: list[int] = []
+
+    async def generate(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+
+    async def stream(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+        yield ""
+
+    async def warm(self, connections: int = 1) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise httpx.ConnectError("connection refused")
+        self.warmed.append(connections)
+
+
+async def test_ready_turns_200_only_after_warmup(monkeypatch) -> None:
+    client = WarmableClient(failures=1)
+    monkeypatch.setattr("app.services.warmup.get_llm_service", lambda: LLMService(client=client))
+    warmup = Warmup(connections=3, timeout_seconds=5)
+    monkeypatch.setattr("app.api.routes.health.get_warmup", lambda: warmup)
+
+    async with AsyncClient(app=app, base_url="http://testserver") as http:
+        before = await http.get("/api/health/ready")
+        await warmup.run()
+        after = await http.get("/api/health/ready")
+
+    assert before.status_code == 503
+    assert before.json()["status"] == "warming"
+    assert after.status_code == 200
+    body = after.json()
+    assert (body["status"], body["degraded"]) == ("ready", False)
+    assert client.warmed == [3]
+    assert body["steps"]["llm"]["attempts"] == 2
+    assert body["steps"]["imports"]["status"] == "ok"
+    # no EMB_* configured: nothing to warm or map
+    assert body["steps"]["embeddings"]["status"] == body["steps"]["indexes"]["status"] == "skipped"
+
+
+async def test_unreachable_provider_turns_ready_degraded_after_timeout(monkeypatch) -> None:
+    monkeypatch.setattr("app.services.warmup.get_llm_service", lambda: LLMService(client=WarmableClient(failures=99)))
+    warmup = Warmup(timeout_seconds=0.2)
+
+    await warmup.run()
+
+    assert warmup.ready and warmup.degraded
+    assert warmup.snapshot()["steps"]["llm"]["error"] == "connection refused"
+
+
+def test_app_import_defers_numpy() -> None:
+    code = "import sys, app.main; print(any(name.startswith('numpy.') for name in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=BACKEND_DIR)
+    assert out.stdout.strip() == "False"
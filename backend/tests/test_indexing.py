@@ -0,0 +1,135 @@
+import asyncio
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+
+from app.clients.embedding_client import EmbeddingClient
+from app.core.config import settings
+from app.main import app
+from app.services.indexing import MaterialIndexer, get_material_indexer
+from app.services.material_store import INDEX_DIR, MaterialStore
+
+
+class CountingEmbedder(EmbeddingClient):
+    """Bag-of-characters vectors; remembers which texts were embedded."""
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.gate: dict[str, asyncio.Event] = {}
+
+    async def embed(self, texts):
+        for text in texts:
+            if text in self.gate:
+                await self.gate[text].wait()
+        self.texts.extend(texts)
+        vectors = np.zeros((len(texts), 512), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % 512] += 1.0
+        return vectors.tolist()
+
+
+@pytest.fixture
+def store(store: MaterialStore) -> MaterialStore:
+    store.path("mat_deck").mkdir()
+    return store
+
+
+def _pages(texts: dict[int, str]) -> list[dict]:
+    return [
+        {"chunkId": f"mat_deck:caption:p{page:04d}", "materialId": "mat_deck", "page": page, "text": text}
+        for page, text in texts.items()
+    ]
+
+
+TOPICS = ["导数定义", "链式法则", "隐函数求导", "洛必达法则"]
+PAGES = {page: f"第{page}页：{topic}" for page, topic in enumerate(TOPICS, start=1)}
+
+
+async def test_reindex_embeds_only_changed_chunks_and_tombstones_removed(store) -> None:
+    embedder = CountingEmbedder()
+    indexer = MaterialIndexer(store, embedder, model="emb-test")
+    store.append_chunks("mat_deck", _pages(PAGES))
+    first = await indexer.reindex("mat_deck")
+    assert (first.version, first.embedded, first.live) == (1, 4, 4)
+
+    # page 2 re-captioned, page 4 gone, page 5 added, page 6 repeats page 1's text
+    changed = {**PAGES, 2: "第2页：链式法则与复合函数", 5: "第5页：泰勒公式", 6: PAGES[1]}
+    del changed[4]
+    store.rewrite_chunks("mat_deck", _pages(changed))
+    embedder.texts.clear()
+    second = await indexer.reindex("mat_deck")
+
+    assert embedder.texts == ["第2页：链式法则与复合函数", "第5页：泰勒公式"]
+    assert second.to_dict() == {
+        "version": 2,
+        "embedded": 2,
+        "reused": 3,
+        "tombstoned": 2,
+        "live": 5,
+        "compacted": False,
+        "unchanged": False,
+    }
+    current = indexer.load("mat_deck")
+    assert current.live.tolist() == [True, False, True, False, True, True, True]
+    assert (await indexer.reindex("mat_deck")).unchanged
+
+    # a fresh process reads the swapped version; old versions are pruned
+    reader = MaterialIndexer(store, CountingEmbedder(), model="emb-test")
+    hits = await reader.search("mat_deck", "泰勒公式", top_k=2)
+    assert hits[0]["chunkId"] == "mat_deck:caption:p0005"
+    assert all(hit["chunkId"] != "mat_deck:caption:p0004" for hit in await reader.search("mat_deck", "洛必达", 10))
+    assert sorted(p.name for p in (store.path("mat_deck") / INDEX_DIR).glob("v*.np?")) == [
+        "v000001.npy",
+        "v000001.npz",
+        "v000002.npy",
+        "v000002.npz",
+    ]
+    # vectors are mapped, not read; preload maps recently used materials at startup
+    assert isinstance(reader.load("mat_deck").vectors, np.memmap)
+    assert MaterialIndexer(store, CountingEmbedder(), model="emb-test").preload(8) == 1
+
+
+async def test_only_duplicates_within_the_material_are_left_out(store) -> None:
+    embedder = CountingEmbedder()
+    indexer = MaterialIndexer(store, embedder, model="emb-test")
+    chunks = _pages({1: PAGES[1], 2: PAGES[2], 3: PAGES[1]})
+    chunks[1]["duplicateOf"] = "mat_textbook:text:p0042"
+    chunks[2]["duplicateOf"] = "mat_deck:caption:p0001"
+    store.append_chunks("mat_deck", chunks)
+
+    report = await indexer.reindex("mat_deck")
+
+    assert (report.embedded, report.live) == (2, 2)
+    assert (await indexer.search("mat_deck", "链式法则", top_k=1))[0]["chunkId"] == "mat_deck:caption:p0002"
+
+
+async def test_search_keeps_serving_the_old_version_during_reindex(store, monkeypatch) -> None:
+    embedder = CountingEmbedder()
+    indexer = MaterialIndexer(store, embedder, model="emb-test")
+    store.append_chunks("mat_deck", _pages(PAGES))
+    await indexer.reindex("mat_deck")
+    monkeypatch.setattr(settings, "emb_base_url", "http://embeddings.test")
+    monkeypatch.setattr(settings, "emb_model", "emb-test")
+    get_material_indexer.cache_clear()
+    monkeypatch.setattr("app.services.indexing.build_embedding_client", lambda: embedder)
+
+    store.rewrite_chunks("mat_deck", _pages({1: "第1页：全新的内容"}))
+    release = embedder.gate["第1页：全新的内容"] = asyncio.Event()
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        accepted = (await client.post("/api/materials/mat_deck/index")).json()["data"]
+        await asyncio.sleep(0.01)
+        during = (await client.get("/api/materials/mat_deck/search", params={"q": "链式法则"})).json()["data"]
+        release.set()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if get_material_indexer().manifest("mat_deck")["version"] == 2:
+                break
+        after = (await client.get("/api/materials/mat_deck/search", params={"q": "链式法则"})).json()["data"]
+    get_material_indexer.cache_clear()
+
+    assert accepted == {"accepted": True, "version": 1}
+    assert during["version"] == 1 and during["items"][0]["chunkId"] == "mat_deck:caption:p0002"
+    assert after["version"] == 2
+    assert [item["chunkId"] for item in after["items"]] == ["mat_deck:caption:p0001"]
@@ -0,0 +1,42 @@
+from httpx import AsyncClient
+
+from app.core.metrics import Histogram, StreamMeter
+from app.main import app
+
+
+async def test_metrics_endpoint_reports_route_templates() -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        await client.get("/api/health")
+        await client.get("/api/materials/does-not-exist")
+        response = await client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    # route labels are templates; older FastAPI versions include the /api prefix
+    assert '/health",status="200"}' in body
+    assert '/materials/{material_id}",status="404"}' in body
+    assert "aiedu_http_request_duration_seconds_bucket" in body
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = Histogram("demo_seconds", "demo", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value, "/x")
+
+    lines = list(histogram.render())
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+
+
+def test_stream_meter_observes_ttft_once() -> None:
+    meter = StreamMeter("unit_test")
+    meter.token()
+    meter.token()
+    meter.finish({"completion_tokens": 10})
+    from app.core.metrics import STREAM_TOKENS_PER_SECOND, STREAM_TTFT
+
+    assert STREAM_TTFT.count("unit_test") == 1
+    assert STREAM_TOKENS_PER_SECOND.count("unit_test") == 1
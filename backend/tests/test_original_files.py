@@ -0,0 +1,91 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.core.files import LocalFileResponse
+from app.main import app
+from app.services import signed_urls
+
+CONTENT = bytes(range(256)) * 40  # 10 KiB
+
+
+@pytest.fixture
+def material(tmp_path, monkeypatch) -> str:
+    monkeypatch.setattr(settings, "storage_tmp_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "local_url_secret", None)
+    signed_urls._signing_key.cache_clear()
+    (tmp_path / "mat_video").mkdir()
+    (tmp_path / "mat_video" / "lecture.mp4").write_bytes(CONTENT)
+    yield "mat_video"
+    signed_urls._signing_key.cache_clear()
+
+
+async def _signed_url(client: AsyncClient, material_id: str) -> str:
+    response = await client.get(f"/api/materials/{material_id}/original-url")
+    assert response.status_code == 200
+    return response.json()["data"]["url"]
+
+
+async def test_signed_url_serves_ranges_and_conditional_requests(material, tmp_path) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        url = await _signed_url(client, material)
+        full = await client.get(url)
+        single = await client.get(url, headers={"Range": "bytes=100-199"})
+        suffix = await client.get(url, headers={"Range": "bytes=-10"})
+        multi = await client.get(url, headers={"Range": "bytes=0-9, 20-29"})
+        not_modified = await client.get(url, headers={"If-None-Match": full.headers["etag"]})
+        missing = await client.get("/api/materials/mat_missing/original-url")
+
+    assert (tmp_path / ".url_signing_key").exists()
+    assert full.status_code == 200 and full.content == CONTENT
+    assert full.headers["content-type"] == "video/mp4"
+    assert full.headers["content-disposition"].startswith("inline")
+    assert full.headers["accept-ranges"] == "bytes"
+    assert single.status_code == 206 and single.content == CONTENT[100:200]
+    assert single.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert suffix.content == CONTENT[-10:]
+    assert multi.status_code == 206
+    assert multi.headers["content-type"].startswith("multipart/byteranges")
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["etag"] == full.headers["etag"]
+    assert missing.status_code == 404
+
+
+async def test_tampered_or_expired_signatures_are_rejected(material) -> None:
+    expires, signature = signed_urls.issue(material)
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        tampered = await client.get(
+            f"/api/materials/{material}/original", params={"expires": expires + 60, "signature": signature}
+        )
+        stale = signed_urls.sign(material, 1)
+        expired = await client.get(f"/api/materials/{material}/original", params={"expires": 1, "signature": stale})
+
+    assert tampered.status_code == 403
+    assert expired.status_code == 403
+
+
+async def test_zero_copy_send_when_the_server_offers_it(material, tmp_path) -> None:
+    path = tmp_path / material / "lecture.mp4"
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": [(b"range", b"bytes=1000-")],
+        "extensions": {"http.response.zerocopysend": {}},
+    }
+    messages = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "body": os.pread(message["file"], message["count"], message["offset"])}
+        messages.append(message)
+
+    await LocalFileResponse(path)(scope, None, send)
+
+    start, body = messages
+    headers = dict(start["headers"])
+    assert start["status"] == 206
+    assert headers[b"content-range"] == f"bytes 1000-{len(CONTENT) - 1}/{len(CONTENT)}".encode()
+    assert headers[b"content-length"] == str(len(CONTENT) - 1000).encode()
+    assert body["body"] == CONTENT[1000:]
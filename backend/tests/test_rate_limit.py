@@ -0,0 +1,158 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult, LLMStreamChunk
+from app.core.config import settings
+from app.core.metrics import record_usage
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.rate_limit import get_rate_limiter
+
+
+class MeteredClient(LLMClient):
+    """Reports ``usage`` like the OpenAI client does after each call."""
+
+    usage = {"prompt_tokens": 400, "completion_tokens": 600, "total_tokens": 1000}
+
+    async def generate(self, messages, *, options=None):
+        record_usage("fake", "fake", self.usage)
+        return LLMGenerationResult(content="ok", model="fake", usage=self.usage)
+
+    async def stream(self, messages, *, options=None):
+        yield LLMStreamChunk(type="content", content="ok", model="fake")
+        record_usage("fake", "fake", self.usage)
+        yield LLMStreamChunk(type="end", usage=self.usage, model="fake")
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    def configure(**values):
+        monkeypatch.setattr(settings, "rate_limit_enabled", True)
+        monkeypatch.setattr(settings, "rate_limit_burst_seconds", 1)
+        for name, value in values.items():
+            monkeypatch.setattr(settings, f"rate_limit_{name}", value)
+        get_rate_limiter.cache_clear()
+
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=MeteredClient())
+    yield configure
+    app.dependency_overrides.clear()
+    get_rate_limiter.cache_clear()
+
+
+def _batch(user: str) -> dict:
+    return {"json": {"items": [{"prompt": f"hi {user}"}]}, "headers": {"X-User-Id": user}}
+
+
+async def test_request_bucket_rejects_with_retry_after(limits) -> None:
+    limits(user_rpm=120, user_tpm=0)  # 2 req/s, bucket of 2
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        statuses = [(await client.post("/api/qa/batch", **_batch("alice"))).status_code for _ in range(2)]
+        rejected = await client.post("/api/qa/batch", **_batch("alice"))
+        other_user = await client.post("/api/qa/batch", **_batch("bob"))
+        # polling is not limited
+        assert (await client.get("/api/qa/batch/unknown", headers={"X-User-Id": "alice"})).status_code == 404
+
+    assert statuses == [200, 200]
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "1"
+    assert rejected.json()["error"]["code"] == "rate_limited"
+    assert rejected.json()["error"]["scope"] == "user"
+    assert other_user.status_code == 200
+
+
+async def test_token_usage_is_charged_and_reported_as_sse_error(limits) -> None:
+    limits(user_rpm=0, user_tpm=600, course_tpm=100_000)
+    headers = {"X-User-Id": "carol", "X-Course-Id": "calc"}
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        first = await client.post("/api/qa/instant", json={"message": "什么是导数"}, headers=headers)
+        second = await client.post("/api/qa/instant", json={"message": "什么是积分"}, headers=headers)
+        stats = (await client.get("/api/metrics/rate-limits", params={"scope": "user"})).json()["data"]
+
+    assert '"type": "end"' in first.text
+    # 1000 tokens against 10 tokens/s: wait ~99s for the debt to clear
+    assert second.status_code == 200
+    assert 95 <= int(second.headers["Retry-After"]) <= 100
+    event = json.loads(second.text.removeprefix("data: "))
+    assert event["type"] == "error" and event["code"] == "rate_limited" and event["reason"] == "tokens"
+
+    carol = next(item for item in stats["items"] if item["key"] == "carol")
+    assert carol["tokens"] == 1000 and carol["requests"] == 1 and carol["rejected"] == 1
+
+
+async def test_disabled_by_default() -> None:
+    assert get_rate_limiter() is None
+
+
+async def test_rotating_user_ids_still_hit_the_ip_bucket(limits) -> None:
+    limits(ip_rpm=120, ip_tpm=0, user_rpm=120, user_tpm=0)  # bucket of 2 per key
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        statuses = [(await client.post("/api/qa/batch", **_batch(f"bot{n}"))).status_code for n in range(3)]
+        rejected = await client.post("/api/qa/batch", **_batch("bot9"))
+
+    assert statuses == [200, 200, 429]
+    assert rejected.json()["error"]["scope"] == "ip"
+
+
+async def test_batch_is_charged_one_request_per_item(limits) -> None:
+    limits(ip_rpm=0, ip_tpm=0, user_rpm=120, user_tpm=0)
+    payload = {"items": [{"prompt": f"q{n}"} for n in range(5)]}
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        big = await client.post("/api/qa/batch", json=payload, headers={"X-User-Id": "dave"})
+        after = await client.post("/api/qa/batch", **_batch("dave"))
+
+    assert big.status_code == 200
+    # 5 items against a bucket of 2: 3 in debt, 4 requests' worth to wait at 2/s
+    assert after.status_code == 429
+    assert after.headers["Retry-After"] == "2"
+
+
+async def test_streamed_usage_from_the_provider_is_metered_and_charged(limits) -> None:
+    import asyncio
+
+    from httpx import ASGITransport
+
+    from benchmarks.mock_provider import MockConfig, create_mock_app
+    from app.clients.openai_client import OpenAIClient
+    from app.core.metrics import TOKENS_USED
+
+    mock = create_mock_app(MockConfig(latency_ms=0, tokens_per_second=1000, completion_tokens=5))
+    provider = OpenAIClient(api_key="test", model="mock-model", base_url="http://mock/v1", provider="mock")
+    provider._loop = asyncio.get_running_loop()
+    provider._http = AsyncClient(transport=ASGITransport(app=mock))
+    limits(user_rpm=0, user_tpm=100_000)
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=provider)
+    before = TOKENS_USED.value("mock", "mock-model", "completion")
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/qa/instant", json={"message": "什么是导数"}, headers={"X-User-Id": "erin"})
+        stats = (await client.get("/api/metrics/rate-limits", params={"scope": "user"})).json()["data"]
+    await provider.aclose()
+
+    assert '"type": "end"' in response.text
+    assert TOKENS_USED.value("mock", "mock-model", "completion") == before + 5
+    erin = next(item for item in stats["items"] if item["key"] == "erin")
+    assert erin["tokens"] > 5
+
+
+async def test_shared_window_rejection_does_not_charge_earlier_keys(tmp_path, monkeypatch) -> None:
+    from app.services import rate_limit
+    from app.services.rate_limit import LimitRule, RateLimiter
+    from app.services.shared_state import SQLiteState
+
+    monkeypatch.setattr(rate_limit, "_window", lambda: 1000)
+    shared = SQLiteState(tmp_path / "state.sqlite3")
+    limiter = RateLimiter(
+        [LimitRule("ip", requests_per_minute=100), LimitRule("user", requests_per_minute=1)], shared=shared
+    )
+    identity = {"ip": "10.0.0.1", "user": "frank"}
+
+    assert (await limiter.acquire(identity)).allowed
+    for _ in range(3):
+        rejected = await limiter.acquire(identity)
+        assert (rejected.allowed, rejected.scope) == (False, "user")
+
+    assert await shared.get("rate_limit", "ip:10.0.0.1:r:1000") == 1
+    assert await shared.get("rate_limit", "user:frank:r:1000") == 1
+    await shared.aclose()
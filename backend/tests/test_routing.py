@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult, LLMStreamChunk
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.routing import ModelRoute, ModelRouter, RequestFeatures
+
+
+class NamedClient(LLMClient):
+    def __init__(self, name: str, *, first_token_delay: float = 0.0, fail: bool = False) -> None:
+        self.name = name
+        self.first_token_delay = first_token_delay
+        self.fail = fail
+        self.closed = False
+
+    async def generate(self, messages, *, options=None):
+        if self.fail:
+            raise ValueError(f"{self.name} is down")
+        return LLMGenerationResult(content=self.name, model=options.model)
+
+    async def stream(self, messages, *, options=None):
+        try:
+            await asyncio.sleep(self.first_token_delay)
+            yield LLMStreamChunk(type="content", content=self.name, model=options.model)
+            yield LLMStreamChunk(type="end", model=options.model)
+        finally:
+            self.closed = True
+
+
+def _routes(fast: NamedClient, heavy: NamedClient, **fast_kwargs) -> list[ModelRoute]:
+    return [
+        ModelRoute(name="fast", client=fast, model="small", cost=1, max_prompt_chars=50, vision=False, **fast_kwargs),
+        ModelRoute(name="heavy", client=heavy, model="large", cost=5),
+    ]
+
+
+def test_router_uses_request_features() -> None:
+    router = ModelRouter(_routes(NamedClient("fast"), NamedClient("heavy")))
+
+    short = RequestFeatures(prompt_chars=20)
+    long = RequestFeatures(prompt_chars=2000)
+    image = RequestFeatures(prompt_chars=20, attachments=True)
+
+    assert [r.name for r in router.plan(short, streaming=True)[0]] == ["fast", "heavy"]
+    assert router.plan(long, streaming=True) == ([router.routes[1]], "features")
+    assert [r.name for r in router.plan(image, streaming=False)[0]] == ["heavy"]
+
+
+async def test_generate_falls_back_on_errors_and_demotes_unhealthy_route() -> None:
+    router = ModelRouter(_routes(NamedClient("fast", fail=True), NamedClient("heavy")))
+    service = LLMService(client=router.routes[0].client, router=router)
+    messages = [{"role": "user", "content": "1+1=?"}]
+
+    for _ in range(4):
+        result = await service.generate_completion(messages)
+        assert result.content == "heavy"
+        assert result.route["fallbacks"] == [{"route": "fast", "reason": "error"}]
+
+    # enough recent failures: the cheap route is tried last now
+    routes, _ = router.plan(RequestFeatures(prompt_chars=5), streaming=False)
+    assert [r.name for r in routes] == ["heavy", "fast"]
+
+
+@pytest.fixture
+def routed_service():
+    fast = NamedClient("fast", first_token_delay=0.5)
+    heavy = NamedClient("heavy")
+    router = ModelRouter(_routes(fast, heavy, ttft_target_ms=30))
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=fast, router=router)
+    yield fast, heavy
+    app.dependency_overrides.clear()
+
+
+async def test_stream_misses_ttft_target_and_reports_routing_in_end_event(routed_service) -> None:
+    fast, _ = routed_service
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/qa/instant", json={"message": "什么是导数"})
+
+    events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+    tokens = [e["content"] for e in events if e["type"] == "token"]
+    end = events[-1]
+    assert tokens == ["heavy"]
+    assert fast.closed
+    assert end["type"] == "end"
+    assert end["routing"]["route"] == "heavy" and end["routing"]["model"] == "large"
+    assert end["routing"]["fallbacks"] == [{"route": "fast", "reason": "ttft_timeout"}]
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult, LLMStreamChunk
+from app.clients.embedding_client import EmbeddingClient
+from app.core.metrics import SEMANTIC_CACHE_AUDITS
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.semantic_cache import SemanticCache, get_semantic_cache, normalize_question
+
+
+class CharEmbedder(EmbeddingClient):
+    """Bag-of-characters vectors: paraphrases sharing characters score high."""
+
+    async def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = np.zeros(4096, dtype=np.float32)
+            for char in text:
+                vector[ord(char) % 4096] += 1.0
+            vectors.append(vector.tolist())
+        return vectors
+
+
+class CountingClient(LLMClient):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def generate(self, messages, *, options=None):
+        self.calls += 1
+        return LLMGenerationResult(content="完全不同的回答", model="fake")
+
+    async def stream(self, messages, *, options=None):
+        self.calls += 1
+        for token in ["导数", "是变化率"]:
+            yield LLMStreamChunk(type="content", content=token, model="fake")
+        yield LLMStreamChunk(type="end", model="fake")
+
+
+@pytest.fixture
+def cached_app():
+    llm = CountingClient()
+    cache = SemanticCache(CharEmbedder(), threshold=0.8)
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=llm)
+    app.dependency_overrides[get_semantic_cache] = lambda: cache
+    yield llm, cache
+    app.dependency_overrides.clear()
+
+
+async def _ask(client: AsyncClient, payload: dict) -> list[dict]:
+    response = await client.post("/api/qa/instant", json=payload)
+    return [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+
+async def test_paraphrase_is_served_from_cache_within_scope(cached_app) -> None:
+    llm, _ = cached_app
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        first = await _ask(client, {"message": "什么是导数？", "courseId": "calc"})
+        second = await _ask(client, {"message": "导数是什么意思", "courseId": "calc"})
+        other_course = await _ask(client, {"message": "导数是什么意思", "courseId": "phys"})
+        unrelated = await _ask(client, {"message": "什么是积分", "courseId": "calc"})
+
+    assert first[-1]["cache"]["hit"] is False
+    assert second[-1]["cache"]["hit"] is True and second[-1]["cache"]["exact"] is False
+    assert [e["content"] for e in second if e["type"] == "token"] == ["导数是变化率"]
+    assert other_course[-1]["cache"]["hit"] is False
+    assert unrelated[-1]["cache"]["hit"] is False
+    assert llm.calls == 3
+
+
+async def test_questions_with_history_bypass_cache(cached_app) -> None:
+    llm, cache = cached_app
+    payload = {"message": "什么是导数", "hints": {"previousMessages": [{"role": "user", "content": "我们在学微积分"}]}}
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        events = await _ask(client, payload)
+
+    assert "cache" not in events[-1]
+    assert len(cache) == 0 and llm.calls == 1
+
+
+async def test_reindexing_a_material_invalidates_its_scopes() -> None:
+    cache = SemanticCache(CharEmbedder(), threshold=0.8)
+    for materials in (["mat_a"], ["mat_a", "mat_b"], ["mat_b"]):
+        lookup = await cache.lookup("什么是导数", material_ids=materials)
+        cache.store(lookup, "答案")
+
+    assert cache.invalidate_material("mat_a") == 2
+    assert (await cache.lookup("什么是导数", material_ids=["mat_b"])).exact
+    assert not (await cache.lookup("什么是导数", material_ids=["mat_a"])).hit
+
+
+async def test_answers_cached_during_reindex_are_dropped_after_the_swap(monkeypatch) -> None:
+    from app.services import parsing
+    from app.services.indexing import IndexReport
+
+    cache = SemanticCache(CharEmbedder(), threshold=0.8)
+
+    class SlowIndexer:
+        async def reindex(self, material_id):
+            # a question answered from the old version while the job runs
+            cache.store(await cache.lookup("什么是导数", material_ids=[material_id]), "旧答案")
+            return IndexReport(version=2)
+
+    monkeypatch.setattr(parsing, "get_material_indexer", lambda: SlowIndexer())
+    monkeypatch.setattr(parsing, "get_semantic_cache", lambda: cache)
+
+    assert (await parsing.run_index("mat_a"))["version"] == 2
+    assert not (await cache.lookup("什么是导数", material_ids=["mat_a"])).hit
+
+
+async def test_lru_eviction_and_ttl() -> None:
+    cache = SemanticCache(CharEmbedder(), max_entries=2, threshold=0.99)
+    for question in ("问题一", "问题二", "问题三"):
+        cache.store(await cache.lookup(question), f"答:{question}")
+    assert len(cache) == 2
+    assert not (await cache.lookup("问题一")).hit
+
+    expired = SemanticCache(CharEmbedder(), ttl_seconds=0)
+    expired.store(await expired.lookup("问题一"), "答")
+    assert not (await expired.lookup("问题一")).hit
+    assert len(expired) == 0
+
+
+async def test_sampled_hit_with_diverging_fresh_answer_counts_false_hit() -> None:
+    cache = SemanticCache(CharEmbedder(), threshold=0.8, audit_rate=1.0, audit_threshold=0.9)
+    cache.store(await cache.lookup("什么是导数"), "导数是变化率")
+    hit = await cache.lookup("导数是什么意思")
+    before = SEMANTIC_CACHE_AUDITS.value("false_hit")
+
+    async def regenerate() -> str:
+        return "这是一个完全无关的回答"
+
+    assert cache.maybe_audit(hit, regenerate)
+    await asyncio.gather(*cache._audits)
+
+    assert SEMANTIC_CACHE_AUDITS.value("false_hit") == before + 1
+    assert not (await cache.lookup("什么是导数")).hit
+
+
+def test_normalize_question() -> None:
+    assert normalize_question("  什么是 导数？？ ") == "什么是 导数"
+    assert normalize_question("ＷＨＡＴ is a Derivative?") == "what is a derivative"
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+
+from app.clients.base import LLMGenerationResult
+from app.core.metrics import SHARED_STATE_LATENCY
+from app.services.response_cache import ResponseCache
+from app.services.shared_state import MemoryState, SQLiteState
+from app.services.stream_buffer import StreamRegistry
+
+
+def _increment(path: str, times: int) -> None:
+    async def run() -> None:
+        state = SQLiteState(path)
+        for _ in range(times):
+            await state.incr("limits", "user-1")
+        await state.aclose()
+
+    asyncio.run(run())
+
+
+def test_sqlite_state_is_shared_between_processes(tmp_path) -> None:
+    path = str(tmp_path / "state.sqlite3")
+    asyncio.run(SQLiteState(path).aclose())  # create the schema before the workers race
+    # spawn like uvicorn workers: SQLite connections must not cross a fork
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_increment, args=(path, 50)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert asyncio.run(SQLiteState(path).get("limits", "user-1")) == 150.0
+
+
+async def test_backends_share_the_same_semantics(tmp_path) -> None:
+    for state in (MemoryState(), SQLiteState(tmp_path / "state.sqlite3")):
+        await state.set("ns", "a", {"x": 1})
+        await state.set("ns", "gone", 1, ttl=0.01)
+        assert await state.get("ns", "a") == {"x": 1}
+        assert await state.incr("ns", "n", 2) == 2.0 and await state.incr("ns", "n") == 3.0
+
+        seqs = [await state.push("ns", "log", {"i": i}, max_items=3) for i in range(5)]
+        assert seqs == [1, 2, 3, 4, 5]
+        assert await state.items("ns", "log", after=3) == [(4, {"i": 3}), (5, {"i": 4})]
+        assert [seq for seq, _ in await state.items("ns", "log")] == [3, 4, 5]
+
+        await asyncio.sleep(0.02)
+        assert await state.get("ns", "gone") is None
+        await state.delete("ns", "a")
+        assert await state.get("ns", "a") is None
+        await state.aclose()
+
+    assert SHARED_STATE_LATENCY.count("sqlite", "push") >= 5
+
+
+async def test_response_cache_miss_is_served_from_another_worker(tmp_path) -> None:
+    calls = 0
+
+    async def compute() -> LLMGenerationResult:
+        nonlocal calls
+        calls += 1
+        return LLMGenerationResult(content="42", model="fake", raw={"big": "payload"})
+
+    def worker_cache() -> ResponseCache[LLMGenerationResult]:
+        # each worker opens the same database file
+        return ResponseCache(
+            shared=SQLiteState(tmp_path / "state.sqlite3"),
+            encode=lambda r: {"content": r.content, "model": r.model},
+            decode=lambda d: LLMGenerationResult(**d),
+        )
+
+    first, second = worker_cache(), worker_cache()
+    assert (await first.get_or_compute("k", compute))[1] == "miss"
+    value, source = await second.get_or_compute("k", compute)
+
+    assert source == "shared" and value.content == "42" and value.raw is None
+    assert calls == 1
+
+
+async def test_reconnect_on_another_worker_follows_the_stream(tmp_path) -> None:
+    owner = StreamRegistry(shared=SQLiteState(tmp_path / "state.sqlite3"), poll_interval=0.005)
+    other = StreamRegistry(shared=SQLiteState(tmp_path / "state.sqlite3"), poll_interval=0.005)
+    # the default backend is per process: nothing is mirrored
+    assert not await StreamRegistry(shared=MemoryState()).has_remote("msg_1")
+
+    async def events():
+        for i in range(5):
+            await asyncio.sleep(0.01)
+            yield {"type": "token", "content": str(i)}
+        yield {"type": "end"}
+
+    buffer = owner.start("msg_1", events())
+    await asyncio.sleep(0.025)
+    assert other.get("msg_1") is None and await other.has_remote("msg_1")
+
+    frames = [frame async for frame in other.follow_remote("msg_1", after=1)]
+    await buffer.task
+
+    assert frames[0].startswith("id: msg_1:2\n")
+    assert frames[-1] == 'id: msg_1:6\ndata: {"type": "end"}\n\n'
+    assert len(frames) == 5
+
+
+class CountingState(SQLiteState):
+    def __init__(self, path) -> None:
+        super().__init__(path)
+        self.pushes = 0
+
+    def _push(self, namespace, key, values, max_items, ttl):
+        self.pushes += 1
+        return super()._push(namespace, key, values, max_items, ttl)
+
+
+async def test_mirror_writes_are_batched_off_the_token_path(tmp_path) -> None:
+    state = CountingState(tmp_path / "state.sqlite3")
+    owner = StreamRegistry(shared=state, mirror_interval=0.01, mirror_batch=50)
+    other = StreamRegistry(shared=SQLiteState(tmp_path / "state.sqlite3"), poll_interval=0.005)
+
+    async def events():
+        for i in range(200):
+            if i % 20 == 0:
+                await asyncio.sleep(0)
+            yield {"type": "token", "content": str(i)}
+        yield {"type": "end"}
+
+    buffer = owner.start("msg_2", events())
+    await buffer.task
+    frames = [frame async for frame in other.follow_remote("msg_2")]
+
+    # 201 events in a handful of transactions, replayed in order with their seqs
+    assert state.pushes <= 10
+    assert len(frames) == 201
+    assert frames[0].startswith("id: msg_2:1\n") and frames[-1].startswith("id: msg_2:201\n")
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.material_store import MaterialStore
+from app.services.storage_lifecycle import TRASH_DIR, StorageLifecycle, get_storage_lifecycle
+
+DAY = 86400
+NOTES = "导数描述函数的瞬时变化率。\n" * 500  # ~20 KB
+
+
+def _material(
+    store: MaterialStore,
+    material_id: str,
+    *,
+    course: str,
+    name: str,
+    content: bytes | str,
+    idle_days: float,
+    status: str | None = "ready",
+) -> None:
+    base = store.path(material_id)
+    base.mkdir()
+    data = content.encode() if isinstance(content, str) else content
+    (base / name).write_bytes(data)
+    store.write_meta(material_id, courseId=course)
+    if status:
+        store.write_status(material_id, status)
+    used = time.time() - idle_days * DAY
+    os.utime(base, (used, used))
+
+
+async def _drain(lifecycle: StorageLifecycle) -> None:
+    if lifecycle._purge_task is not None:
+        await lifecycle._purge_task
+
+
+async def test_sweep_expires_evicts_and_compresses(store) -> None:
+    _material(store, "mat_failed", course="calc", name="a.pdf", content=b"x" * 100, idle_days=2, status="failed")
+    _material(store, "mat_stale", course="calc", name="b.mp4", content=b"x" * 100, idle_days=40)
+    _material(store, "mat_old", course="bio", name="c.png", content=b"x" * 20_000, idle_days=5)
+    _material(store, "mat_new", course="bio", name="d.png", content=b"x" * 20_000, idle_days=1)
+    _material(store, "mat_busy", course="bio", name="e.png", content=b"x" * 20_000, idle_days=9, status="processing")
+    _material(store, "mat_notes", course="calc", name="notes.txt", content=NOTES, idle_days=10)
+    lifecycle = StorageLifecycle(
+        store,
+        course_quota_bytes=50_000,
+        ttl_seconds=30 * DAY,
+        abandoned_seconds=DAY,
+        cold_seconds=7 * DAY,
+        delete_batch=2,
+    )
+
+    report = await lifecycle.sweep()
+    await _drain(lifecycle)
+
+    assert report.evicted == {"abandoned": 1, "ttl": 1, "course_quota": 1}
+    remaining = sorted(p.name for p in store.root.iterdir() if not p.name.startswith("."))
+    assert remaining == ["mat_busy", "mat_new", "mat_notes"]
+    assert list((store.root / TRASH_DIR).iterdir()) == []
+
+    # compressed in place, idle clock untouched, restored on first use
+    assert report.compressed == 1 and report.compressed_saved_bytes > 0
+    assert store.original_file("mat_notes") is None
+    assert store.cold_file("mat_notes").name == "notes.txt.gz"
+    assert time.time() - store.path("mat_notes").stat().st_mtime > 9 * DAY
+    restored = await asyncio.gather(*(lifecycle.restore("mat_notes") for _ in range(3)))
+    assert {path.name for path in restored} == {"notes.txt"}
+    assert restored[0].read_text("utf-8") == NOTES
+    assert store.cold_file("mat_notes") is None and store.read_meta("mat_notes")["tier"] == "hot"
+
+
+async def test_upload_quota_delete_and_usage_report(store, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "storage_course_quota_mb", 1)
+    half = b"x" * (600 * 1024)
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        first = await client.post("/api/materials", files={"file": ("a.pdf", half)}, data={"courseId": "calc"})
+        second = await client.post("/api/materials", files={"file": ("b.pdf", half)}, data={"courseId": "calc"})
+        other = await client.post("/api/materials", files={"file": ("c.pdf", half)}, data={"courseId": "bio"})
+        material_id = first.json()["data"]["materialId"]
+        detail = (await client.get(f"/api/materials/{material_id}")).json()["data"]
+        usage = (await client.get("/api/metrics/storage")).json()["data"]
+
+        deleted = await client.delete(f"/api/materials/{other.json()['data']['materialId']}")
+        listed = (await client.get("/api/materials")).json()["data"]["items"]
+        await _drain(get_storage_lifecycle())
+
+    assert first.status_code == 200 and other.status_code == 200
+    assert second.status_code == 507
+    assert detail["courseId"] == "calc" and detail["mime"] == "application/pdf"
+    courses = {row["courseId"]: row for row in usage["courses"]}
+    assert courses["calc"]["materials"] == 1 and courses["calc"]["quotaBytes"] == 1024 * 1024
+    assert usage["materials"] == 2
+    assert next(row for row in usage["types"] if row["type"] == "pdf")["bytes"] == 2 * len(half)
+
+    assert deleted.status_code == 200
+    assert [item["materialId"] for item in listed] == [material_id]
+    assert list((store.root / TRASH_DIR).iterdir()) == []
+
+
+async def test_ttl_is_off_by_default_and_viewing_a_material_counts_as_use(store) -> None:
+    _material(store, "mat_course", course="calc", name="a.pdf", content=b"x" * 100, idle_days=400)
+    lifecycle = get_storage_lifecycle()
+    assert lifecycle.ttl_seconds == 0
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        assert (await client.get("/api/materials/mat_course")).status_code == 200
+
+    assert time.time() - store.path("mat_course").stat().st_mtime < 60
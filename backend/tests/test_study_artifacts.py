@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMGenerationResult
+from app.main import app
+from app.services.llm_service import LLMService
+from app.services.material_store import MaterialStore
+from app.services.study_artifacts import MAP_PROMPT, StudyArtifactService
+
+
+class NotesClient(LLMClient):
+    """Answers map calls with JSON notes and reduce calls per artifact kind."""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate(self, messages, *, options=None):
+        system, user = messages[0]["content"], messages[1]["content"]
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if system == MAP_PROMPT:
+            self.calls.append("map")
+            content = json.dumps({"summary": user[:20], "topics": [user[:8]], "questions": []}, ensure_ascii=False)
+        elif "练习题" in system:
+            self.calls.append("questions")
+            content = '```json\n{"questions": [{"question": "什么是导数？", "answer": "变化率", "difficulty": "easy"}]}\n```'
+        elif "大纲" in system:
+            self.calls.append("outline")
+            content = "- 导数\n  - 链式法则"
+        else:
+            self.calls.append("summary")
+            content = "本资料介绍导数。"
+        return LLMGenerationResult(content=content)
+
+    async def stream(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+        yield ""
+
+
+@pytest.fixture
+def store(store: MaterialStore) -> MaterialStore:
+    store.path("mat_calc").mkdir()
+    return store
+
+
+def _chunks(count: int, prefix: str = "第{page}页：导数与微分的基本概念") -> list[dict]:
+    return [
+        {
+            "chunkId": f"mat_calc:text:p{page:04d}",
+            "materialId": "mat_calc",
+            "page": page,
+            "text": prefix.format(page=page) + "。" * 300,
+        }
+        for page in range(1, count + 1)
+    ]
+
+
+async def test_generate_maps_windows_concurrently_and_skips_unchanged_content(store) -> None:
+    client = NotesClient()
+    service = StudyArtifactService(store, LLMService(client=client), map_chars=1000, concurrency=3)
+    store.append_chunks("mat_calc", _chunks(8))
+
+    report = await service.generate("mat_calc")
+
+    # 8 chunks of ~315 chars -> 3 per window -> 3 map calls, then one reduce per kind
+    assert (report.status, report.map_calls, report.reduce_calls) == ("generated", 3, 3)
+    assert sorted(client.calls[3:]) == ["outline", "questions", "summary"]
+    assert 1 < client.peak <= 3
+    record = service.read("mat_calc")
+    assert record["contentHash"] == service.current_hash("mat_calc")
+    assert record["items"]["questions"]["items"] == [
+        {"question": "什么是导数？", "answer": "变化率", "difficulty": "easy"}
+    ]
+    assert record["items"]["outline"]["content"].startswith("- 导数")
+
+    client.calls.clear()
+    assert (await service.generate("mat_calc")).status == "unchanged"
+    assert client.calls == []
+
+
+class LongNotesClient(NotesClient):
+    """Map calls return notes longer than half a window, so one note never fits twice."""
+
+    async def generate(self, messages, *, options=None):
+        result = await super().generate(messages, options=options)
+        if messages[0]["content"] == MAP_PROMPT:
+            return LLMGenerationResult(content="笔" * 3500)
+        return result
+
+
+async def test_collapse_terminates_when_notes_do_not_shrink(store) -> None:
+    client = LongNotesClient()
+    service = StudyArtifactService(store, LLMService(client=client), map_chars=6000, concurrency=4)
+    store.append_chunks("mat_calc", _chunks(40))
+
+    report = await asyncio.wait_for(service.generate("mat_calc"), timeout=5)
+
+    # 40 chunks -> 3 windows -> 3 notes of 3500 chars; collapse packs 2 per window: 3 -> 2 -> 1
+    assert (report.status, report.map_calls, report.reduce_calls) == ("generated", 6, 3)
+
+
+async def test_duplicates_of_other_materials_still_count_as_content(store) -> None:
+    service = StudyArtifactService(store, LLMService(client=NotesClient()))
+    chunks = _chunks(3)
+    chunks[1]["duplicateOf"] = "mat_textbook:text:p0007"
+    chunks[2]["duplicateOf"] = "mat_calc:text:p0001"
+    store.append_chunks("mat_calc", chunks)
+
+    assert service.texts("mat_calc") == [chunks[0]["text"], chunks[1]["text"]]
+
+
+async def test_artifacts_endpoint_serves_ready_items_and_reports_stale_after_reparse(store, monkeypatch) -> None:
+    client = NotesClient()
+    service = StudyArtifactService(store, LLMService(client=client), map_chars=1000)
+    monkeypatch.setattr("app.api.routes.materials.get_study_artifact_service", lambda: service)
+    monkeypatch.setattr("app.services.parsing.get_study_artifact_service", lambda: service)
+    store.append_chunks("mat_calc", _chunks(2))
+
+    async with AsyncClient(app=app, base_url="http://testserver") as http:
+        missing = (await http.get("/api/materials/mat_calc/artifacts")).json()["data"]
+        assert (await http.post("/api/materials/mat_calc/artifacts")).status_code == 202
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if service.read("mat_calc"):
+                break
+        ready = (await http.get("/api/materials/mat_calc/artifacts", params={"kind": "summary"})).json()["data"]
+
+        store.rewrite_chunks("mat_calc", _chunks(2, prefix="第{page}页：积分"))
+        stale = (await http.get("/api/materials/mat_calc/artifacts")).json()["data"]
+        unknown = await http.get("/api/materials/mat_nope/artifacts")
+
+    assert (missing["status"], missing["items"]) == ("missing", {})
+    assert ready["status"] == "ready"
+    assert list(ready["items"]) == ["summary"]
+    assert ready["items"]["summary"]["content"] == "本资料介绍导数。"
+    assert (stale["status"], stale["items"]) == ("stale", {})
+    assert unknown.status_code == 404
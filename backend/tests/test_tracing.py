@@ -0,0 +1,83 @@
+import json
+import threading
+
+import pytest
+from httpx import AsyncClient
+
+from app.clients.base import LLMClient, LLMStreamChunk
+from app.core import tracing
+from app.core.tracing import FileSpanExporter, InMemorySpanExporter, Tracer
+from app.main import app
+from app.services.llm_service import LLMService, get_llm_service
+
+
+class FakeStreamClient(LLMClient):
+    async def generate(self, messages, *, options=None):  # pragma: no cover - unused
+        raise NotImplementedError
+
+    async def stream(self, messages, *, options=None):
+        yield LLMStreamChunk(type="content", content="hi", model="fake")
+        yield LLMStreamChunk(type="end", model="fake")
+
+
+@pytest.fixture
+def exporter(monkeypatch) -> InMemorySpanExporter:
+    memory = InMemorySpanExporter()
+    tracer = Tracer(memory, sample_rate=1.0)
+    monkeypatch.setattr(tracing, "get_tracer", lambda: tracer)
+    app.dependency_overrides[get_llm_service] = lambda: LLMService(client=FakeStreamClient())
+    yield memory
+    app.dependency_overrides.clear()
+
+
+async def test_qa_instant_propagates_trace_id_and_exports_spans(exporter: InMemorySpanExporter) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post("/api/qa/instant", json={"message": "什么是导数"})
+
+    events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+    trace_id = response.headers["x-trace-id"]
+    assert events[0]["type"] == "start" and events[0]["traceId"] == trace_id
+    assert events[-1]["type"] == "end" and events[-1]["traceId"] == trace_id
+
+    names = {span.name for span in exporter.spans if span.trace_id == trace_id}
+    assert {"qa.parse_body", "qa.build_history", "llm.stream"} <= names
+    root = next(span for span in exporter.spans if span.local_root)
+    assert root.name.endswith("/instant")
+
+
+def test_unsampled_traces_are_not_exported() -> None:
+    memory = InMemorySpanExporter()
+    tracer = Tracer(memory, sample_rate=0.0)
+    span = tracer.start_span("root")
+    span.end()
+    assert span.trace_id and memory.spans == []
+
+
+def test_traceparent_joins_remote_trace() -> None:
+    memory = InMemorySpanExporter()
+    tracer = Tracer(memory, sample_rate=0.0)
+    span = tracer.continue_trace("root", "00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    span.end()
+    assert memory.spans[0].trace_id == "a" * 32
+    assert memory.spans[0].parent_id == "b" * 16
+
+
+def test_file_exporter_writes_off_the_calling_thread_in_order(tmp_path, monkeypatch) -> None:
+    exporter = FileSpanExporter(str(tmp_path / "traces" / "spans.jsonl"))
+    tracer = Tracer(exporter, sample_rate=1.0)
+    writers: set[int] = set()
+    real_open = type(tmp_path).open
+
+    def record_open(self, mode="r", *args, **kwargs):
+        if mode == "a":
+            writers.add(threading.get_ident())
+        return real_open(self, mode, *args, **kwargs)
+
+    monkeypatch.setattr(type(tmp_path), "open", record_open)
+    for index in range(20):
+        tracer.start_span(f"request-{index}").end()
+    exporter.flush(timeout=5)
+
+    lines = (tmp_path / "traces" / "spans.jsonl").read_text("utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == [f"request-{i}" for i in range(20)]
+    assert writers and threading.get_ident() not in writers
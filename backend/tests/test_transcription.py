@@ -0,0 +1,100 @@
+import asyncio
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from app.clients.asr_client import ASRClient, ASRResult, ASRSegment
+from app.services.audio import WavDecoder
+from app.services.material_store import MaterialStore
+from app.services.transcription import TranscriptionService
+
+RATE = 16000
+
+
+class FakeASRClient(ASRClient):
+    def __init__(self) -> None:
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def transcribe(self, audio, *, filename="audio.wav", language=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        with wave.open(io.BytesIO(audio)) as reader:
+            duration = reader.getnframes() / reader.getframerate()
+        return ASRResult(text=filename, segments=[ASRSegment(start=0.0, end=duration, text=filename)])
+
+
+def _write_lecture(path, seconds: int) -> None:
+    # 0.8 s of tone followed by 0.2 s of silence, repeated
+    t = np.arange(int(0.8 * RATE)) / RATE
+    tone = (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+    second = np.concatenate([tone, np.zeros(int(0.2 * RATE), dtype=np.int16)])
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(RATE)
+        out.writeframes(np.tile(second, seconds).tobytes())
+
+
+@pytest.fixture
+def store(store: MaterialStore) -> MaterialStore:
+    store.path("mat_audio").mkdir()
+    _write_lecture(store.path("mat_audio") / "lecture.wav", seconds=12)
+    return store
+
+
+def _service(client: ASRClient, store: MaterialStore, **kwargs) -> TranscriptionService:
+    return TranscriptionService(
+        client,
+        store,
+        segment_seconds=2,
+        concurrency=2,
+        decoder_factory=lambda path: WavDecoder(block_seconds=0.5),
+        **kwargs,
+    )
+
+
+async def test_transcribe_cuts_on_silence_and_stitches_timestamps(store: MaterialStore) -> None:
+    client = FakeASRClient()
+
+    report = await _service(client, store).transcribe_material("mat_audio")
+
+    chunks = store.list_chunks("mat_audio", type="caption")
+    assert report.transcribed == report.segments == client.calls == len(chunks)
+    assert client.max_in_flight <= 2
+    starts = [c["startMs"] for c in chunks]
+    assert starts == sorted(starts) and starts[0] == 0
+    # every cut after the first lands inside a 200 ms silence gap
+    assert all(800 <= start % 1000 <= 1000 for start in starts[1:])
+    assert chunks[-1]["endMs"] == 12000
+
+
+async def test_transcribe_resumes_and_respects_duration_cap(store: MaterialStore) -> None:
+    await _service(FakeASRClient(), store).transcribe_material("mat_audio")
+    first_run = len(store.list_chunks("mat_audio"))
+
+    client = FakeASRClient()
+    report = await _service(client, store).transcribe_material("mat_audio")
+    assert client.calls == 0
+    assert report.already_done == first_run
+
+    capped = await _service(FakeASRClient(), store, max_minutes=0).transcribe_material("mat_audio")
+    assert capped.truncated and capped.segments == 0
+
+
+async def test_segment_crossing_the_duration_cap_is_clipped(store: MaterialStore) -> None:
+    client = FakeASRClient()
+
+    # 0.05 min = 3 s: the second 2 s segment crosses it
+    report = await _service(client, store, max_minutes=0.05).transcribe_material("mat_audio")
+
+    chunks = store.list_chunks("mat_audio", type="caption")
+    assert report.truncated and report.duration_seconds == 3.0
+    assert client.calls == report.segments == len(chunks)
+    assert chunks[-1]["endMs"] == 3000